@@ -0,0 +1,217 @@
+"""
+Async Brello EI 0 - asyncio front-end
+Created by Epic Systems | Engineered by Rehan Temkar
+
+Runs Brello EI 0 generation on a dedicated executor so asyncio services never
+block their event loop, with a bounded request queue and cancellation that
+stops in-flight generation.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Optional, List, AsyncIterator
+
+from lazy_imports import lazy_import
+from streaming import TokenStreamer, StopOnEvent, astream_text
+
+transformers = lazy_import("transformers")
+
+logger = logging.getLogger(__name__)
+
+QUEUE_POLICIES = ("wait", "reject")
+
+class QueueFullError(RuntimeError):
+    """Raised when a request cannot be queued because the queue is full"""
+
+class AsyncBrelloEI0:
+    """
+    asyncio wrapper around a loaded BrelloEI0 model
+    
+    At most ``max_workers`` generations run at once on a dedicated thread
+    pool and at most ``max_queue_size`` more wait for a worker. When the
+    queue is full, new requests either wait for room or are rejected with
+    ``QueueFullError``, depending on ``queue_policy``.
+    """
+    
+    def __init__(
+        self,
+        brello,
+        max_workers: int = 1,
+        max_queue_size: int = 32,
+        queue_policy: str = "wait",
+        queue_timeout: Optional[float] = None
+    ):
+        """
+        Initialize the async front-end
+        
+        Args:
+            brello: Loaded BrelloEI0 instance
+            max_workers: Number of generations running concurrently
+            max_queue_size: Number of requests allowed to wait for a worker
+            queue_policy: "wait" to wait for room when the queue is full, "reject" to fail fast
+            queue_timeout: Maximum seconds to wait for room under the "wait" policy
+        """
+        if queue_policy not in QUEUE_POLICIES:
+            raise ValueError(f"queue_policy must be one of {QUEUE_POLICIES}, got {queue_policy!r}")
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+        if max_queue_size < 0:
+            raise ValueError("max_queue_size must not be negative")
+        
+        self.brello = brello
+        self.max_workers = max_workers
+        self.max_queue_size = max_queue_size
+        self.queue_policy = queue_policy
+        self.queue_timeout = queue_timeout
+        
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="brello-inference")
+        self._capacity = max_workers + max_queue_size
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._pending = 0
+    
+    @property
+    def pending(self) -> int:
+        """Number of requests queued or running"""
+        return self._pending
+    
+    async def generate_response(self, user_input: str, **kwargs) -> str:
+        """
+        Generate an emotionally intelligent response without blocking the event loop
+        
+        Args:
+            user_input: User's message
+            **kwargs: Generation parameters passed to ``BrelloEI0.generate_response()``
+        
+        Returns:
+            Generated emotionally intelligent response
+        """
+        return await self._run(self.brello.generate_response, user_input, **kwargs)
+    
+    async def generate_responses(self, user_inputs: List[str], **kwargs) -> List[str]:
+        """
+        Generate responses for a batch of messages as a single queued request
+        
+        Args:
+            user_inputs: User messages
+            **kwargs: Generation parameters passed to ``BrelloEI0.generate_responses()``
+        
+        Returns:
+            Generated responses in input order
+        """
+        return await self._run(self.brello.generate_responses, user_inputs, **kwargs)
+    
+    async def chat(self, message: str, **kwargs) -> str:
+        """
+        Async chat interface
+        
+        Args:
+            message: User message
+            **kwargs: Parameters passed to ``BrelloEI0.chat()``
+        
+        Returns:
+            Model response
+        """
+        return await self._run(self.brello.chat, message, **kwargs)
+    
+    async def stream_response(self, user_input: str, **kwargs) -> AsyncIterator[str]:
+        """
+        Stream a response, generating on the dedicated executor
+        
+        Args:
+            user_input: User's message
+            **kwargs: Generation parameters passed to ``BrelloEI0.generate_response()``
+        
+        Yields:
+            Pieces of the generated response
+        """
+        await self._acquire_slot()
+        
+        streamer = TokenStreamer(loop=asyncio.get_running_loop())
+        cancel = threading.Event()
+        future = self._submit(
+            cancel,
+            self.brello.generate_response,
+            user_input,
+            streamer=streamer,
+            **kwargs
+        )
+        
+        def forward_error(f: Future):
+            # Errors before the first token would otherwise leave the stream open
+            if not f.cancelled() and f.exception() is not None:
+                streamer.fail(f.exception())
+        
+        future.add_done_callback(forward_error)
+        stop_strings = kwargs.get("stop_strings", self.brello.config["stop_strings"])
+        
+        try:
+            async for piece in astream_text(streamer, self.brello.tokenizer, stop_strings):
+                yield piece
+        finally:
+            cancel.set()
+            future.cancel()
+    
+    async def close(self):
+        """Wait for running generations to finish and shut down the executor"""
+        await asyncio.get_running_loop().run_in_executor(None, self._executor.shutdown)
+    
+    async def _run(self, fn, *args, **kwargs):
+        """Queue ``fn`` on the executor and await its result"""
+        await self._acquire_slot()
+        
+        cancel = threading.Event()
+        future = self._submit(cancel, fn, *args, **kwargs)
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            # Stop the generation at the next token instead of letting it finish
+            cancel.set()
+            future.cancel()
+            raise
+    
+    async def _acquire_slot(self):
+        """Reserve room in the queue according to the queue policy"""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self._capacity)
+        
+        if self.queue_policy == "reject":
+            if self._slots.locked():
+                logger.warning(f"⚠️  Rejecting request: queue full ({self._pending} pending)")
+                raise QueueFullError(
+                    f"Brello EI 0 request queue is full ({self._pending} requests pending)"
+                )
+            await self._slots.acquire()
+        else:
+            try:
+                await asyncio.wait_for(self._slots.acquire(), timeout=self.queue_timeout)
+            except asyncio.TimeoutError:
+                raise QueueFullError(
+                    f"Timed out after {self.queue_timeout}s waiting for room in the request queue"
+                )
+        self._pending += 1
+    
+    def _submit(self, cancel: threading.Event, fn, *args, **kwargs) -> Future:
+        """Submit ``fn`` with a cancellation stopping criterion; the slot is freed when it ends"""
+        stopping_criteria = transformers.StoppingCriteriaList(kwargs.pop("stopping_criteria", None) or [])
+        stopping_criteria.append(StopOnEvent(cancel))
+        
+        loop = asyncio.get_running_loop()
+        
+        def release(_: Future):
+            try:
+                loop.call_soon_threadsafe(self._release_slot)
+            except RuntimeError:
+                # Event loop already closed; nothing is waiting for the slot
+                pass
+        
+        future = self._executor.submit(fn, *args, stopping_criteria=stopping_criteria, **kwargs)
+        future.add_done_callback(release)
+        return future
+    
+    def _release_slot(self):
+        self._pending -= 1
+        self._slots.release()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+CPU Autotune Benchmark - Brello EI 0
+Created by Epic Systems | Engineered by Rehan Temkar
+
+Probes this machine's CPU, times every precision and thread count, and
+caches the fastest configuration for BrelloEI0(autotune=True) to use:
+
+    python benchmark_autotune.py --model microsoft/DialoGPT-medium
+"""
+
+import argparse
+
+from cpu_autotune import AUTOTUNE_PRECISIONS, AUTOTUNE_TOKENS, MIN_AGREEMENT, autotune, probe_cpu
+
+def main():
+    """Run the autotuner and print every configuration it timed"""
+    parser = argparse.ArgumentParser(description="Autotune Brello EI 0 for this CPU")
+    parser.add_argument("--model", default="microsoft/DialoGPT-medium", help="Model, snapshot or exported package")
+    parser.add_argument("--precisions", nargs="+", default=list(AUTOTUNE_PRECISIONS), help="Precisions to try")
+    parser.add_argument("--threads", nargs="+", type=int, default=None, help="Thread counts to try")
+    parser.add_argument("--min-agreement", type=float, default=MIN_AGREEMENT, help="Minimum top-1 agreement with fp32")
+    parser.add_argument("--max-new-tokens", type=int, default=AUTOTUNE_TOKENS, help="Tokens generated per timing run")
+    parser.add_argument("--cache-dir", default=None, help="Directory caching autotune results")
+    args = parser.parse_args()
+    
+    print("🤖 Brello EI 0 - CPU Autotune")
+    print("Created by Epic Systems | Engineered by Rehan Temkar")
+    print("=" * 60)
+    
+    cpu = probe_cpu()
+    print(f"CPU: {cpu['name']}")
+    print(f"Cores: {cpu['cores']}, vector capability: {cpu['capability']}")
+    print(f"Flags: {', '.join(cpu['flags']) or 'none'}")
+    print(f"Native bf16: {cpu['native_bf16']}")
+    
+    tuning = autotune(
+        args.model,
+        cache_dir=args.cache_dir,
+        precisions=args.precisions,
+        thread_counts=args.threads,
+        min_agreement=args.min_agreement,
+        max_new_tokens=args.max_new_tokens
+    )
+    
+    print(f"\n{'Precision':<10} {'Threads':>8} {'Tokens/s':>10} {'Agreement':>10}")
+    for result in tuning["results"]:
+        if "skipped" in result:
+            print(f"{result['precision']:<10} skipped: {result['skipped']}")
+            continue
+        print(
+            f"{result['precision']:<10} {result['num_threads']:>8} "
+            f"{result['tokens_per_second']:>10.1f} {result['agreement']:>10.1%}"
+        )
+    print(f"\n✅ Chosen: {tuning['precision']} with {tuning['num_threads']} threads")
+
+if __name__ == "__main__":
+    main()
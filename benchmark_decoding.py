@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Decoding Benchmark - Brello EI 0
+Created by Epic Systems | Engineered by Rehan Temkar
+
+Compares regular decoding with speculative decoding (draft model) and
+prompt-lookup decoding on the same messages, and reports latency, speedup,
+acceptance rate and tokens per step.
+"""
+
+import argparse
+import time
+
+from brello_ei_0 import BrelloEI0
+
+MESSAGES = [
+    "I'm feeling really anxious about my job interview tomorrow.",
+    "I just got promoted at work and I'm so excited!",
+    "I'm feeling overwhelmed with all my responsibilities.",
+    "My best friend moved away and I feel lonely.",
+    "I failed my driving test again and I feel like giving up."
+]
+
+def run_mode(model, stats, max_new_tokens, **kwargs):
+    """Generate a reply for every message and time the whole run"""
+    stats.reset()
+    start_time = time.perf_counter()
+    responses = [
+        model.generate_response(message, max_new_tokens=max_new_tokens, **kwargs)
+        for message in MESSAGES
+    ]
+    return time.perf_counter() - start_time, responses, stats.stats()
+
+def main():
+    """Run the decoding benchmark"""
+    parser = argparse.ArgumentParser(description="Benchmark Brello EI 0 decoding modes")
+    parser.add_argument("--model", default="microsoft/DialoGPT-medium", help="Main model")
+    parser.add_argument("--draft-model", default="microsoft/DialoGPT-small", help="Draft model ('' to skip)")
+    parser.add_argument("--max-new-tokens", type=int, default=128, help="Tokens generated per reply")
+    parser.add_argument("--prompt-lookup-tokens", type=int, default=10, help="Tokens copied per prompt-lookup step")
+    args = parser.parse_args()
+    
+    print("🤖 Brello EI 0 - Decoding Benchmark")
+    print("Created by Epic Systems | Engineered by Rehan Temkar")
+    print("=" * 60)
+    
+    # Greedy decoding with no response cache, so every mode does the same work
+    model = BrelloEI0(
+        model_path=args.model,
+        draft_model_path=args.draft_model or None,
+        response_cache_size=0
+    )
+    model.config["do_sample"] = False
+    
+    modes = [("Speculative (draft model)", model.speculative_stats, {})] if model.draft_model else []
+    modes.append((
+        "Prompt lookup",
+        model.prompt_lookup_stats,
+        {"assistant_model": None, "prompt_lookup_num_tokens": args.prompt_lookup_tokens}
+    ))
+    
+    # Warm up every path once
+    model.generate_response(MESSAGES[0], max_new_tokens=8, assistant_model=None)
+    for _, _, kwargs in modes:
+        model.generate_response(MESSAGES[0], max_new_tokens=8, **kwargs)
+    
+    baseline_time, baseline_responses, _ = run_mode(
+        model, model.speculative_stats, args.max_new_tokens, assistant_model=None
+    )
+    print(f"\n📊 Regular decoding: {baseline_time:.2f}s for {len(MESSAGES)} messages")
+    
+    for name, stats, kwargs in modes:
+        elapsed, responses, results = run_mode(model, stats, args.max_new_tokens, **kwargs)
+        print(f"\n📊 {name}")
+        print(f"Time: {elapsed:.2f}s ({elapsed / results['tokens'] * 1000:.1f} ms/token)")
+        print(f"Speedup: {baseline_time / elapsed:.2f}x")
+        print(f"Acceptance rate: {results['acceptance_rate']:.1%}")
+        print(f"Tokens per step: {results['tokens_per_step']:.2f}")
+        print(f"Accepted tokens per step: {results['accepted_tokens_per_step']:.2f}")
+        print(f"Identical outputs: {responses == baseline_responses}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Quantization Benchmark - Brello EI 0
+Created by Epic Systems | Engineered by Rehan Temkar
+
+Compares the CPU quantization modes with the fp32 model on the prompts of
+test_brello_ei_0.py, and reports load time, memory, latency and how far
+the outputs drift from fp32.
+"""
+
+import argparse
+import os
+import time
+
+import torch
+
+from brello_ei_0 import BrelloEI0
+from cpu_quantization import CPU_QUANTIZATION_MODES, cache_file
+from test_brello_ei_0 import TEST_CASES
+
+MESSAGES = [test_case["input"] for test_case in TEST_CASES]
+
+def load(model_path, max_new_tokens, **kwargs):
+    """Load a model for greedy decoding with the response cache disabled"""
+    start_time = time.perf_counter()
+    model = BrelloEI0(model_path=model_path, device="cpu", response_cache_size=0, **kwargs)
+    load_time = time.perf_counter() - start_time
+    model.config["do_sample"] = False
+    model.config["max_new_tokens"] = max_new_tokens
+    return model, load_time
+
+def run(model):
+    """Generate a reply for every message and return the replies and mean latency"""
+    model.generate_response(MESSAGES[0], max_new_tokens=4)
+    start_time = time.perf_counter()
+    replies = [model.generate_response(message) for message in MESSAGES]
+    return replies, (time.perf_counter() - start_time) / len(MESSAGES)
+
+def reply_log_probs(model, message, reply):
+    """Next-token log-probabilities over the reply tokens, teacher-forced"""
+    prompt_ids = model._tokenize_prompts([message])[0]
+    reply_ids = model.tokenizer.encode(reply, add_special_tokens=False)
+    input_ids = torch.tensor([prompt_ids + reply_ids])
+    with torch.no_grad():
+        logits = model.model(input_ids).logits[0, len(prompt_ids) - 1:-1]
+    return torch.log_softmax(logits.float(), dim=-1)
+
+def drift(reference, model, replies):
+    """Top-1 agreement and mean KL divergence from the reference on its own replies"""
+    agreement, divergence, positions = 0.0, 0.0, 0
+    for message, reply in zip(MESSAGES, replies):
+        reference_log_probs = reply_log_probs(reference, message, reply)
+        log_probs = reply_log_probs(model, message, reply)
+        agreement += (reference_log_probs.argmax(-1) == log_probs.argmax(-1)).sum().item()
+        divergence += (reference_log_probs.exp() * (reference_log_probs - log_probs)).sum().item()
+        positions += reference_log_probs.shape[0]
+    return agreement / max(positions, 1), divergence / max(positions, 1)
+
+def main():
+    """Run the quantization benchmark"""
+    parser = argparse.ArgumentParser(description="Benchmark Brello EI 0 CPU quantization")
+    parser.add_argument("--model", default="microsoft/DialoGPT-medium", help="Model to quantize")
+    parser.add_argument("--modes", nargs="+", default=list(CPU_QUANTIZATION_MODES), help="Quantization modes")
+    parser.add_argument("--max-new-tokens", type=int, default=64, help="Tokens generated per reply")
+    parser.add_argument("--cache-dir", default=None, help="Directory caching the quantized weights")
+    args = parser.parse_args()
+    
+    print("🤖 Brello EI 0 - Quantization Benchmark")
+    print("Created by Epic Systems | Engineered by Rehan Temkar")
+    print("=" * 60)
+    
+    reference, load_time = load(args.model, args.max_new_tokens)
+    reference_replies, reference_latency = run(reference)
+    print("\n📊 fp32")
+    print(f"Load: {load_time:.2f}s")
+    print(f"Memory: {reference.memory_footprint() / 1024**3:.2f} GB")
+    print(f"Latency: {reference_latency:.2f}s per reply")
+    
+    for mode in args.modes:
+        cached = os.path.exists(cache_file(args.cache_dir, args.model, mode))
+        model, load_time = load(
+            args.model,
+            args.max_new_tokens,
+            cpu_quantization=mode,
+            quantization_cache_dir=args.cache_dir
+        )
+        replies, latency = run(model)
+        agreement, divergence = drift(reference, model, reference_replies)
+        identical = sum(reply == expected for reply, expected in zip(replies, reference_replies))
+        
+        print(f"\n📊 {mode}")
+        print(f"Load: {load_time:.2f}s ({'from cache' if cached else 'quantized and cached'})")
+        print(f"Memory: {model.memory_footprint() / 1024**3:.2f} GB")
+        print(f"Latency: {latency:.2f}s per reply")
+        print(f"Speedup over fp32: {reference_latency / latency:.2f}x")
+        print(f"Identical replies: {identical}/{len(MESSAGES)}")
+        print(f"Top-1 agreement with fp32: {agreement:.1%}")
+        print(f"Mean KL divergence from fp32: {divergence:.4f}")
+        del model
+
+if __name__ == "__main__":
+    main()
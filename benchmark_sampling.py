@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Sampling Benchmark - Brello EI 0
+Created by Epic Systems | Engineered by Rehan Temkar
+
+Times the temperature, top-k and top-p warpers of transformers against the
+fused sampler on the next-token logits of the prompts in test_brello_ei_0.py,
+batched like a busy server step:
+
+    python benchmark_sampling.py --model microsoft/DialoGPT-medium --batch-size 8
+
+It also reports the total variation distance between the two sampling
+distributions, which should be zero up to float rounding.
+"""
+
+import argparse
+import time
+
+import torch
+import transformers
+
+from brello_ei_0 import BrelloEI0
+from fused_sampling import FusedSampler
+from test_brello_ei_0 import TEST_CASES
+
+MESSAGES = [test_case["input"] for test_case in TEST_CASES]
+
+def time_per_call(function, repeats):
+    """Mean milliseconds per call"""
+    function()
+    start_time = time.perf_counter()
+    for _ in range(repeats):
+        function()
+    return (time.perf_counter() - start_time) / repeats * 1000
+
+def main():
+    """Run the sampling benchmark"""
+    parser = argparse.ArgumentParser(description="Benchmark Brello EI 0 fused sampling")
+    parser.add_argument("--model", default="microsoft/DialoGPT-medium", help="Model or snapshot")
+    parser.add_argument("--batch-size", type=int, default=8, help="Rows sampled per step")
+    parser.add_argument("--temperature", type=float, default=0.7, help="Sampling temperature")
+    parser.add_argument("--top-p", type=float, default=0.9, help="Nucleus probability mass")
+    parser.add_argument("--top-k", type=int, default=50, help="Top-k limit (0 for none)")
+    parser.add_argument("--repeats", type=int, default=50, help="Timed calls per sampler")
+    args = parser.parse_args()
+    
+    model = BrelloEI0(model_path=args.model, device="cpu", response_cache_size=0)
+    
+    print("🤖 Brello EI 0 - Sampling Benchmark")
+    print("Created by Epic Systems | Engineered by Rehan Temkar")
+    print("=" * 60)
+    print(f"temperature {args.temperature}, top_p {args.top_p}, top_k {args.top_k or None}, "
+          f"batch size {args.batch_size}")
+    
+    # Next-token logits of every prompt, repeated up to the batch size
+    messages = (MESSAGES * args.batch_size)[:args.batch_size]
+    inputs = model._prepare_inputs(model._tokenize_prompts(messages))
+    with torch.no_grad():
+        logits = model.model(
+            input_ids=inputs["input_ids"],
+            attention_mask=inputs["attention_mask"]
+        ).logits[:, -1, :].float()
+    
+    warpers = transformers.LogitsProcessorList([transformers.TemperatureLogitsWarper(args.temperature)])
+    if args.top_k:
+        warpers.append(transformers.TopKLogitsWarper(args.top_k))
+    if args.top_p < 1.0:
+        warpers.append(transformers.TopPLogitsWarper(args.top_p))
+    sampler = FusedSampler(temperature=args.temperature, top_p=args.top_p, top_k=args.top_k)
+    
+    warper_ms = time_per_call(
+        lambda: torch.multinomial(torch.softmax(warpers(None, logits), dim=-1), num_samples=1), args.repeats
+    )
+    fused_ms = time_per_call(lambda: sampler.sample(logits), args.repeats)
+    
+    reference = torch.softmax(warpers(None, logits.clone()), dim=-1)
+    fused = torch.softmax(sampler(None, logits), dim=-1)
+    distance = 0.5 * (reference - fused).abs().sum(dim=-1).max().item()
+    
+    print(f"\n{'Sampler':<12} {'ms/step':>9}")
+    print(f"{'Warpers':<12} {warper_ms:>9.2f}")
+    print(f"{'Fused':<12} {fused_ms:>9.2f}")
+    print(f"\n📊 Speedup: {warper_ms / fused_ms:.1f}x")
+    print(f"{'✅' if distance < 1e-4 else '❌'} Largest total variation distance: {distance:.2e}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Startup Benchmark - Brello EI 0
+Created by Epic Systems | Engineered by Rehan Temkar
+
+Measures how long it takes to import ``brello_ei_0`` and to get a usable
+tokenizer-only instance, compared with eagerly importing torch and
+transformers. With ``--exported``, it also compares the time to a first
+reply from the model, the torch.compile'd model and the ahead-of-time
+exported package. Each measurement runs in a fresh interpreter so nothing is
+already imported.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Snippets timed in a fresh interpreter; each prints a JSON result line
+IMPORT_EAGER = """
+import time, json, sys
+start = time.perf_counter()
+import torch, transformers
+transformers.AutoModelForCausalLM, transformers.AutoTokenizer, transformers.BitsAndBytesConfig
+print(json.dumps({"seconds": time.perf_counter() - start, "torch": "torch" in sys.modules}))
+"""
+
+IMPORT_BRELLO = """
+import time, json, sys
+start = time.perf_counter()
+import brello_ei_0
+print(json.dumps({"seconds": time.perf_counter() - start, "torch": "torch" in sys.modules}))
+"""
+
+TOKENIZER_ONLY = """
+import time, json, sys
+start = time.perf_counter()
+from brello_ei_0 import BrelloEI0
+brello = BrelloEI0({model!r}, tokenizer_only=True)
+tokens = brello.count_prompt_tokens("I'm feeling really anxious about my job interview tomorrow.")
+print(json.dumps({{"seconds": time.perf_counter() - start, "torch": "torch" in sys.modules, "tokens": tokens}}))
+"""
+
+FIRST_REPLY = """
+import time, json, sys
+start = time.perf_counter()
+from brello_ei_0 import BrelloEI0
+brello = BrelloEI0({model!r}, device="cpu", response_cache_size=0, **{kwargs!r})
+brello.generate_response("I'm feeling really anxious about my job interview tomorrow.", max_new_tokens=8)
+print(json.dumps({{"seconds": time.perf_counter() - start, "torch": "torch" in sys.modules}}))
+"""
+
+def run_snippet(code: str, runs: int) -> dict:
+    """Run a snippet in fresh interpreters and return its median time"""
+    results = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", code],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    result = results[-1]
+    result["seconds"] = statistics.median(r["seconds"] for r in results)
+    return result
+
+def main():
+    """Run the startup benchmark"""
+    parser = argparse.ArgumentParser(description="Benchmark Brello EI 0 startup time")
+    parser.add_argument("--model", default="microsoft/DialoGPT-medium", help="Model whose tokenizer is loaded")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per measurement")
+    parser.add_argument("--exported", default=None, help="Package from export_model.py to time the first reply with")
+    args = parser.parse_args()
+    
+    print("🤖 Brello EI 0 - Startup Benchmark")
+    print("Created by Epic Systems | Engineered by Rehan Temkar")
+    print("=" * 60)
+    
+    eager = run_snippet(IMPORT_EAGER, args.runs)
+    lazy = run_snippet(IMPORT_BRELLO, args.runs)
+    tokenizer_only = run_snippet(TOKENIZER_ONLY.format(model=args.model), args.runs)
+    
+    print(f"\n📊 import torch + transformers: {eager['seconds']:.2f}s")
+    print(f"📊 import brello_ei_0: {lazy['seconds']:.2f}s (torch imported: {lazy['torch']})")
+    print(
+        f"📊 Tokenizer-only load + count: {tokenizer_only['seconds']:.2f}s "
+        f"(torch imported: {tokenizer_only['torch']}, {tokenizer_only['tokens']} prompt tokens)"
+    )
+    print(f"Import speedup: {eager['seconds'] / lazy['seconds']:.1f}x")
+    
+    if args.exported:
+        model = run_snippet(FIRST_REPLY.format(model=args.model, kwargs={}), args.runs)
+        compiled = run_snippet(FIRST_REPLY.format(model=args.model, kwargs={"compile": True}), 1)
+        exported = run_snippet(FIRST_REPLY.format(model=args.exported, kwargs={}), args.runs)
+        print(f"\n📊 Load + first reply, model: {model['seconds']:.2f}s")
+        print(f"📊 Load + first reply, torch.compile: {compiled['seconds']:.2f}s")
+        print(f"📊 Load + first reply, exported package: {exported['seconds']:.2f}s")
+        print(f"Speedup over torch.compile: {compiled['seconds'] / exported['seconds']:.1f}x")
+
+if __name__ == "__main__":
+    main()
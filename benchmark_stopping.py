@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Stop Sequences Benchmark - Brello EI 0
+Created by Epic Systems | Engineered by Rehan Temkar
+
+Decodes the prompts of test_brello_ei_0.py greedily with and without stop
+strings, and reports how many tokens, and how much time, stopping at the
+end of the assistant's turn saves per request:
+
+    python benchmark_stopping.py --model microsoft/DialoGPT-medium --max-sentences 3
+
+It also checks that stopping early gives the same reply as generating the
+full length and cutting the text afterwards.
+"""
+
+import argparse
+import time
+
+import torch
+
+from brello_ei_0 import BrelloEI0
+from stop_sequences import DEFAULT_STOP_STRINGS, truncate_reply
+from test_brello_ei_0 import TEST_CASES
+
+MESSAGES = [test_case["input"] for test_case in TEST_CASES]
+
+def generate_ids(model, message, **kwargs):
+    """Generated token ids of a greedy reply, and the seconds it took"""
+    inputs = model._prepare_inputs(model._tokenize_prompts([message]))
+    gen_params = model._build_generation_params(**kwargs)
+    start_time = time.perf_counter()
+    with torch.no_grad():
+        outputs = model._generate(
+            inputs["input_ids"],
+            attention_mask=inputs["attention_mask"],
+            past_key_values=inputs["past_key_values"],
+            **gen_params
+        )
+    seconds = time.perf_counter() - start_time
+    return outputs[0, inputs["input_ids"].shape[1]:].tolist(), seconds
+
+def main():
+    """Run the stop sequences benchmark"""
+    parser = argparse.ArgumentParser(description="Benchmark Brello EI 0 stop sequences")
+    parser.add_argument("--model", default="microsoft/DialoGPT-medium", help="Model, snapshot or exported package")
+    parser.add_argument("--stop", nargs="+", default=list(DEFAULT_STOP_STRINGS), help="Stop strings")
+    parser.add_argument("--max-sentences", type=int, default=None, help="Sentence budget per reply")
+    parser.add_argument("--max-new-tokens", type=int, default=256, help="Token limit per reply")
+    args = parser.parse_args()
+    
+    model = BrelloEI0(model_path=args.model, device="cpu", response_cache_size=0)
+    model.config["do_sample"] = False
+    model.config["max_new_tokens"] = args.max_new_tokens
+    tokenizer = model.tokenizer
+    
+    print("🤖 Brello EI 0 - Stop Sequences Benchmark")
+    print("Created by Epic Systems | Engineered by Rehan Temkar")
+    print("=" * 60)
+    print(f"Stop strings: {args.stop}, sentence budget: {args.max_sentences}")
+    
+    generate_ids(model, MESSAGES[0], max_new_tokens=4)
+    print(f"\n{'Request':<8} {'Full':>6} {'Stopped':>8} {'Saved':>6} {'Time saved':>11} {'Same reply':>11}")
+    total_full = total_stopped = 0
+    full_time = stopped_time = 0.0
+    matches = 0
+    for index, message in enumerate(MESSAGES, 1):
+        full_ids, full_seconds = generate_ids(model, message, stop_strings=[], max_sentences=None)
+        stopped_ids, stopped_seconds = generate_ids(
+            model, message, stop_strings=args.stop, max_sentences=args.max_sentences
+        )
+        
+        # Cutting the full reply afterwards must give the early-stopped reply
+        full_reply = truncate_reply(tokenizer.decode(full_ids, skip_special_tokens=True), args.stop, args.max_sentences)
+        stopped_reply = truncate_reply(tokenizer.decode(stopped_ids, skip_special_tokens=True), args.stop, args.max_sentences)
+        same = full_reply.strip() == stopped_reply.strip()
+        
+        total_full += len(full_ids)
+        total_stopped += len(stopped_ids)
+        full_time += full_seconds
+        stopped_time += stopped_seconds
+        matches += same
+        print(
+            f"{index:<8} {len(full_ids):>6} {len(stopped_ids):>8} {len(full_ids) - len(stopped_ids):>6} "
+            f"{full_seconds - stopped_seconds:>10.2f}s {'✅' if same else '❌':>10}"
+        )
+    
+    count = len(MESSAGES)
+    print(f"\n📊 Tokens saved per request: {(total_full - total_stopped) / count:.1f} "
+          f"({1 - total_stopped / max(total_full, 1):.1%} of generated tokens)")
+    print(f"Time saved per request: {(full_time - stopped_time) / count:.2f}s "
+          f"({full_time / count:.2f}s -> {stopped_time / count:.2f}s)")
+    print(f"Same replies: {matches}/{count}")
+
+if __name__ == "__main__":
+    main()
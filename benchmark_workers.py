@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Worker Pool Benchmark - Brello EI 0
+Created by Epic Systems | Engineered by Rehan Temkar
+
+Measures how throughput scales with the number of pool workers, and how much
+memory the pool takes compared with running separate processes:
+
+    python benchmark_workers.py --model microsoft/DialoGPT-medium --workers 1 2 4 8
+
+Memory is read from /proc, so it is only reported on Linux. RSS counts the
+shared weights once per worker; PSS splits shared pages between the
+processes using them, so the PSS total is what the pool really costs.
+"""
+
+import argparse
+import os
+import time
+
+from test_brello_ei_0 import TEST_CASES
+from worker_pool import WorkerPool, available_cores
+
+MESSAGES = [test_case["input"] for test_case in TEST_CASES]
+
+def memory(pid):
+    """RSS and PSS of a process in bytes, or None where /proc is unavailable"""
+    path = f"/proc/{pid}/smaps_rollup"
+    if not os.path.exists(path):
+        return None
+    values = {}
+    with open(path) as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if key in ("Rss", "Pss"):
+                values[key] = int(value.split()[0]) * 1024
+    return values["Rss"], values["Pss"]
+
+def main():
+    """Run the worker pool benchmark"""
+    parser = argparse.ArgumentParser(description="Benchmark the Brello EI 0 worker pool")
+    parser.add_argument("--model", default="microsoft/DialoGPT-medium", help="Model, snapshot or exported package")
+    parser.add_argument("--workers", nargs="+", type=int, default=None, help="Worker counts to time")
+    parser.add_argument("--start-method", default=None, help="'fork' or 'spawn'")
+    parser.add_argument("--requests", type=int, default=32, help="Requests per run")
+    parser.add_argument("--max-new-tokens", type=int, default=32, help="Tokens generated per reply")
+    args = parser.parse_args()
+    
+    cores = len(available_cores())
+    worker_counts = args.workers or sorted({1, max(1, cores // 2), cores})
+    messages = [MESSAGES[index % len(MESSAGES)] for index in range(args.requests)]
+    
+    print("🤖 Brello EI 0 - Worker Pool Benchmark")
+    print("Created by Epic Systems | Engineered by Rehan Temkar")
+    print("=" * 60)
+    print(f"Cores: {cores}")
+    
+    baseline = None
+    for num_workers in worker_counts:
+        with WorkerPool(
+            args.model,
+            num_workers=num_workers,
+            start_method=args.start_method,
+            config={"do_sample": False},
+            response_cache_size=0
+        ) as pool:
+            pool.generate_responses(MESSAGES[:num_workers], max_new_tokens=4)
+            
+            start_time = time.perf_counter()
+            futures = [
+                pool.submit("generate_response", message, max_new_tokens=args.max_new_tokens)
+                for message in messages
+            ]
+            for future in futures:
+                future.result()
+            throughput = len(messages) / (time.perf_counter() - start_time)
+            baseline = baseline or throughput
+            
+            print(f"\n📊 {num_workers} worker(s), {pool.start_method}")
+            print(f"Throughput: {throughput:.2f} replies/s ({throughput / baseline:.2f}x one worker)")
+            usage = [memory(pid) for pid in pool.pids]
+            if all(usage):
+                rss = sum(worker_rss for worker_rss, _ in usage)
+                pss = sum(worker_pss for _, worker_pss in usage)
+                print(f"Workers RSS total: {rss / 1024**3:.2f} GB")
+                print(f"Workers PSS total: {pss / 1024**3:.2f} GB")
+
+if __name__ == "__main__":
+    main()
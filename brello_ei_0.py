@@ -6,19 +6,65 @@ A locally-run emotional intelligence AI model based on Llama 3.2 3B,
 designed to provide empathetic, emotionally-aware responses.
 """
 
-import torch
-from transformers import (
-    AutoModelForCausalLM,
-    AutoTokenizer,
-    GenerationConfig,
-    BitsAndBytesConfig
-)
-from typing import Optional, Dict, Any, List
+from __future__ import annotations
+
+from typing import Optional, Dict, Any, List, Tuple, Callable, Iterator, AsyncIterator
+import asyncio
+import contextlib
+import json
 import logging
 import os
+import threading
+import time
+
+from lazy_imports import lazy_import
+from light_tokenizer import load_light_tokenizer
+from model_registry import ModelRegistry
+from weight_snapshot import is_snapshot, save_snapshot, load_snapshot
+from exported_decoder import MAX_BATCH_SIZE, ExportedDecoder, is_exported, export_decoder, load_exported
+from model_compile import DEFAULT_COMPILE_BUCKETS, CompileStats, bucket_width, compile_model, eager_execution
+from kv_cache import cache_to_tuples, tuples_to_cache
+from chat_sessions import SessionManager, render_turns
+from prompt_builder import USER_PLACEHOLDER, PromptBuilder
+from streaming import TokenStreamer, StopOnEvent, astream_text
+from response_cache import ResponseCache, normalize_input, params_key
+from semantic_cache import SemanticCache
+from stop_sequences import DEFAULT_STOP_STRINGS, StopOnText
+from generation_output import GenerationResult, ResponseStream, extract_reply, reply_token_ids
+from logits_processors import build_repetition_processors
+from fused_sampling import fused_sampler
+from speculative_decoding import (
+    SUPPORTED_PARAMS,
+    DraftModelProposer,
+    PromptLookupProposer,
+    SpeculativeStats,
+    build_logits_processors,
+    speculative_generate
+)
+
+# torch, transformers and numpy are imported when a model is first loaded,
+# so tools that only count tokens or render prompts start quickly
+np = lazy_import("numpy")
+torch = lazy_import("torch")
+transformers = lazy_import("transformers")
 
 logger = logging.getLogger(__name__)
 
+# Models handed out by load_brello_ei_0(); set model_registry.memory_budget_gb
+# to bound the memory they use together
+model_registry = ModelRegistry()
+
+# System persona placed in front of every conversation. It never changes, so
+# its past-key-values are computed once per loaded model and reused.
+SYSTEM_MESSAGE = "You are Brello EI 0, an emotionally intelligent AI created by Epic Systems and engineered by Rehan Temkar. You provide empathetic, understanding responses that show emotional awareness and genuine care for the user's feelings and experiences. You are part of the Brello AI family, designed to bring emotional intelligence to AI conversations."
+SYSTEM_PROMPT = f"""<|system|>
+{SYSTEM_MESSAGE}
+</s>
+"""
+
+# Greedy tokens timed with and without compilation at load time
+COMPILE_BENCHMARK_TOKENS = 16
+
 class BrelloEI0:
     """
     Brello EI 0 - Emotional Intelligence AI Model
@@ -33,7 +79,25 @@ class BrelloEI0:
         device: Optional[str] = None,
         load_in_4bit: bool = False,
         load_in_8bit: bool = False,
+        cpu_quantization: Optional[str] = None,
+        quantization_cache_dir: Optional[str] = None,
         torch_dtype: Optional[torch.dtype] = None,
+        use_prefix_cache: bool = True,
+        prefix_cache_path: Optional[str] = None,
+        max_sessions: int = 64,
+        session_timeout: float = 1800.0,
+        response_cache_size: int = 1024,
+        response_cache_path: Optional[str] = None,
+        semantic_cache_size: int = 0,
+        semantic_cache_threshold: float = 0.95,
+        semantic_cache_path: Optional[str] = None,
+        draft_model_path: Optional[str] = None,
+        tokenizer_only: bool = False,
+        compile: bool = False,
+        compile_buckets: Optional[List[int]] = None,
+        autotune: bool = False,
+        autotune_cache_dir: Optional[str] = None,
+        use_chat_template: bool = False,
         **kwargs
     ):
         """
@@ -44,12 +108,74 @@ class BrelloEI0:
             device: Device to load model on ('cuda', 'cpu', etc.)
             load_in_4bit: Whether to load model in 4-bit quantization
             load_in_8bit: Whether to load model in 8-bit quantization
+            cpu_quantization: CPU quantization mode without bitsandbytes ('int8' or 'int4')
+            quantization_cache_dir: Directory caching CPU-quantized weights (default ~/.cache/brello_ei_0/quantized)
             torch_dtype: Torch data type for model weights
+            use_prefix_cache: Whether to precompute and reuse the system prompt KV cache
+            prefix_cache_path: File to load the system prompt KV cache from (and save it to)
+            max_sessions: Maximum number of chat sessions kept in memory
+            session_timeout: Seconds of inactivity before a chat session is dropped
+            response_cache_size: Responses kept in the in-memory response cache (0 disables it)
+            response_cache_path: SQLite file for the persistent response cache tier
+            semantic_cache_size: Responses kept in the semantic (paraphrase) cache (0 disables it)
+            semantic_cache_threshold: Minimum cosine similarity for a semantic cache hit
+            semantic_cache_path: File to load the semantic cache index from
+            draft_model_path: Smaller model sharing the tokenizer, used for speculative decoding
+            tokenizer_only: Load only the tokenizer, for token counting and prompt rendering
+            compile: Whether to run the decoder through torch.compile, warmed up at load time
+            compile_buckets: Prompt widths inputs are padded to when compiled (default 32 to 512)
+            autotune: Whether to run on CPU with the fastest precision and thread count for this host
+            autotune_cache_dir: Directory caching autotune results (default ~/.cache/brello_ei_0/autotune)
+            use_chat_template: Lay prompts out with the tokenizer's chat template, when it has one
         """
         self.model_path = model_path
-        self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+        self.tokenizer_only = tokenizer_only
+        self.cpu_quantization = cpu_quantization
+        self.quantization_cache_dir = quantization_cache_dir
+        if tokenizer_only or cpu_quantization:
+            # Nothing runs on a GPU in these modes; checking for one would import torch
+            self.device = device or "cpu"
+        else:
+            self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+        self.autotune = None
+        if autotune and not tokenizer_only:
+            if self.device != "cpu":
+                logger.info(f"Autotuning only applies to CPU; running on {self.device} as configured")
+            elif torch_dtype is not None or cpu_quantization or load_in_4bit or load_in_8bit:
+                logger.info("Autotuning skipped: precision was set explicitly")
+            else:
+                self.autotune = self._apply_autotune(autotune_cache_dir)
+                torch_dtype = self.autotune.get("torch_dtype")
+                self.cpu_quantization = cpu_quantization = self.autotune.get("cpu_quantization")
         self.model = None
         self.tokenizer = None
+        self.draft_model_path = draft_model_path
+        self.draft_model = None
+        self.speculative_stats = SpeculativeStats()
+        self.prompt_lookup_stats = SpeculativeStats()
+        self.compile = compile
+        self.compile_buckets = sorted(compile_buckets or DEFAULT_COMPILE_BUCKETS)
+        self.compile_stats = CompileStats()
+        self.use_prefix_cache = use_prefix_cache
+        self.prefix_cache_path = prefix_cache_path
+        self._prefix_ids: Optional[List[int]] = None
+        self._prefix_cache = None
+        self.use_chat_template = use_chat_template
+        self._prompt_builder: Optional[PromptBuilder] = None
+        self.sessions = SessionManager(self, max_sessions=max_sessions, idle_timeout=session_timeout)
+        self.response_cache = None
+        self._weights_fingerprint: Optional[str] = None
+        if response_cache_size > 0:
+            self.response_cache = ResponseCache(max_entries=response_cache_size, disk_path=response_cache_path)
+        self.semantic_cache = None
+        if semantic_cache_size > 0 and not tokenizer_only:
+            self.semantic_cache = SemanticCache(
+                max_entries=semantic_cache_size,
+                threshold=semantic_cache_threshold,
+                model_path=model_path
+            )
+            if semantic_cache_path and os.path.exists(semantic_cache_path):
+                self.semantic_cache.load(semantic_cache_path)
         self.config = {
             "max_length": 4096,
             "temperature": 0.7,
@@ -58,33 +184,83 @@ class BrelloEI0:
             "do_sample": True,
             "min_length": 30,
             "max_new_tokens": 256,
-            "no_repeat_ngram_size": 3
+            "no_repeat_ngram_size": 3,
+            "prompt_lookup_num_tokens": 0,
+            "stop_strings": list(DEFAULT_STOP_STRINGS),
+            "max_sentences": None,
+            "fused_sampling": False
         }
         
         # Quantization config for memory efficiency
         self.quantization_config = None
+        if tokenizer_only:
+            self.torch_dtype = torch_dtype
+            logger.info(f"Initializing Brello EI 0 tokenizer: {model_path}")
+            self.load_model()
+            return
+        
         if load_in_4bit:
-            self.quantization_config = BitsAndBytesConfig(
+            self.quantization_config = transformers.BitsAndBytesConfig(
                 load_in_4bit=True,
                 bnb_4bit_compute_dtype=torch.float16,
                 bnb_4bit_use_double_quant=True,
                 bnb_4bit_quant_type="nf4"
             )
         elif load_in_8bit:
-            self.quantization_config = BitsAndBytesConfig(load_in_8bit=True)
+            self.quantization_config = transformers.BitsAndBytesConfig(load_in_8bit=True)
         
-        self.torch_dtype = torch_dtype or torch.float16 if self.device == "cuda" else torch.float32
+        if cpu_quantization:
+            from cpu_quantization import CPU_QUANTIZATION_MODES
+            
+            if cpu_quantization not in CPU_QUANTIZATION_MODES:
+                raise ValueError(f"cpu_quantization must be one of {CPU_QUANTIZATION_MODES}")
+            if self.quantization_config is not None:
+                raise ValueError("cpu_quantization cannot be combined with load_in_4bit or load_in_8bit")
+            if self.device != "cpu":
+                raise ValueError("cpu_quantization requires device='cpu'")
+        
+        self.torch_dtype = torch_dtype or (torch.float16 if self.device == "cuda" else torch.float32)
         
         logger.info(f"Initializing Brello EI 0 model: {model_path}")
         self.load_model()
     
+    def _apply_autotune(self, cache_dir: Optional[str]) -> Dict[str, Any]:
+        """
+        Load (or run) this host's CPU tuning and set the thread count it chose
+        
+        Args:
+            cache_dir: Directory caching autotune results
+        
+        Returns:
+            Chosen precision, thread count and the BrelloEI0 arguments applying them
+        """
+        from cpu_autotune import autotune, load_tuning, precision_kwargs
+        
+        tuning = load_tuning(self.model_path, cache_dir)
+        if tuning is None:
+            logger.info("No autotune result for this host yet, benchmarking the CPU")
+            tuning = autotune(self.model_path, cache_dir)
+        torch.set_num_threads(tuning["num_threads"])
+        logger.info(f"✅ Autotuned for this CPU: {tuning['precision']} with {tuning['num_threads']} threads")
+        settings = {
+            "precision": tuning["precision"],
+            "num_threads": tuning["num_threads"],
+            "tokens_per_second": tuning["tokens_per_second"]
+        }
+        settings.update(precision_kwargs(tuning["precision"]))
+        return settings
+    
     def load_model(self):
         """Load the Brello EI 0 model and tokenizer"""
+        if self.tokenizer_only:
+            self._load_tokenizer_only()
+            return
+        
         try:
             logger.info(f"Loading Brello EI 0 model: {self.model_path}")
             
             # Load tokenizer
-            self.tokenizer = AutoTokenizer.from_pretrained(
+            self.tokenizer = transformers.AutoTokenizer.from_pretrained(
                 self.model_path,
                 trust_remote_code=True,
                 padding_side="left"
@@ -95,19 +271,35 @@ class BrelloEI0:
                 self.tokenizer.pad_token = self.tokenizer.eos_token
             
             # Load model
-            model_kwargs = {
-                "torch_dtype": self.torch_dtype,
-                "device_map": "auto" if self.device == "cuda" else None,
-                "trust_remote_code": True
-            }
-            
-            if self.quantization_config:
-                model_kwargs["quantization_config"] = self.quantization_config
-            
-            self.model = AutoModelForCausalLM.from_pretrained(
-                self.model_path,
-                **model_kwargs
-            )
+            if self.cpu_quantization:
+                self.model = self._load_cpu_quantized_model()
+            elif is_exported(self.model_path):
+                # AOT-compiled packages run on the device they were exported on
+                if self.quantization_config:
+                    raise ValueError("Exported packages cannot be quantized on load")
+                self.model = load_exported(self.model_path)
+                self.device = self.model.device.type
+                self.torch_dtype = self.model.dtype
+            elif is_snapshot(self.model_path):
+                # Snapshot weights are memory-mapped in the dtype they were saved in
+                if self.quantization_config:
+                    raise ValueError("Snapshots cannot be quantized on load; quantize before exporting")
+                self.model, _ = load_snapshot(self.model_path)
+                self.torch_dtype = self.model.dtype
+            else:
+                model_kwargs = {
+                    "torch_dtype": self.torch_dtype,
+                    "device_map": "auto" if self.device == "cuda" else None,
+                    "trust_remote_code": True
+                }
+                
+                if self.quantization_config:
+                    model_kwargs["quantization_config"] = self.quantization_config
+                
+                self.model = transformers.AutoModelForCausalLM.from_pretrained(
+                    self.model_path,
+                    **model_kwargs
+                )
             
             # Move to device if not using device_map
             if self.device != "cuda" or self.quantization_config is None:
@@ -115,10 +307,151 @@ class BrelloEI0:
             
             logger.info("✅ Brello EI 0 model loaded successfully")
             
+            if self.response_cache is not None:
+                from cpu_quantization import weights_fingerprint
+                
+                # Cached replies belong to the weights they were generated with
+                self._weights_fingerprint = weights_fingerprint(self.model_path)
+            
+            if self.draft_model_path:
+                self._load_draft_model()
+            
+            if self.use_prefix_cache:
+                self._setup_prefix_cache()
+            
+            if self.compile:
+                if is_exported(self.model_path):
+                    logger.info("Exported packages are compiled ahead of time; skipping torch.compile")
+                else:
+                    self._setup_compile()
+        
         except Exception as e:
             logger.error(f"❌ Failed to load Brello EI 0 model: {e}")
             raise
     
+    def _load_cpu_quantized_model(self):
+        """Load the CPU-quantized model from the cache, or quantize it and cache it"""
+        from cpu_quantization import cache_file, load_quantized, quantize_model, save_quantized
+        
+        path = cache_file(self.quantization_cache_dir, self.model_path, self.cpu_quantization)
+        model = load_quantized(path, self.model_path, self.cpu_quantization)
+        if model is not None:
+            return model
+        
+        logger.info(f"Quantizing {self.model_path} to {self.cpu_quantization}")
+        if is_snapshot(self.model_path):
+            model, _ = load_snapshot(self.model_path)
+        else:
+            model = transformers.AutoModelForCausalLM.from_pretrained(
+                self.model_path,
+                torch_dtype=torch.float32,
+                trust_remote_code=True
+            )
+        model.eval()
+        quantize_model(model, self.cpu_quantization)
+        save_quantized(model, path, self.model_path, self.cpu_quantization)
+        return model
+    
+    def _load_tokenizer_only(self):
+        """Load just the tokenizer, without importing torch when possible"""
+        try:
+            logger.info(f"Loading Brello EI 0 tokenizer: {self.model_path}")
+            
+            # tokenizer.json gives the same ids as the fast tokenizer without
+            # going through transformers, which imports torch; chat templates
+            # need transformers either way
+            if not self.use_chat_template:
+                self.tokenizer = load_light_tokenizer(self.model_path)
+                if self.tokenizer is None:
+                    logger.warning(f"⚠️  No tokenizer.json for {self.model_path}; loading it through transformers")
+            if self.tokenizer is None:
+                self.tokenizer = transformers.AutoTokenizer.from_pretrained(self.model_path, trust_remote_code=True)
+            
+            logger.info("✅ Brello EI 0 tokenizer loaded successfully")
+        
+        except Exception as e:
+            logger.error(f"❌ Failed to load Brello EI 0 tokenizer: {e}")
+            raise
+    
+    def _load_draft_model(self):
+        """Load the draft model used to propose tokens for speculative decoding"""
+        logger.info(f"Loading draft model: {self.draft_model_path}")
+        
+        # Draft tokens are verified by id, so both models need the same vocabulary
+        draft_tokenizer = transformers.AutoTokenizer.from_pretrained(self.draft_model_path, trust_remote_code=True)
+        if draft_tokenizer.get_vocab() != self.tokenizer.get_vocab():
+            raise ValueError(
+                f"Draft model {self.draft_model_path} does not share the tokenizer of {self.model_path}"
+            )
+        
+        self.draft_model = transformers.AutoModelForCausalLM.from_pretrained(
+            self.draft_model_path,
+            torch_dtype=self.torch_dtype,
+            trust_remote_code=True
+        ).to(self.model.device)
+        self.draft_model.eval()
+        logger.info("✅ Draft model loaded, speculative decoding enabled")
+    
+    def export_snapshot(self, path: str):
+        """
+        Save the loaded model and tokenizer as a memory-mappable snapshot
+        
+        Weights are stored in the dtype and layout they are served in, so
+        ``from_snapshot()`` maps them without converting or copying.
+        
+        Args:
+            path: Destination directory
+        """
+        if self.model is None or self.tokenizer is None:
+            raise ValueError("Model not loaded. Call load_model() first.")
+        if self.quantization_config is not None or self.cpu_quantization:
+            raise ValueError("Snapshots of quantized models are not supported")
+        if is_exported(self.model_path):
+            raise ValueError("Snapshots of exported packages are not supported")
+        
+        save_snapshot(self.model, path, {"source_model_path": self.model_path})
+        self.tokenizer.save_pretrained(path)
+        logger.info(f"✅ Exported Brello EI 0 snapshot to {path}")
+    
+    def export_package(self, path: str, max_batch_size: int = MAX_BATCH_SIZE):
+        """
+        Export the decoder ahead of time into a package that loads without compiling
+        
+        The forward step is captured with ``torch.export`` and compiled with
+        AOTInductor. ``BrelloEI0(model_path=path)`` then loads the compiled
+        package directly, without building the model or compiling at startup.
+        
+        Args:
+            path: Destination directory
+            max_batch_size: Largest batch the package will accept
+        """
+        if self.model is None or self.tokenizer is None:
+            raise ValueError("Model not loaded. Call load_model() first.")
+        if self.quantization_config is not None or self.cpu_quantization:
+            raise ValueError("Exporting quantized models is not supported")
+        if is_exported(self.model_path):
+            raise ValueError(f"{self.model_path} is already an exported package")
+        
+        export_decoder(self.model, path, {"source_model_path": self.model_path}, max_batch_size=max_batch_size)
+        self.tokenizer.save_pretrained(path)
+        logger.info(f"✅ Exported Brello EI 0 package to {path}")
+    
+    @classmethod
+    def from_snapshot(cls, path: str, **kwargs) -> "BrelloEI0":
+        """
+        Load Brello EI 0 from a snapshot written by ``export_snapshot()``
+        
+        Args:
+            path: Snapshot directory
+            **kwargs: Additional model parameters (the dtype is the snapshot's)
+            
+        Returns:
+            BrelloEI0 instance
+        """
+        if not is_snapshot(path):
+            raise ValueError(f"{path} is not a Brello EI 0 snapshot")
+        return cls(model_path=path, **kwargs)
+    
     def apply_emotional_intelligence_prompt(self, user_input: str) -> str:
         """
         Apply emotional intelligence prompt template for Brello EI 0
@@ -130,14 +463,273 @@ class BrelloEI0:
             Formatted conversation string with emotional intelligence focus
         """
         # Format the conversation with emotional intelligence focus
-        prompt = f"""<|system|>
-You are Brello EI 0, an emotionally intelligent AI created by Epic Systems and engineered by Rehan Temkar. You provide empathetic, understanding responses that show emotional awareness and genuine care for the user's feelings and experiences. You are part of the Brello AI family, designed to bring emotional intelligence to AI conversations.
-</s>
-<|user|>
+        prompt = self.prompt_builder.render(user_input)
+        return prompt
+    
+    @property
+    def prompt_builder(self) -> PromptBuilder:
+        """Builder of prompt token ids for the loaded tokenizer"""
+        if self.tokenizer is None:
+            raise ValueError("Tokenizer not loaded. Call load_model() first.")
+        if self._prompt_builder is None or self._prompt_builder.tokenizer is not self.tokenizer:
+            self._prompt_builder = self._create_prompt_builder()
+        return self._prompt_builder
+    
+    def _create_prompt_builder(self) -> PromptBuilder:
+        """Prompt builder for the chat template if requested and available, else for ``SYSTEM_PROMPT``"""
+        if self.use_chat_template:
+            builder = PromptBuilder.from_chat_template(self.tokenizer, SYSTEM_MESSAGE)
+            if builder is not None:
+                return builder
+            logger.warning(f"⚠️  {self.model_path} has no usable chat template; using the Brello EI 0 prompt layout")
+        turn_head, turn_tail = self._user_turn(USER_PLACEHOLDER).split(USER_PLACEHOLDER)
+        return PromptBuilder(self.tokenizer, SYSTEM_PROMPT, turn_head, turn_tail)
+    
+    def _user_turn(self, user_input: str) -> str:
+        """Format the user's message as a conversation turn awaiting a reply"""
+        return f"""<|user|>
 {user_input}
 </s>
 <|assistant|>"""
-        return prompt
+    
+    def count_tokens(self, text: str, add_special_tokens: bool = False) -> int:
+        """
+        Count the tokens of a piece of text
+        
+        Args:
+            text: Text to tokenize
+            add_special_tokens: Whether to count the model's special tokens (e.g. BOS)
+            
+        Returns:
+            Number of tokens
+        """
+        if self.tokenizer is None:
+            raise ValueError("Tokenizer not loaded. Call load_model() first.")
+        return len(self.tokenizer.encode(text, add_special_tokens=add_special_tokens))
+    
+    def count_prompt_tokens(self, user_input: str) -> int:
+        """
+        Count the tokens of the full prompt the model sees for a message
+        
+        Args:
+            user_input: User's message
+            
+        Returns:
+            Number of prompt tokens, including the system prompt
+        """
+        if self.tokenizer is None:
+            raise ValueError("Tokenizer not loaded. Call load_model() first.")
+        return len(self._tokenize_prompts([user_input])[0])
+    
+    def build_prefix_cache(self):
+        """
+        Precompute the past-key-values of the system prompt
+        
+        Every request starts with the same ``SYSTEM_PROMPT``, so its prefill
+        runs once here and later requests only prefill their own turn.
+        """
+        if self.model is None or self.tokenizer is None:
+            raise ValueError("Model not loaded. Call load_model() first.")
+        
+        prefix_ids = self.prompt_builder.prefix_ids
+        
+        # Reusing the prefix is only valid if tokenizing it separately gives
+        # the same ids as tokenizing the whole prompt
+        if not self.prompt_builder.prefix_exact:
+            logger.warning("⚠️  System prompt does not tokenize independently; prefix cache disabled")
+            self._prefix_ids = None
+            self._prefix_cache = None
+            return
+        
+        with torch.no_grad():
+            outputs = self.model(
+                torch.tensor([prefix_ids], device=self.model.device),
+                use_cache=True
+            )
+        
+        self._prefix_ids = prefix_ids
+        self._prefix_cache = cache_to_tuples(outputs.past_key_values)
+        logger.info(f"Cached system prompt KV for {len(prefix_ids)} tokens")
+    
+    def save_prefix_cache(self, path: str):
+        """
+        Save the system prompt KV cache to disk
+        
+        Args:
+            path: Destination file
+        """
+        if self._prefix_cache is None:
+            raise ValueError("Prefix cache not built. Call build_prefix_cache() first.")
+        
+        torch.save({
+            "model_path": self.model_path,
+            "system_prompt": self.prompt_builder.prefix,
+            "dtype": str(self.torch_dtype),
+            "prefix_ids": self._prefix_ids,
+            "keys": [key.cpu() for key, _ in self._prefix_cache],
+            "values": [value.cpu() for _, value in self._prefix_cache]
+        }, path)
+        logger.info(f"Saved system prompt KV cache to {path}")
+    
+    def load_prefix_cache(self, path: str) -> bool:
+        """
+        Load a system prompt KV cache saved by ``save_prefix_cache()``
+        
+        Args:
+            path: Cache file
+        
+        Returns:
+            Whether the cache matched this model and was loaded
+        """
+        data = torch.load(path, map_location=self.model.device, weights_only=True)
+        
+        if (
+            data["model_path"] != self.model_path
+            or data["system_prompt"] != self.prompt_builder.prefix
+            or data["dtype"] != str(self.torch_dtype)
+            or data["prefix_ids"] != self.prompt_builder.prefix_ids
+        ):
+            logger.warning(f"⚠️  Prefix cache at {path} does not match this model; ignoring it")
+            return False
+        
+        self._prefix_ids = data["prefix_ids"]
+        self._prefix_cache = tuple(zip(data["keys"], data["values"]))
+        logger.info(f"Loaded system prompt KV cache from {path}")
+        return True
+    
+    def _setup_prefix_cache(self):
+        """Load the system prompt KV cache from disk, or build (and save) it"""
+        path = self.prefix_cache_path
+        if path and os.path.exists(path) and self.load_prefix_cache(path):
+            return
+        
+        self.build_prefix_cache()
+        if path and self._prefix_cache is not None:
+            self.save_prefix_cache(path)
+    
+    def _setup_compile(self):
+        """Compile the model's forward pass and warm up every prompt bucket"""
+        logger.info(f"Compiling Brello EI 0 for prompt buckets {self.compile_buckets}")
+        compile_model(self.model, self.compile_stats)
+        
+        start_time = time.perf_counter()
+        filler = self.tokenizer.encode(" hello", add_special_tokens=False)[:1] or [self.tokenizer.eos_token_id]
+        prefix = list(self._prefix_ids) if self._prefix_cache is not None else []
+        # Padded prompts pass an attention mask, while prompts that fill their
+        # bucket exactly do not; each variant gets graphs of its own, as do
+        # batches
+        for bucket in self.compile_buckets:
+            self._warmup_generate([prefix + filler * (bucket - 1)])
+        for bucket in self.compile_buckets[:2]:
+            self._warmup_generate([prefix + filler * bucket])
+        self._warmup_generate([prefix + filler * (self.compile_buckets[0] - 1)] * 2)
+        self.compile_stats.warmup_seconds = time.perf_counter() - start_time
+        
+        # Same prompt and token count through both forward passes
+        prompt_ids = [prefix + filler * (self.compile_buckets[0] - 1)]
+        with eager_execution(self.model):
+            self.compile_stats.eager_tokens_per_second = self._warmup_generate(prompt_ids, COMPILE_BENCHMARK_TOKENS)
+        self.compile_stats.compiled_tokens_per_second = self._warmup_generate(prompt_ids, COMPILE_BENCHMARK_TOKENS)
+        
+        self.compile_stats.warm = True
+        stats = self.compile_stats.stats()
+        logger.info(
+            f"✅ Compiled {stats['compiles']} graphs in {stats['warmup_seconds']:.1f}s "
+            f"({stats['speedup']:.2f}x eager decoding speed)"
+        )
+    
+    def _warmup_generate(self, prompt_ids: List[List[int]], max_new_tokens: int = 2) -> float:
+        """Greedily generate a fixed number of tokens and return the tokens per second"""
+        inputs = self._prepare_inputs(prompt_ids)
+        start_time = time.perf_counter()
+        with torch.no_grad():
+            self.model.generate(
+                inputs["input_ids"],
+                attention_mask=inputs["attention_mask"],
+                past_key_values=inputs["past_key_values"],
+                max_new_tokens=max_new_tokens,
+                min_new_tokens=max_new_tokens,
+                do_sample=False,
+                pad_token_id=self.tokenizer.pad_token_id
+            )
+        return len(prompt_ids) * max_new_tokens / (time.perf_counter() - start_time)
+    
+    def _tokenize_prompts(self, user_inputs: List[str]) -> List[List[int]]:
+        """Token ids of the full emotional intelligence prompt for each message"""
+        # Only the messages are tokenized; the template segments' ids are reused
+        return self.prompt_builder.build(user_inputs)
+    
+    def _tokenize_conversation(self, turns: List[Tuple[str, str]], user_input: str) -> List[int]:
+        """Token ids of the full prompt for a message that follows earlier (user, reply) turns"""
+        if self.prompt_builder.chat_template:
+            return self.prompt_builder.build_conversation(turns, user_input)
+        builder = self.prompt_builder
+        turn = render_turns(self, turns) + self._user_turn(user_input)
+        if builder.prefix_exact:
+            # The system prompt splits cleanly, whether or not its KV is cached
+            return builder.prefix_ids + self.tokenizer.encode(turn, add_special_tokens=False)
+        return self.tokenizer.encode(builder.prefix + turn, add_special_tokens=builder.add_special_tokens)
+    
+    def _context_limit(self) -> int:
+        """Number of positions the model can attend over"""
+        config = self.model.config
+        return (
+            getattr(config, "max_position_embeddings", None)
+            or getattr(config, "n_positions", None)
+            or self.config["max_length"]
+        )
+    
+    def _prepare_inputs(self, prompt_ids: List[List[int]]) -> Dict[str, Any]:
+        """
+        Pad prompt ids into a model input batch
+        
+        Without a prefix cache prompts are left-padded as usual. With one, the
+        cached system prompt columns come first and only the user turns are
+        left-padded after them, so ``past_key_values`` covers the first
+        ``cached_length`` columns of every row. Compiled models pad the user
+        turns up to the next of ``compile_buckets``.
+        
+        Args:
+            prompt_ids: Token ids from ``_tokenize_prompts()``
+        
+        Returns:
+            Dict with ``input_ids``, ``attention_mask``, ``past_key_values``
+            and ``cached_length``
+        """
+        cached_length = len(self._prefix_ids) if self._prefix_cache is not None else 0
+        suffixes = [ids[cached_length:] for ids in prompt_ids]
+        width = max(len(ids) for ids in suffixes)
+        if self.compile:
+            # A fixed set of widths keeps compiled graphs reusable
+            width = bucket_width(width, self.compile_buckets)
+        
+        batch_size = len(prompt_ids)
+        input_ids = torch.full(
+            (batch_size, cached_length + width), self.tokenizer.pad_token_id, dtype=torch.long
+        )
+        attention_mask = torch.zeros((batch_size, cached_length + width), dtype=torch.long)
+        for row, ids in enumerate(suffixes):
+            input_ids[row, cached_length + width - len(ids):] = torch.tensor(ids, dtype=torch.long)
+            attention_mask[row, cached_length + width - len(ids):] = 1
+        if cached_length:
+            input_ids[:, :cached_length] = torch.tensor(self._prefix_ids, dtype=torch.long)
+            attention_mask[:, :cached_length] = 1
+        
+        past_key_values = None
+        if cached_length:
+            # Copy the prefix so the shared cache is never touched by generation
+            past_key_values = tuples_to_cache(tuple(
+                (key.expand(batch_size, -1, -1, -1).clone(), value.expand(batch_size, -1, -1, -1).clone())
+                for key, value in self._prefix_cache
+            ), self.model)
+        
+        device = self.model.device
+        return {
+            "input_ids": input_ids.to(device),
+            "attention_mask": attention_mask.to(device),
+            "past_key_values": past_key_values,
+            "cached_length": cached_length
+        }
     
     def generate_response(
         self,
@@ -145,6 +737,7 @@ You are Brello EI 0, an emotionally intelligent AI created by Epic Systems and e
         max_length: Optional[int] = None,
         temperature: Optional[float] = None,
         top_p: Optional[float] = None,
+        seed: Optional[int] = None,
         **kwargs
     ) -> str:
         """
@@ -155,24 +748,500 @@ You are Brello EI 0, an emotionally intelligent AI created by Epic Systems and e
             max_length: Maximum response length
             temperature: Sampling temperature
             top_p: Top-p sampling parameter
+            seed: Random seed for sampling; pinning it makes sampled responses cacheable
             **kwargs: Additional generation parameters
             
         Returns:
             Generated emotionally intelligent response
         """
+        return self.generate_result(user_input, max_length, temperature, top_p, seed, **kwargs).text
+    
+    def generate_result(
+        self,
+        user_input: str,
+        max_length: Optional[int] = None,
+        temperature: Optional[float] = None,
+        top_p: Optional[float] = None,
+        seed: Optional[int] = None,
+        **kwargs
+    ) -> GenerationResult:
+        """
+        Generate a response along with its token counts and finish reason
+        
+        Args:
+            user_input: User's message
+            max_length: Maximum response length
+            temperature: Sampling temperature
+            top_p: Top-p sampling parameter
+            seed: Random seed for sampling; pinning it makes sampled responses cacheable
+            **kwargs: Additional generation parameters
+            
+        Returns:
+            Structured result whose text is what ``generate_response()`` returns
+        """
         if self.model is None or self.tokenizer is None:
             raise ValueError("Model not loaded. Call load_model() first.")
         
-        # Apply emotional intelligence prompt template
-        formatted_input = self.apply_emotional_intelligence_prompt(user_input)
+        # Generation parameters - optimized for emotional intelligence
+        gen_params = self._build_generation_params(max_length, temperature, top_p, **kwargs)
         
-        # Tokenize input
-        inputs = self.tokenizer.encode(formatted_input, return_tensors="pt")
-        if hasattr(self.model, 'device'):
-            inputs = inputs.to(self.model.device)
+        # Serve repeated requests from the response cache
+        cache_key = self._response_cache_key(user_input, gen_params, seed)
+        if cache_key is not None:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                return GenerationResult(cached, 0, 0, "stop", cached=True)
         
-        # Generation parameters - optimized for emotional intelligence
-        gen_params = {
+        # Then paraphrases of earlier messages from the semantic cache
+        semantic_key = self._semantic_cache_key(gen_params, seed)
+        embedding = None
+        if semantic_key is not None:
+            embedding = self.embed([user_input])[0]
+            cached = self.semantic_cache.lookup(embedding, semantic_key)
+            if cached is not None:
+                return GenerationResult(cached, 0, 0, "stop", cached=True)
+        
+        # Apply emotional intelligence prompt template and tokenize, reusing
+        # the cached system prompt KV when available
+        prompt_ids = self._tokenize_prompts([user_input])
+        inputs = self._prepare_inputs(prompt_ids)
+        
+        # Generate response
+        with torch.no_grad(), self._seeded(seed):
+            outputs = self._generate(
+                inputs["input_ids"],
+                attention_mask=inputs["attention_mask"],
+                past_key_values=inputs["past_key_values"],
+                **gen_params
+            )
+        
+        # Decode only the generated tokens, not the prompt
+        prompt_width = inputs["input_ids"].shape[1]
+        token_ids = reply_token_ids(outputs, prompt_width, gen_params["eos_token_id"], gen_params["pad_token_id"])[0]
+        result = self._build_result(token_ids, len(prompt_ids[0]), prompt_width, gen_params)
+        
+        if result.finish_reason != "cancelled":
+            if cache_key is not None:
+                self.response_cache.put(cache_key, result.text)
+            if embedding is not None:
+                self.semantic_cache.add(embedding, semantic_key, user_input, result.text)
+        
+        return result
+    
+    def stream_response(
+        self,
+        user_input: str,
+        max_length: Optional[int] = None,
+        temperature: Optional[float] = None,
+        top_p: Optional[float] = None,
+        **kwargs
+    ) -> Iterator[str]:
+        """
+        Stream an emotionally intelligent response as it is generated
+        
+        Text pieces are yielded as soon as their tokens are produced. Closing
+        the iterator early stops generation at the next token.
+        
+        Args:
+            user_input: User's message
+            max_length: Maximum response length
+            temperature: Sampling temperature
+            top_p: Top-p sampling parameter
+            **kwargs: Additional generation parameters
+        
+        Yields:
+            Pieces of the generated response
+        """
+        stream = self.stream_result(user_input, max_length, temperature, top_p, **kwargs)
+        try:
+            yield from stream
+        finally:
+            stream.close()
+    
+    def stream_result(
+        self,
+        user_input: str,
+        max_length: Optional[int] = None,
+        temperature: Optional[float] = None,
+        top_p: Optional[float] = None,
+        **kwargs
+    ) -> ResponseStream:
+        """
+        Stream a response, then report its token counts and finish reason
+        
+        Iterating over the returned stream yields the same pieces as
+        ``stream_response()``. Once they are exhausted, its ``result`` holds
+        the ``GenerationResult`` of the reply.
+        
+        Args:
+            user_input: User's message
+            max_length: Maximum response length
+            temperature: Sampling temperature
+            top_p: Top-p sampling parameter
+            **kwargs: Additional generation parameters
+        
+        Returns:
+            Stream of response pieces
+        """
+        streamer = TokenStreamer()
+        cancel = threading.Event()
+        thread, finish = self._start_streaming(
+            user_input, streamer, cancel, max_length, temperature, top_p, **kwargs
+        )
+        
+        def close():
+            cancel.set()
+            thread.join()
+        
+        stop_strings = kwargs.get("stop_strings", self.config["stop_strings"])
+        return ResponseStream(streamer, self.tokenizer, stop_strings, finish, close)
+    
+    async def astream_response(
+        self,
+        user_input: str,
+        max_length: Optional[int] = None,
+        temperature: Optional[float] = None,
+        top_p: Optional[float] = None,
+        **kwargs
+    ) -> AsyncIterator[str]:
+        """
+        Async variant of ``stream_response()`` for event-loop servers
+        
+        Generation runs in a background thread and tokens are handed to the
+        event loop as they are produced. Cancelling the consuming task stops
+        generation at the next token.
+        
+        Args:
+            user_input: User's message
+            max_length: Maximum response length
+            temperature: Sampling temperature
+            top_p: Top-p sampling parameter
+            **kwargs: Additional generation parameters
+        
+        Yields:
+            Pieces of the generated response
+        """
+        streamer = TokenStreamer(loop=asyncio.get_running_loop())
+        cancel = threading.Event()
+        self._start_streaming(
+            user_input, streamer, cancel, max_length, temperature, top_p, **kwargs
+        )
+        
+        try:
+            stop_strings = kwargs.get("stop_strings", self.config["stop_strings"])
+            async for piece in astream_text(streamer, self.tokenizer, stop_strings):
+                yield piece
+        finally:
+            cancel.set()
+    
+    def _start_streaming(
+        self,
+        user_input: str,
+        streamer: TokenStreamer,
+        cancel: threading.Event,
+        max_length: Optional[int] = None,
+        temperature: Optional[float] = None,
+        top_p: Optional[float] = None,
+        **kwargs
+    ) -> Tuple[threading.Thread, Callable[[List[int]], GenerationResult]]:
+        """
+        Run ``model.generate`` in a background thread feeding ``streamer``
+        
+        Returns:
+            The thread, and a function building the result from the generated ids
+        """
+        if self.model is None or self.tokenizer is None:
+            raise ValueError("Model not loaded. Call load_model() first.")
+        
+        prompt_ids = self._tokenize_prompts([user_input])
+        inputs = self._prepare_inputs(prompt_ids)
+        gen_params = self._build_generation_params(max_length, temperature, top_p, **kwargs)
+        stopping_criteria = transformers.StoppingCriteriaList(gen_params.pop("stopping_criteria", None) or [])
+        stopping_criteria.append(StopOnEvent(cancel))
+        
+        def run():
+            try:
+                with torch.no_grad():
+                    self._generate(
+                        inputs["input_ids"],
+                        attention_mask=inputs["attention_mask"],
+                        past_key_values=inputs["past_key_values"],
+                        streamer=streamer,
+                        stopping_criteria=stopping_criteria,
+                        **gen_params
+                    )
+            except Exception as e:
+                logger.error(f"❌ Streaming generation failed: {e}")
+                streamer.fail(e)
+        
+        def finish(token_ids: List[int]) -> GenerationResult:
+            params = {**gen_params, "stopping_criteria": stopping_criteria}
+            return self._build_result(token_ids, len(prompt_ids[0]), inputs["input_ids"].shape[1], params)
+        
+        thread = threading.Thread(target=run, name="brello-stream", daemon=True)
+        thread.start()
+        return thread, finish
+    
+    def generate_responses(
+        self,
+        user_inputs: List[str],
+        max_length: Optional[int] = None,
+        temperature: Optional[float] = None,
+        top_p: Optional[float] = None,
+        batch_size: int = 8,
+        **kwargs
+    ) -> List[str]:
+        """
+        Generate emotionally intelligent responses for many messages at once
+        
+        Args:
+            user_inputs: User messages
+            max_length: Maximum response length
+            temperature: Sampling temperature
+            top_p: Top-p sampling parameter
+            batch_size: Number of prompts per ``model.generate`` call
+            **kwargs: Additional generation parameters
+        
+        Returns:
+            Generated responses, one per input message
+        """
+        results = self.generate_results(user_inputs, max_length, temperature, top_p, batch_size, **kwargs)
+        return [result.text for result in results]
+    
+    def generate_results(
+        self,
+        user_inputs: List[str],
+        max_length: Optional[int] = None,
+        temperature: Optional[float] = None,
+        top_p: Optional[float] = None,
+        batch_size: int = 8,
+        **kwargs
+    ) -> List[GenerationResult]:
+        """
+        Generate responses for many messages along with their token counts and finish reasons
+        
+        Prompts are sorted by token length and padded into batches so
+        each batch runs a single ``model.generate`` call with an attention
+        mask. Results are returned in the same order as ``user_inputs``.
+        
+        Args:
+            user_inputs: User messages
+            max_length: Maximum response length
+            temperature: Sampling temperature
+            top_p: Top-p sampling parameter
+            batch_size: Number of prompts per ``model.generate`` call
+            **kwargs: Additional generation parameters
+        
+        Returns:
+            Structured results, one per input message
+        """
+        if self.model is None or self.tokenizer is None:
+            raise ValueError("Model not loaded. Call load_model() first.")
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+        
+        gen_params = self._build_generation_params(max_length, temperature, top_p, **kwargs)
+        
+        # Answer repeated messages from the response cache and only generate
+        # the rest; a batch shares one sampling stream, so only deterministic
+        # decoding is cached here
+        results: List[Optional[GenerationResult]] = [None] * len(user_inputs)
+        cache_keys = [self._response_cache_key(text, gen_params) for text in user_inputs]
+        for i, key in enumerate(cache_keys):
+            cached = self.response_cache.get(key) if key is not None else None
+            if cached is not None:
+                results[i] = GenerationResult(cached, 0, 0, "stop", cached=True)
+        pending = [i for i, result in enumerate(results) if result is None]
+        
+        gen_params["pad_token_id"] = self.tokenizer.pad_token_id
+        # Speculative decoding only handles a single sequence
+        gen_params.pop("assistant_model", None)
+        gen_params.pop("prompt_lookup_num_tokens", None)
+        prompt_ids = self._tokenize_prompts([user_inputs[i] for i in pending])
+        
+        # Group prompts of similar length together to keep padding small
+        order = sorted(range(len(prompt_ids)), key=lambda i: len(prompt_ids[i]))
+        
+        for start in range(0, len(order), batch_size):
+            batch_indices = order[start:start + batch_size]
+            inputs = self._prepare_inputs([prompt_ids[i] for i in batch_indices])
+            
+            with torch.no_grad():
+                outputs = self._generate(
+                    inputs["input_ids"],
+                    attention_mask=inputs["attention_mask"],
+                    past_key_values=inputs["past_key_values"],
+                    **gen_params
+                )
+            
+            # Left padding keeps every prompt the same width, so the generated
+            # tokens start at the same column for the whole batch
+            prompt_width = inputs["input_ids"].shape[1]
+            rows = reply_token_ids(outputs, prompt_width, gen_params["eos_token_id"], gen_params["pad_token_id"])
+            for i, token_ids in zip(batch_indices, rows):
+                index = pending[i]
+                results[index] = self._build_result(token_ids, len(prompt_ids[i]), prompt_width, gen_params)
+                if cache_keys[index] is not None and results[index].finish_reason != "cancelled":
+                    self.response_cache.put(cache_keys[index], results[index].text)
+        
+        return results
+    
+    def embed(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        """
+        Embed messages by mean-pooling the model's last hidden states
+        
+        Args:
+            texts: Messages to embed
+            batch_size: Number of messages encoded per forward pass
+        
+        Returns:
+            Float32 array of shape (len(texts), hidden_size) with unit-length rows
+        """
+        if self.model is None or self.tokenizer is None:
+            raise ValueError("Model not loaded. Call load_model() first.")
+        
+        # The transformer body alone; the language modeling head is not needed
+        body = self.model.base_model
+        embeddings = []
+        for start in range(0, len(texts), batch_size):
+            token_ids = [
+                self.tokenizer.encode(normalize_input(text), add_special_tokens=False) or [self.tokenizer.eos_token_id]
+                for text in texts[start:start + batch_size]
+            ]
+            width = max(len(ids) for ids in token_ids)
+            
+            # Right padding keeps positions starting at zero for every row
+            input_ids = torch.tensor(
+                [ids + [self.tokenizer.pad_token_id] * (width - len(ids)) for ids in token_ids],
+                device=self.model.device
+            )
+            attention_mask = torch.tensor(
+                [[1] * len(ids) + [0] * (width - len(ids)) for ids in token_ids],
+                device=self.model.device
+            )
+            
+            with torch.no_grad():
+                hidden = body(input_ids=input_ids, attention_mask=attention_mask).last_hidden_state.float()
+            mask = attention_mask.unsqueeze(-1).to(hidden.dtype)
+            pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1)
+            embeddings.append(torch.nn.functional.normalize(pooled, dim=-1).cpu().numpy())
+        
+        return np.concatenate(embeddings).astype(np.float32)
+    
+    def _generate(
+        self,
+        input_ids: torch.Tensor,
+        attention_mask: Optional[torch.Tensor] = None,
+        past_key_values: Any = None,
+        **gen_params
+    ):
+        """Run ``model.generate``, or speculative decoding when a draft model or prompt lookup is requested"""
+        assistant_model = gen_params.pop("assistant_model", None)
+        num_assistant_tokens = gen_params.pop("num_assistant_tokens", 5)
+        prompt_lookup_num_tokens = gen_params.pop("prompt_lookup_num_tokens", None)
+        max_matching_ngram_size = gen_params.pop("max_matching_ngram_size", 2)
+        stop_strings = gen_params.pop("stop_strings", None)
+        max_sentences = gen_params.pop("max_sentences", None)
+        if stop_strings or max_sentences:
+            # Every row's reply starts after the (padded) prompt
+            stopping_criteria = transformers.StoppingCriteriaList(gen_params.pop("stopping_criteria", None) or [])
+            stopping_criteria.append(StopOnText(self.tokenizer, input_ids.shape[1], stop_strings or (), max_sentences))
+            gen_params["stopping_criteria"] = stopping_criteria
+        speculative = (
+            (assistant_model is not None or prompt_lookup_num_tokens)
+            and input_ids.shape[0] == 1
+            and (attention_mask is None or bool(attention_mask.all()))
+            and set(gen_params) <= SUPPORTED_PARAMS
+        )
+        if not speculative:
+            if not isinstance(self.model, ExportedDecoder):
+                self._use_repetition_processors(gen_params)
+                self._use_fused_sampler(gen_params)
+            return self.model.generate(
+                input_ids,
+                attention_mask=attention_mask,
+                past_key_values=past_key_values,
+                **gen_params
+            )
+        
+        token_ids = input_ids[0].tolist()
+        if prompt_lookup_num_tokens:
+            # Candidates are copied from the prompt and conversation history
+            proposer = PromptLookupProposer(
+                num_tokens=prompt_lookup_num_tokens,
+                max_ngram_size=max_matching_ngram_size,
+                no_repeat_ngram_size=gen_params.get("no_repeat_ngram_size") or 0
+            )
+            stats = self.prompt_lookup_stats
+        else:
+            processors, warpers = build_logits_processors(self.model, gen_params, len(token_ids))
+            proposer = DraftModelProposer(
+                assistant_model,
+                processors,
+                warpers,
+                do_sample=gen_params.get("do_sample", False),
+                num_tokens=num_assistant_tokens
+            )
+            stats = self.speculative_stats
+        
+        generated, cache = speculative_generate(
+            self.model,
+            token_ids,
+            cache_to_tuples(past_key_values),
+            proposer,
+            gen_params,
+            stats=stats
+        )
+        
+        sequences = torch.tensor([token_ids + generated], device=input_ids.device)
+        if gen_params.get("return_dict_in_generate"):
+            return transformers.generation.GenerateDecoderOnlyOutput(
+                sequences=sequences,
+                past_key_values=tuples_to_cache(cache, self.model)
+            )
+        return sequences
+    
+    @staticmethod
+    def _use_repetition_processors(gen_params: Dict[str, Any]):
+        """
+        Swap the repetition settings for incremental processors
+        
+        They give the same scores as the ones ``model.generate`` builds, but
+        only look at the new tokens each step instead of the whole sequence.
+        """
+        processors = build_repetition_processors(
+            gen_params.get("repetition_penalty"), gen_params.get("no_repeat_ngram_size")
+        )
+        if not processors:
+            return
+        processors.extend(gen_params.get("logits_processor") or [])
+        gen_params["logits_processor"] = processors
+        gen_params["repetition_penalty"] = 1.0
+        gen_params["no_repeat_ngram_size"] = 0
+    
+    def _use_fused_sampler(self, gen_params: Dict[str, Any]):
+        """Swap the temperature, top-k and top-p warpers for one fused sampler when requested"""
+        if not gen_params.pop("fused_sampling", False) or not gen_params.get("do_sample"):
+            return
+        processors = transformers.LogitsProcessorList(gen_params.get("logits_processor") or [])
+        processors.append(fused_sampler(gen_params, self.model.generation_config))
+        gen_params["logits_processor"] = processors
+        # Neutral values keep model.generate from adding its own warpers
+        gen_params.update(temperature=1.0, top_p=1.0, top_k=0)
+    
+    def _build_generation_params(
+        self,
+        max_length: Optional[int] = None,
+        temperature: Optional[float] = None,
+        top_p: Optional[float] = None,
+        **kwargs
+    ) -> Dict[str, Any]:
+        """Build ``model.generate`` parameters from the model config and overrides"""
+        if self.draft_model is not None:
+            kwargs.setdefault("assistant_model", self.draft_model)
+        if self.config.get("prompt_lookup_num_tokens"):
+            kwargs.setdefault("prompt_lookup_num_tokens", self.config["prompt_lookup_num_tokens"])
+        return {
             "max_length": max_length or self.config["max_length"],
             "temperature": temperature or self.config["temperature"],
             "top_p": top_p or self.config["top_p"],
@@ -184,24 +1253,111 @@ You are Brello EI 0, an emotionally intelligent AI created by Epic Systems and e
             "no_repeat_ngram_size": self.config["no_repeat_ngram_size"],
             "min_length": self.config["min_length"],
             "max_new_tokens": self.config["max_new_tokens"],
+            "stop_strings": self.config["stop_strings"],
+            "max_sentences": self.config["max_sentences"],
+            "fused_sampling": self.config["fused_sampling"],
             **kwargs
         }
+    
+    def _response_cache_key(
+        self,
+        user_input: str,
+        gen_params: Dict[str, Any],
+        seed: Optional[int] = None
+    ) -> Optional[str]:
+        """Response cache key for a request, or None if the response must not be cached"""
+        if self.response_cache is None:
+            return None
+        params = self._cache_params(gen_params, seed)
+        return None if params is None else self.response_cache.make_key(user_input, params)
+    
+    def _semantic_cache_key(self, gen_params: Dict[str, Any], seed: Optional[int] = None) -> Optional[str]:
+        """Semantic cache key of the generation parameters, or None if the response must not be cached"""
+        if self.semantic_cache is None:
+            return None
+        params = self._cache_params(gen_params, seed)
+        return None if params is None else params_key(params)
+    
+    def _cache_params(self, gen_params: Dict[str, Any], seed: Optional[int]) -> Optional[Dict[str, Any]]:
+        """Parameters that determine a cacheable response, or None if it must not be cached"""
+        if "streamer" in gen_params:
+            return None
+        # Unseeded sampling is meant to give a different reply every time
+        if gen_params.get("do_sample") and seed is None:
+            return None
         
-        # Generate response
-        with torch.no_grad():
-            outputs = self.model.generate(
-                inputs,
-                **gen_params
-            )
-        
-        # Decode response
-        response = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
-        
-        # Extract only the assistant's response
-        if "<|assistant|>" in response:
-            response = response.split("<|assistant|>")[-1].strip()
+        params = dict(gen_params)
+        # Cancellation criteria do not change the response of a finished request
+        criteria = params.pop("stopping_criteria", None) or []
+        if not all(isinstance(criterion, StopOnEvent) for criterion in criteria):
+            return None
         
-        # Clean up the response
+        # Speculative decoding keeps the main model's output distribution, but
+        # consumes random numbers differently when sampling
+        if gen_params.get("do_sample"):
+            if params.pop("assistant_model", None) is not None:
+                params["draft_model_path"] = self.draft_model_path
+        else:
+            for key in ("assistant_model", "num_assistant_tokens", "prompt_lookup_num_tokens", "max_matching_ngram_size"):
+                params.pop(key, None)
+        params["stop_strings"] = json.dumps(list(params.get("stop_strings") or []))
+        params["seed"] = seed if gen_params.get("do_sample") else None
+        params["model_path"] = self.model_path
+        params["weights"] = self._weights_fingerprint
+        params["dtype"] = str(self.torch_dtype)
+        params["quantization"] = self._quantization_mode()
+        if self.prompt_builder.chat_template:
+            params["chat_template"] = True
+        return params
+    
+    def _quantization_mode(self) -> Optional[str]:
+        """Quantization the model was loaded with, labelled as in the model registry"""
+        if self.cpu_quantization:
+            return f"cpu-{self.cpu_quantization}"
+        if self.quantization_config is not None:
+            return "4bit" if self.quantization_config.load_in_4bit else "8bit"
+        return None
+    
+    @staticmethod
+    def _was_cancelled(gen_params: Dict[str, Any]) -> bool:
+        """Whether a cancellation criterion stopped the generation early"""
+        return any(
+            isinstance(criterion, StopOnEvent) and criterion.event.is_set()
+            for criterion in gen_params.get("stopping_criteria") or []
+        )
+    
+    @contextlib.contextmanager
+    def _seeded(self, seed: Optional[int]):
+        """Seed sampling for the duration of a generation without touching the global RNG"""
+        if seed is None:
+            yield
+            return
+        devices = [torch.cuda.current_device()] if self.device.startswith("cuda") else []
+        with torch.random.fork_rng(devices=devices):
+            torch.manual_seed(seed)
+            yield
+    
+    def _build_result(
+        self,
+        token_ids: List[int],
+        prompt_tokens: int,
+        prompt_width: int,
+        gen_params: Dict[str, Any]
+    ) -> GenerationResult:
+        """Result of a reply from its generated ids alone"""
+        max_new_tokens = gen_params.get("max_new_tokens") or gen_params["max_length"] - prompt_width
+        text, finish_reason = extract_reply(
+            self.tokenizer,
+            token_ids,
+            max_new_tokens,
+            gen_params["stop_strings"],
+            gen_params["max_sentences"],
+            self._was_cancelled(gen_params)
+        )
+        return GenerationResult(self._finalize_response(text), prompt_tokens, len(token_ids), finish_reason)
+    
+    def _finalize_response(self, response: str) -> str:
+        """Clean up a decoded response"""
         response = response.strip()
         
         # Ensure response shows emotional intelligence
@@ -210,33 +1366,95 @@ You are Brello EI 0, an emotionally intelligent AI created by Epic Systems and e
         
         return response
     
-    def chat(self, message: str, maintain_history: bool = False) -> str:
+    def chat(
+        self,
+        message: str,
+        maintain_history: bool = False,
+        session_id: str = "default",
+        **kwargs
+    ) -> str:
         """
         Simple chat interface
         
         Args:
             message: User message
             maintain_history: Whether to maintain conversation history
+            session_id: Conversation to continue when maintaining history
+            **kwargs: Additional generation parameters
             
         Returns:
             Model response
         """
-        return self.generate_response(message)
+        if maintain_history:
+            # Sessions keep their KV cache, so only the new turn is prefilled
+            return self.sessions.chat(session_id, message, **kwargs)
+        return self.generate_response(message, **kwargs)
+    
+    def memory_footprint(self) -> int:
+        """Bytes used by the loaded model weights, including the draft model"""
+        footprint = 0
+        for model in (self.model, self.draft_model):
+            if model is None:
+                continue
+            if self.cpu_quantization:
+                from cpu_quantization import model_memory_footprint
+                footprint += model_memory_footprint(model)
+            else:
+                footprint += model.get_memory_footprint()
+        return footprint
     
     def __call__(self, text: str, **kwargs) -> str:
         """Convenience method for generating responses"""
         return self.generate_response(text, **kwargs)
 
 # Convenience function for quick usage
-def load_brello_ei_0(model_path: str = "microsoft/DialoGPT-medium", **kwargs) -> BrelloEI0:
+def load_brello_ei_0(model_path: str = "microsoft/DialoGPT-medium", shared: bool = True, **kwargs) -> BrelloEI0:
     """
     Load Brello EI 0 model
     
+    Models are shared through ``model_registry``: asking again for the same
+    model path, dtype, quantization and compilation returns the already loaded instance,
+    and other options only apply when it is first loaded.
+    
     Args:
         model_path: Path to Llama 3.2 3B model
+        shared: Whether to reuse a registered instance (False always loads a new one)
         **kwargs: Additional model parameters
         
     Returns:
         BrelloEI0 instance
     """
-    return BrelloEI0(model_path=model_path, **kwargs)
+    if not shared or kwargs.get("tokenizer_only"):
+        return BrelloEI0(model_path=model_path, **kwargs)
+    return model_registry.get(
+        _registry_key(model_path, kwargs),
+        lambda: BrelloEI0(model_path=model_path, **kwargs)
+    )
+
+def _registry_key(model_path: str, kwargs: Dict[str, Any]) -> tuple:
+    """Registry identity of a model: path, weights, device, dtype, quantization, compilation and prompt layout"""
+    from cpu_quantization import weights_fingerprint
+    
+    if kwargs.get("cpu_quantization"):
+        device = kwargs.get("device") or "cpu"
+    else:
+        device = kwargs.get("device") or ("cuda" if torch.cuda.is_available() else "cpu")
+    torch_dtype = kwargs.get("torch_dtype")
+    if kwargs.get("load_in_4bit"):
+        quantization = "4bit"
+    elif kwargs.get("load_in_8bit"):
+        quantization = "8bit"
+    elif kwargs.get("cpu_quantization"):
+        quantization = f"cpu-{kwargs['cpu_quantization']}"
+    else:
+        quantization = None
+    return (
+        model_path,
+        # A model rewritten in place is loaded again
+        weights_fingerprint(model_path),
+        device,
+        str(torch_dtype) if torch_dtype else ("autotune" if kwargs.get("autotune") else "auto"),
+        quantization,
+        bool(kwargs.get("compile")),
+        bool(kwargs.get("use_chat_template"))
+    )
@@ -0,0 +1,450 @@
+#!/usr/bin/env python3
+"""
+Brello Serve - Brello EI 0
+Created by Epic Systems | Engineered by Rehan Temkar
+
+Local HTTP server with an OpenAI-compatible chat completions API. One model
+is loaded when the server starts and stays warm. Every request goes through
+a continuous batching engine, so concurrent requests are decoded together:
+    
+    python brello_serve.py --model microsoft/DialoGPT-medium --port 8000
+
+Endpoints:
+
+- ``POST /v1/chat/completions``: chat completions, streamed as server-sent
+  events with ``"stream": true``
+- ``GET /v1/models``: the served model
+- ``GET /health``: liveness; answers as soon as the process is up
+- ``GET /ready``: readiness; 503 until the model is loaded and warm
+"""
+
+from __future__ import annotations
+
+import json
+import time
+import uuid
+import logging
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from continuous_batching import ContinuousBatchingEngine
+from streaming import TokenStreamer, stream_text
+from generation_output import extract_reply
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL_NAME = "brello-ei-0"
+
+# Largest request body accepted
+MAX_BODY_BYTES = 1 << 20
+
+# Stop strings a request may add, as in the OpenAI API
+MAX_STOP_STRINGS = 4
+
+class RequestError(ValueError):
+    """Invalid request, reported to the client as an OpenAI-style error"""
+    
+    def __init__(self, message: str, status: int = 400, code: Optional[str] = None, param: Optional[str] = None):
+        super().__init__(message)
+        self.status = status
+        self.code = code
+        self.param = param
+
+def message_text(message: Dict[str, Any]) -> str:
+    """Text of a chat message whose content is a string or a list of text parts"""
+    content = message.get("content")
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        parts = []
+        for part in content:
+            if not isinstance(part, dict) or part.get("type") != "text":
+                raise RequestError("Only text content parts are supported", param="messages")
+            parts.append(str(part.get("text", "")))
+        return "".join(parts)
+    if content is None:
+        return ""
+    raise RequestError("Message content must be a string or a list of text parts", param="messages")
+
+def conversation_turns(messages: Any) -> Tuple[List[Tuple[str, str]], str]:
+    """
+    Split OpenAI chat messages into earlier turns and the message to reply to
+    
+    System and developer messages are skipped: the model's persona is part
+    of its fixed system prompt.
+    
+    Args:
+        messages: The request's ``messages`` list
+    
+    Returns:
+        (user message, reply) pairs of the earlier turns, and the final user message
+    """
+    if not isinstance(messages, list) or not messages:
+        raise RequestError("messages must be a non-empty list", param="messages")
+    
+    turns: List[Tuple[str, str]] = []
+    pending: List[str] = []
+    for message in messages:
+        if not isinstance(message, dict):
+            raise RequestError("Every message must be an object", param="messages")
+        role = message.get("role")
+        if role in ("system", "developer"):
+            continue
+        if role == "user":
+            pending.append(message_text(message))
+        elif role == "assistant":
+            turns.append(("\n".join(pending), message_text(message)))
+            pending = []
+        else:
+            raise RequestError(f"Unsupported message role: {role!r}", param="messages")
+    
+    if not pending:
+        raise RequestError("The last message must be from the user", param="messages")
+    return turns, "\n".join(pending)
+
+class BrelloServer(ThreadingHTTPServer):
+    """HTTP server holding the warm model and its batching engine"""
+    
+    daemon_threads = True
+    
+    def __init__(
+        self,
+        address: Tuple[str, int],
+        loader: Callable[[], Any],
+        model_name: str = DEFAULT_MODEL_NAME,
+        max_batch_size: int = 8
+    ):
+        """
+        Initialize the server; the model is loaded by ``load()``
+        
+        Args:
+            address: (host, port) to listen on
+            loader: Returns the loaded BrelloEI0 instance
+            model_name: Model name reported to clients
+            max_batch_size: Maximum number of requests decoded together
+        """
+        super().__init__(address, BrelloRequestHandler)
+        self.loader = loader
+        self.model_name = model_name
+        self.max_batch_size = max_batch_size
+        self.created = int(time.time())
+        self.brello = None
+        self.engine: Optional[ContinuousBatchingEngine] = None
+        self.load_error: Optional[str] = None
+    
+    @property
+    def ready(self) -> bool:
+        """Whether the model is loaded and the engine is running"""
+        return self.engine is not None
+    
+    def load(self):
+        """Load the model and start the batching engine"""
+        try:
+            brello = self.loader()
+            engine = ContinuousBatchingEngine(brello, max_batch_size=self.max_batch_size)
+            engine.start()
+        except Exception as e:
+            logger.error(f"❌ Failed to load the model: {e}")
+            self.load_error = str(e)
+            return
+        self.brello = brello
+        self.engine = engine
+        logger.info(f"✅ Serving {self.model_name} on http://{self.server_address[0]}:{self.server_address[1]}")
+    
+    def load_in_background(self) -> threading.Thread:
+        """Load the model in a background thread so health checks answer meanwhile"""
+        thread = threading.Thread(target=self.load, name="brello-load", daemon=True)
+        thread.start()
+        return thread
+    
+    def server_close(self):
+        super().server_close()
+        if self.engine is not None:
+            self.engine.stop()
+
+class BrelloRequestHandler(BaseHTTPRequestHandler):
+    """Routes requests to the health, readiness, models and chat completions endpoints"""
+    
+    server_version = "BrelloServe/0"
+    server: BrelloServer
+    
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        if path == "/health":
+            self._send_json(200, {"status": "ok"})
+        elif path == "/ready":
+            if self.server.ready:
+                self._send_json(200, {"status": "ready", "model": self.server.model_name})
+            elif self.server.load_error is not None:
+                self._send_json(503, {"status": "failed", "error": self.server.load_error})
+            else:
+                self._send_json(503, {"status": "loading"})
+        elif path == "/v1/models":
+            self._send_json(200, {
+                "object": "list",
+                "data": [{
+                    "id": self.server.model_name,
+                    "object": "model",
+                    "created": self.server.created,
+                    "owned_by": "brello"
+                }]
+            })
+        else:
+            self._send_error(RequestError(f"Unknown endpoint: {path}", status=404, code="not_found"))
+    
+    def do_POST(self):
+        path = urlsplit(self.path).path
+        if path != "/v1/chat/completions":
+            self._send_error(RequestError(f"Unknown endpoint: {path}", status=404, code="not_found"))
+            return
+        try:
+            self._chat_completions()
+        except RequestError as e:
+            self._send_error(e)
+    
+    def log_message(self, format: str, *args):
+        logger.info(f"{self.address_string()} {format % args}")
+    
+    def _chat_completions(self):
+        """Handle a chat completion request"""
+        if not self.server.ready:
+            raise RequestError("The model is still loading", status=503, code="model_not_ready")
+        
+        body = self._read_json()
+        request = self._parse_request(body)
+        brello = self.server.brello
+        streamer = TokenStreamer()
+        future = self.server.engine.submit(
+            None,
+            prompt_ids=request["prompt_ids"],
+            max_new_tokens=request["max_new_tokens"],
+            temperature=request["temperature"],
+            top_p=request["top_p"],
+            do_sample=request["do_sample"],
+            streamer=streamer,
+            stop_strings=request["stop_strings"]
+        )
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        token_ids: List[int] = []
+        
+        def tokens() -> Iterator[int]:
+            for token_id in streamer:
+                token_ids.append(token_id)
+                yield token_id
+        
+        if request["stream"]:
+            pieces = stream_text(tokens(), brello.tokenizer, request["stop_strings"])
+            if self._stream(completion_id, pieces, future):
+                self._write_event(self._chunk(completion_id, {}, self._finish_reason(token_ids, request)))
+                self._write_event("[DONE]")
+            return
+        
+        try:
+            # The same text a streamed reply sends, so both modes return the same content
+            content = "".join(stream_text(tokens(), brello.tokenizer, request["stop_strings"]))
+            future.result()
+        except Exception as e:
+            logger.error(f"❌ Generation failed: {e}")
+            raise RequestError(str(e), status=500, code="generation_failed")
+        
+        prompt_tokens = len(request["prompt_ids"])
+        self._send_json(200, {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": self.server.model_name,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": self._finish_reason(token_ids, request)
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": len(token_ids),
+                "total_tokens": prompt_tokens + len(token_ids)
+            }
+        })
+    
+    def _parse_request(self, body: Any) -> Dict[str, Any]:
+        """Validate a chat completion request and build its prompt"""
+        if not isinstance(body, dict):
+            raise RequestError("The request body must be a JSON object")
+        brello = self.server.brello
+        config = brello.config
+        
+        if body.get("n", 1) != 1:
+            raise RequestError("Only n=1 is supported", param="n")
+        max_new_tokens = body.get("max_completion_tokens") or body.get("max_tokens") or config["max_new_tokens"]
+        if not isinstance(max_new_tokens, int) or max_new_tokens < 1:
+            raise RequestError("max_tokens must be a positive integer", param="max_tokens")
+        temperature = body.get("temperature")
+        if temperature is not None and (not isinstance(temperature, (int, float)) or not 0 <= temperature <= 2):
+            raise RequestError("temperature must be between 0 and 2", param="temperature")
+        top_p = body.get("top_p")
+        if top_p is not None and (not isinstance(top_p, (int, float)) or not 0 < top_p <= 1):
+            raise RequestError("top_p must be in (0, 1]", param="top_p")
+        stop = body.get("stop")
+        if isinstance(stop, str):
+            stop = [stop]
+        if stop is not None and (
+            not isinstance(stop, list) or len(stop) > MAX_STOP_STRINGS
+            or not all(isinstance(text, str) and text for text in stop)
+        ):
+            raise RequestError(
+                f"stop must be a string or a list of at most {MAX_STOP_STRINGS} non-empty strings", param="stop"
+            )
+        
+        # Drop the oldest turns until the prompt and the reply fit the context
+        turns, user_input = conversation_turns(body.get("messages"))
+        limit = brello._context_limit() - max_new_tokens
+        prompt_ids = brello._tokenize_conversation(turns, user_input)
+        while len(prompt_ids) > limit and turns:
+            turns.pop(0)
+            prompt_ids = brello._tokenize_conversation(turns, user_input)
+        if len(prompt_ids) > limit:
+            raise RequestError(
+                f"The prompt ({len(prompt_ids)} tokens) and max_tokens ({max_new_tokens}) exceed "
+                f"the model's context of {brello._context_limit()} tokens",
+                code="context_length_exceeded",
+                param="messages"
+            )
+        
+        return {
+            "prompt_ids": prompt_ids,
+            "max_new_tokens": max_new_tokens,
+            "temperature": temperature or None,
+            "top_p": top_p,
+            "do_sample": False if temperature == 0 else None,
+            # The turn layout's stop strings always apply; the client's come on top
+            "stop_strings": list(config["stop_strings"]) + (stop or []),
+            "stream": bool(body.get("stream", False))
+        }
+    
+    def _stream(self, completion_id: str, pieces: Iterator[str], future) -> bool:
+        """
+        Send the reply as server-sent events as its text is generated
+        
+        Returns:
+            Whether the reply was sent in full
+        """
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        
+        try:
+            self._write_event(self._chunk(completion_id, {"role": "assistant", "content": ""}))
+            for piece in pieces:
+                self._write_event(self._chunk(completion_id, {"content": piece}))
+            return True
+        except (BrokenPipeError, ConnectionResetError):
+            # The client went away; drop the request from the batch
+            future.cancel()
+            logger.info(f"{completion_id}: client disconnected")
+        except Exception as e:
+            logger.error(f"❌ Streaming generation failed: {e}")
+            self._write_event({"error": {"message": str(e), "type": "server_error", "code": "generation_failed"}})
+        return False
+    
+    def _finish_reason(self, token_ids: List[int], request: Dict[str, Any]) -> str:
+        """'length' when the reply was cut off by max_tokens, 'stop' when it ended with EOS or a stop string"""
+        tokenizer = self.server.brello.tokenizer
+        return extract_reply(tokenizer, token_ids, request["max_new_tokens"], request["stop_strings"])[1]
+    
+    def _chunk(self, completion_id: str, delta: Dict[str, Any], finish_reason: Optional[str] = None) -> Dict[str, Any]:
+        return {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": self.server.model_name,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+        }
+    
+    def _write_event(self, data: Any):
+        payload = data if isinstance(data, str) else json.dumps(data)
+        self.wfile.write(f"data: {payload}\n\n".encode("utf-8"))
+        self.wfile.flush()
+    
+    def _read_json(self) -> Any:
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            raise RequestError("Content-Length must be an integer", status=400)
+        if length < 0:
+            raise RequestError("Content-Length must not be negative", status=400)
+        if length > MAX_BODY_BYTES:
+            raise RequestError("Request body too large", status=413)
+        try:
+            return json.loads(self.rfile.read(length) or b"null")
+        except ValueError:
+            raise RequestError("The request body is not valid JSON")
+    
+    def _send_json(self, status: int, payload: Dict[str, Any]):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def _send_error(self, error: RequestError):
+        error_type = "invalid_request_error" if error.status < 500 else "server_error"
+        self._send_json(error.status, {
+            "error": {"message": str(error), "type": error_type, "param": error.param, "code": error.code}
+        })
+
+def main():
+    """Run the server"""
+    parser = argparse.ArgumentParser(description="OpenAI-compatible Brello EI 0 server")
+    parser.add_argument("--model", default="microsoft/DialoGPT-medium", help="Model, snapshot or exported package")
+    parser.add_argument("--served-model-name", default=DEFAULT_MODEL_NAME, help="Model name reported to clients")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on")
+    parser.add_argument("--port", type=int, default=8000, help="Port to listen on")
+    parser.add_argument("--device", default=None, help="Device to run on")
+    parser.add_argument("--cpu-quantization", default=None, help="CPU quantization mode ('int8' or 'int4')")
+    parser.add_argument("--autotune", action="store_true", help="Use the fastest CPU precision and thread count")
+    parser.add_argument("--compile", action="store_true", help="Run the decoder through torch.compile")
+    parser.add_argument("--chat-template", action="store_true", help="Lay prompts out with the tokenizer's chat template")
+    parser.add_argument("--max-batch-size", type=int, default=8, help="Maximum number of requests decoded together")
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO)
+    
+    def loader():
+        from brello_ei_0 import BrelloEI0
+        
+        return BrelloEI0(
+            model_path=args.model,
+            device=args.device,
+            cpu_quantization=args.cpu_quantization,
+            autotune=args.autotune,
+            compile=args.compile,
+            use_chat_template=args.chat_template
+        )
+    
+    server = BrelloServer(
+        (args.host, args.port),
+        loader,
+        model_name=args.served_model_name,
+        max_batch_size=args.max_batch_size
+    )
+    print("🤖 Brello EI 0 - Serve")
+    print("Created by Epic Systems | Engineered by Rehan Temkar")
+    print("=" * 50)
+    print(f"Listening on http://{args.host}:{args.port} (loading {args.model})")
+    
+    server.load_in_background()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 Shutting down")
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
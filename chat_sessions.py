@@ -0,0 +1,306 @@
+"""
+Chat Sessions - Brello EI 0
+Created by Epic Systems | Engineered by Rehan Temkar
+
+Stateful multi-turn conversations. Each session keeps the conversation's
+token ids and the model's past-key-values between turns, so a new turn only
+prefills the new user text instead of the whole conversation.
+"""
+
+from __future__ import annotations
+
+import time
+import threading
+import logging
+from collections import OrderedDict
+from typing import Optional, List, Tuple
+
+from lazy_imports import lazy_import
+from kv_cache import cache_to_tuples, tuples_to_cache, crop
+from stop_sequences import truncate_reply_ids
+
+torch = lazy_import("torch")
+
+logger = logging.getLogger(__name__)
+
+# Closes the previous assistant reply before the next user turn, matching the
+# conversation layout used in training
+TURN_SEPARATOR = "\n</s>\n"
+
+def render_turns(brello, turns: List[Tuple[str, str]]) -> str:
+    """
+    Render earlier turns of a conversation as prompt text
+    
+    Args:
+        brello: BrelloEI0 instance whose turn format is used
+        turns: (user message, reply) pairs, oldest first
+    
+    Returns:
+        Text of the turns, to go between the system prompt and the new user turn
+    """
+    return "".join(brello._user_turn(user) + reply + TURN_SEPARATOR for user, reply in turns)
+
+class ChatSession:
+    """
+    A single conversation with a persistent KV cache
+    """
+    
+    def __init__(self, brello, session_id: str):
+        """
+        Initialize a chat session
+        
+        Args:
+            brello: Loaded BrelloEI0 instance
+            session_id: Identifier of the session
+        """
+        self.brello = brello
+        self.session_id = session_id
+        self.history: List[Tuple[str, str]] = []
+        self.last_used = time.monotonic()
+        self._token_ids: List[int] = []
+        self._cache = None
+        self._lock = threading.Lock()
+    
+    def send(
+        self,
+        message: str,
+        max_length: Optional[int] = None,
+        temperature: Optional[float] = None,
+        top_p: Optional[float] = None,
+        **kwargs
+    ) -> str:
+        """
+        Send a message and generate a reply in the context of the conversation
+        
+        Args:
+            message: User's message
+            max_length: Maximum response length
+            temperature: Sampling temperature
+            top_p: Top-p sampling parameter
+            **kwargs: Additional generation parameters
+        
+        Returns:
+            Generated emotionally intelligent response
+        """
+        brello = self.brello
+        tokenizer = brello.tokenizer
+        
+        with self._lock:
+            self.last_used = time.monotonic()
+            gen_params = brello._build_generation_params(max_length, temperature, top_p, **kwargs)
+            
+            if brello.prompt_builder.chat_template:
+                token_ids, cache = self._layout_conversation(message, gen_params["max_new_tokens"])
+            else:
+                if self._token_ids:
+                    new_ids = tokenizer.encode(
+                        TURN_SEPARATOR + brello._user_turn(message), add_special_tokens=False
+                    )
+                    token_ids = self._token_ids + new_ids
+                    cache = self._cache
+                else:
+                    token_ids, cache = self._start_conversation(message)
+                
+                # Drop the oldest turns when the conversation no longer fits
+                if len(token_ids) + gen_params["max_new_tokens"] > self._context_limit():
+                    token_ids, cache = self._truncate_history(message, gen_params["max_new_tokens"])
+            
+            with torch.no_grad():
+                outputs = brello._generate(
+                    torch.tensor([token_ids], device=brello.model.device),
+                    attention_mask=torch.ones((1, len(token_ids)), dtype=torch.long, device=brello.model.device),
+                    past_key_values=tuples_to_cache(cache, brello.model),
+                    return_dict_in_generate=True,
+                    **gen_params
+                )
+            
+            generated = outputs.sequences[0, len(token_ids):].tolist()
+            if generated and generated[-1] == tokenizer.eos_token_id:
+                generated = generated[:-1]
+            # A stop string belongs to the turn layout, not the reply; the next
+            # turn adds its own separator
+            generated, reply = truncate_reply_ids(
+                tokenizer, generated, gen_params["stop_strings"], gen_params["max_sentences"]
+            )
+            
+            # The cache covers every fed token, i.e. all but the last sampled one
+            self._token_ids = token_ids + generated
+            self._cache = crop(cache_to_tuples(outputs.past_key_values), len(self._token_ids))
+            
+            reply = reply.strip()
+            self.history.append((message, reply))
+            self.last_used = time.monotonic()
+        
+        return brello._finalize_response(reply)
+    
+    def reset(self):
+        """Forget the conversation and free its KV cache"""
+        with self._lock:
+            self.history = []
+            self._token_ids = []
+            self._cache = None
+    
+    @property
+    def num_tokens(self) -> int:
+        """Number of tokens in the conversation so far"""
+        return len(self._token_ids)
+    
+    def _start_conversation(self, message: str):
+        """Token ids and cache for the first turn, reusing the system prompt KV"""
+        return self._start_conversation_ids(self.brello._tokenize_prompts([message])[0])
+    
+    def _start_conversation_ids(self, token_ids: List[int]):
+        """Token ids and cache for prompt ids that start with the system prompt"""
+        inputs = self.brello._prepare_inputs([token_ids])
+        return token_ids, cache_to_tuples(inputs["past_key_values"])
+    
+    def _truncate_history(self, message: str, max_new_tokens: int):
+        """Rebuild the conversation from the most recent turns that fit the context"""
+        brello = self.brello
+        limit = self._context_limit() - max_new_tokens
+        
+        # Kept turns go between the system prompt and the new turn, so the
+        # system prompt's ids, and its cache if there is one, stay valid
+        turns = list(self.history)
+        token_ids = brello._tokenize_conversation(turns, message)
+        while len(token_ids) > limit and turns:
+            turns.pop(0)
+            token_ids = brello._tokenize_conversation(turns, message)
+        
+        logger.info(f"Session {self.session_id}: kept {len(turns)} of {len(self.history)} turns to fit the context")
+        self.history = turns
+        if len(token_ids) > limit:
+            return token_ids[len(token_ids) - limit:], None
+        return self._start_conversation_ids(token_ids)
+    
+    def _layout_conversation(self, message: str, max_new_tokens: int):
+        """
+        Token ids and cache for a turn when prompts follow the tokenizer's chat template
+        
+        The template decides how turns are joined, so the whole conversation
+        is laid out again. The cache is kept for the ids it shares with the
+        previous turn.
+        """
+        brello = self.brello
+        limit = self._context_limit() - max_new_tokens
+        turns = list(self.history)
+        token_ids = brello._tokenize_conversation(turns, message)
+        while len(token_ids) > limit and turns:
+            turns.pop(0)
+            token_ids = brello._tokenize_conversation(turns, message)
+        if len(turns) < len(self.history):
+            logger.info(f"Session {self.session_id}: kept {len(turns)} of {len(self.history)} turns to fit the context")
+            self.history = turns
+        if len(token_ids) > limit:
+            return token_ids[len(token_ids) - limit:], None
+        
+        shared = 0
+        for previous_id, token_id in zip(self._token_ids, token_ids):
+            if previous_id != token_id:
+                break
+            shared += 1
+        if shared <= len(brello._prefix_ids or []) or self._cache is None:
+            return self._start_conversation_ids(token_ids)
+        # At least the last prompt token is fed to the model
+        return token_ids, crop(self._cache, min(shared, len(token_ids) - 1))
+    
+    def _context_limit(self) -> int:
+        return self.brello._context_limit()
+
+class SessionManager:
+    """
+    Bounded collection of chat sessions
+    
+    Sessions idle for longer than ``idle_timeout`` seconds are dropped, and
+    when ``max_sessions`` is reached the least recently used session is
+    evicted to make room for a new one.
+    """
+    
+    def __init__(self, brello, max_sessions: int = 64, idle_timeout: float = 1800.0):
+        """
+        Initialize the session manager
+        
+        Args:
+            brello: Loaded BrelloEI0 instance
+            max_sessions: Maximum number of sessions kept in memory
+            idle_timeout: Seconds of inactivity before a session is dropped
+        """
+        if max_sessions < 1:
+            raise ValueError("max_sessions must be at least 1")
+        
+        self.brello = brello
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self._sessions: "OrderedDict[str, ChatSession]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, session_id: str) -> ChatSession:
+        """
+        Get a session, creating it if needed
+        
+        Args:
+            session_id: Identifier of the session
+        
+        Returns:
+            The chat session
+        """
+        with self._lock:
+            self._evict_expired()
+            
+            session = self._sessions.get(session_id)
+            if session is None:
+                while len(self._sessions) >= self.max_sessions:
+                    evicted_id, _ = self._sessions.popitem(last=False)
+                    logger.info(f"Evicted least recently used chat session {evicted_id}")
+                session = ChatSession(self.brello, session_id)
+                self._sessions[session_id] = session
+            
+            self._sessions.move_to_end(session_id)
+            return session
+    
+    def chat(self, session_id: str, message: str, **kwargs) -> str:
+        """
+        Send a message within a session
+        
+        Args:
+            session_id: Identifier of the session
+            message: User's message
+            **kwargs: Generation parameters passed to ``ChatSession.send()``
+        
+        Returns:
+            Generated emotionally intelligent response
+        """
+        return self.get(session_id).send(message, **kwargs)
+    
+    def end(self, session_id: str):
+        """Close a session and free its KV cache"""
+        with self._lock:
+            self._sessions.pop(session_id, None)
+    
+    def evict_expired(self) -> int:
+        """
+        Drop sessions that have been idle for longer than the timeout
+        
+        Returns:
+            Number of sessions dropped
+        """
+        with self._lock:
+            return self._evict_expired()
+    
+    def __len__(self) -> int:
+        return len(self._sessions)
+    
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._sessions
+    
+    def _evict_expired(self) -> int:
+        now = time.monotonic()
+        expired = [
+            session_id for session_id, session in self._sessions.items()
+            if now - session.last_used > self.idle_timeout
+        ]
+        for session_id in expired:
+            del self._sessions[session_id]
+        if expired:
+            logger.info(f"Dropped {len(expired)} idle chat sessions")
+        return len(expired)
@@ -0,0 +1,431 @@
+"""
+Continuous Batching Engine - Brello EI 0
+Created by Epic Systems | Engineered by Rehan Temkar
+
+In-process scheduler that keeps a running decode batch on top of BrelloEI0.
+New requests are admitted into the batch at token boundaries and finished
+sequences leave it as soon as they produce EOS or a stop string, so a short
+reply never waits behind a long one.
+"""
+
+from __future__ import annotations
+
+import threading
+import logging
+from collections import deque
+from concurrent.futures import Future
+from typing import Optional, List, Deque, Sequence
+
+from lazy_imports import lazy_import
+from streaming import TokenStreamer
+from stop_sequences import ReplyStopper, truncate_reply
+from fused_sampling import FusedSampler
+from speculative_decoding import build_logits_processors
+from kv_cache import (
+    cache_to_tuples,
+    tuples_to_cache,
+    cache_length,
+    concat_batches,
+    select_batch,
+    trim_left
+)
+
+torch = lazy_import("torch")
+transformers = lazy_import("transformers")
+
+logger = logging.getLogger(__name__)
+
+class _Sequence:
+    """A single request tracked by the engine"""
+    
+    def __init__(
+        self,
+        prompt_ids: List[int],
+        max_new_tokens: int,
+        do_sample: bool,
+        future: Future,
+        processors: transformers.LogitsProcessorList,
+        warpers: transformers.LogitsProcessorList,
+        device,
+        streamer: Optional[TokenStreamer] = None,
+        stopper: Optional[ReplyStopper] = None
+    ):
+        self.prompt_ids = prompt_ids
+        self.generated_ids: List[int] = []
+        self.max_new_tokens = max_new_tokens
+        self.do_sample = do_sample
+        self.future = future
+        self.streamer = streamer
+        self.stopper = stopper
+        self.processors = processors
+        self.warpers = warpers
+        # Room for the whole reply, so each step writes one token instead of
+        # building the sequence tensor again
+        self.token_ids = torch.empty((1, len(prompt_ids) + max_new_tokens), dtype=torch.long, device=device)
+        self.token_ids[0, :len(prompt_ids)] = torch.tensor(prompt_ids, dtype=torch.long)
+        self.length = len(prompt_ids)
+    
+    @property
+    def input_ids(self) -> torch.Tensor:
+        """Prompt and generated ids so far, shape (1, length)"""
+        return self.token_ids[:, :self.length]
+    
+    def append(self, token: int):
+        self.token_ids[0, self.length] = token
+        self.length += 1
+        self.generated_ids.append(token)
+
+class ContinuousBatchingEngine:
+    """
+    Continuous batching engine for concurrent chat requests
+    
+    Every call to ``step()`` first admits waiting requests into the running
+    batch (prefilling only the new prompts), then runs one decode step for
+    the whole batch and retires sequences that hit EOS, a stop string or
+    their token limit.
+    """
+    
+    def __init__(self, brello, max_batch_size: int = 8):
+        """
+        Initialize the engine
+        
+        Args:
+            brello: Loaded BrelloEI0 instance
+            max_batch_size: Maximum number of sequences decoded together
+        """
+        if brello.model is None or brello.tokenizer is None:
+            raise ValueError("Model not loaded. Call load_model() first.")
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        
+        self.brello = brello
+        self.model = brello.model
+        self.tokenizer = brello.tokenizer
+        self.max_batch_size = max_batch_size
+        self.eos_token_id = self.tokenizer.eos_token_id
+        
+        self._waiting: Deque[_Sequence] = deque()
+        self._active: List[_Sequence] = []
+        
+        # Running batch state: cache and attention mask cover every position
+        # already in the cache, ``_next_tokens`` holds the sampled tokens that
+        # still have to be fed to the model
+        self._cache = None
+        self._attention_mask: Optional[torch.Tensor] = None
+        self._next_tokens: Optional[torch.Tensor] = None
+        
+        self._lock = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+    
+    def submit(
+        self,
+        user_input: Optional[str],
+        max_new_tokens: Optional[int] = None,
+        temperature: Optional[float] = None,
+        top_p: Optional[float] = None,
+        do_sample: Optional[bool] = None,
+        prompt_ids: Optional[List[int]] = None,
+        streamer: Optional[TokenStreamer] = None,
+        stop_strings: Optional[Sequence[str]] = None,
+        max_sentences: Optional[int] = None,
+        fused_sampling: Optional[bool] = None,
+        **kwargs
+    ) -> Future:
+        """
+        Queue a message for generation
+        
+        Args:
+            user_input: User's message
+            max_new_tokens: Maximum number of tokens to generate
+            temperature: Sampling temperature (0 decodes greedily)
+            top_p: Top-p sampling parameter
+            do_sample: Whether to sample (False decodes greedily; default from the model config)
+            prompt_ids: Token ids of an already built prompt, used instead of ``user_input``
+            streamer: Streamer receiving each generated token id as it is sampled
+            stop_strings: Text that ends the reply (default from the model config)
+            max_sentences: Sentences after which the reply ends (default from the model config)
+            fused_sampling: Whether to sample with the fused sampler (default from the model config)
+            **kwargs: Additional generation parameters (e.g. top_k, min_new_tokens)
+        
+        Returns:
+            Future resolved with the generated response
+        
+        Raises:
+            ValueError: If the prompt and token limit do not fit in the model's context
+        """
+        if prompt_ids is None:
+            prompt_ids = self.brello._tokenize_prompts([user_input])[0]
+        if temperature == 0:
+            temperature, do_sample = None, False
+        overrides = {
+            "max_new_tokens": max_new_tokens,
+            "do_sample": do_sample,
+            "stop_strings": stop_strings,
+            "max_sentences": max_sentences,
+            "fused_sampling": fused_sampling
+        }
+        # Same parameters, and so the same processors and warpers, as ``generate_response``
+        gen_params = self.brello._build_generation_params(
+            None, temperature, top_p, **{key: value for key, value in overrides.items() if value is not None}, **kwargs
+        )
+        max_new_tokens = gen_params["max_new_tokens"]
+        if len(prompt_ids) + max_new_tokens > self.brello._context_limit():
+            raise ValueError(
+                f"The prompt ({len(prompt_ids)} tokens) and max_new_tokens ({max_new_tokens}) exceed "
+                f"the model's context of {self.brello._context_limit()} tokens"
+            )
+        
+        # Each sequence keeps its own n-gram table and token counts between steps
+        processors, warpers = build_logits_processors(self.model, gen_params, len(prompt_ids))
+        stop_strings, max_sentences = gen_params["stop_strings"], gen_params["max_sentences"]
+        future: Future = Future()
+        sequence = _Sequence(
+            prompt_ids=prompt_ids,
+            max_new_tokens=max_new_tokens,
+            do_sample=gen_params["do_sample"],
+            future=future,
+            processors=processors,
+            warpers=warpers,
+            device=self.model.device,
+            streamer=streamer,
+            stopper=ReplyStopper(self.tokenizer, stop_strings, max_sentences) if stop_strings or max_sentences else None
+        )
+        if streamer is not None:
+            # Streamers skip the first ids they get, which ``generate`` uses for the prompt
+            streamer.put(torch.tensor(prompt_ids))
+        
+        with self._lock:
+            self._waiting.append(sequence)
+            self._lock.notify()
+        return future
+    
+    def generate(self, user_inputs: List[str], **kwargs) -> List[str]:
+        """
+        Generate responses for several messages through the engine
+        
+        Drives the engine from the calling thread when the background loop
+        is not running.
+        
+        Args:
+            user_inputs: User messages
+            **kwargs: Per-request parameters passed to ``submit()``
+        
+        Returns:
+            Generated responses in input order
+        """
+        futures = [self.submit(text, **kwargs) for text in user_inputs]
+        if not self._running:
+            while self.has_work():
+                self.step()
+        return [future.result() for future in futures]
+    
+    def has_work(self) -> bool:
+        """Whether any request is waiting or being decoded"""
+        with self._lock:
+            return bool(self._waiting or self._active)
+    
+    def start(self):
+        """Run the engine loop in a background thread"""
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._loop, name="brello-batching", daemon=True)
+        self._thread.start()
+        logger.info(f"Continuous batching engine started (max batch size {self.max_batch_size})")
+    
+    def stop(self):
+        """Stop the background loop once the current step finishes"""
+        with self._lock:
+            self._running = False
+            self._lock.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+    
+    def _loop(self):
+        while True:
+            with self._lock:
+                while self._running and not (self._waiting or self._active):
+                    self._lock.wait()
+                if not self._running:
+                    return
+            try:
+                self.step()
+            except Exception as e:
+                logger.error(f"❌ Continuous batching step failed: {e}")
+                self._fail_all(e)
+    
+    def step(self):
+        """Admit waiting requests, then run one decode step for the batch"""
+        self._admit()
+        if not self._active:
+            return
+        
+        batch_size = len(self._active)
+        attention_mask = torch.cat(
+            [self._attention_mask, self._attention_mask.new_ones(batch_size, 1)], dim=1
+        )
+        # Position of the new token is the number of real tokens before it
+        position_ids = self._attention_mask.sum(dim=1, keepdim=True)
+        
+        with torch.no_grad():
+            outputs = self.model(
+                input_ids=self._next_tokens.unsqueeze(1),
+                attention_mask=attention_mask,
+                position_ids=position_ids,
+                past_key_values=tuples_to_cache(self._cache, self.model),
+                use_cache=True
+            )
+        
+        self._cache = cache_to_tuples(outputs.past_key_values)
+        self._attention_mask = attention_mask
+        self._next_tokens = self._sample(self._active, outputs.logits[:, -1, :])
+        self._retire_finished()
+    
+    def _admit(self):
+        """Prefill waiting requests and merge them into the running batch"""
+        with self._lock:
+            free_slots = self.max_batch_size - len(self._active)
+            admitted = [self._waiting.popleft() for _ in range(min(free_slots, len(self._waiting)))]
+        if not admitted:
+            return
+        
+        # Pad the new prompts so their last tokens line up; only the columns
+        # not covered by the cached system prompt are prefilled
+        try:
+            inputs = self.brello._prepare_inputs([sequence.prompt_ids for sequence in admitted])
+            attention_mask = inputs["attention_mask"]
+            cached_length = inputs["cached_length"]
+            position_ids = (attention_mask.cumsum(dim=1) - 1).clamp(min=0)
+            
+            with torch.no_grad():
+                outputs = self.model(
+                    input_ids=inputs["input_ids"][:, cached_length:],
+                    attention_mask=attention_mask,
+                    position_ids=position_ids[:, cached_length:],
+                    past_key_values=inputs["past_key_values"],
+                    use_cache=True
+                )
+            
+            new_cache = cache_to_tuples(outputs.past_key_values)
+            new_tokens = self._sample(admitted, outputs.logits[:, -1, :])
+        except Exception as e:
+            # Only the new requests fail; the running batch is untouched
+            logger.error(f"❌ Continuous batching prefill failed: {e}")
+            self._fail(admitted, e)
+            return
+        
+        if self._active:
+            length = max(cache_length(self._cache), cache_length(new_cache))
+            self._cache = concat_batches([self._cache, new_cache])
+            self._attention_mask = torch.cat([
+                self._pad_mask(self._attention_mask, length),
+                self._pad_mask(attention_mask, length)
+            ], dim=0)
+            self._next_tokens = torch.cat([self._next_tokens, new_tokens])
+        else:
+            self._cache = new_cache
+            self._attention_mask = attention_mask
+            self._next_tokens = new_tokens
+        self._active.extend(admitted)
+        
+        self._retire_finished()
+    
+    def _sample(self, sequences: List[_Sequence], logits: torch.Tensor) -> torch.Tensor:
+        """Pick the next token for every sequence and record it"""
+        next_tokens = []
+        for sequence, row in zip(sequences, logits.float()):
+            input_ids = sequence.input_ids
+            scores = sequence.processors(input_ids, row.unsqueeze(0))
+            
+            if not sequence.do_sample:
+                token = scores[0].argmax()
+            elif len(sequence.warpers) == 1 and isinstance(sequence.warpers[0], FusedSampler):
+                token = sequence.warpers[0].sample(scores)[0]
+            else:
+                scores = sequence.warpers(input_ids, scores)
+                token = torch.multinomial(torch.softmax(scores, dim=-1), num_samples=1)[0, 0]
+            
+            sequence.append(int(token))
+            if sequence.stopper is not None:
+                sequence.stopper.push([int(token)])
+            if sequence.streamer is not None:
+                sequence.streamer.put(token.reshape(1))
+            next_tokens.append(token)
+        return torch.stack(next_tokens)
+    
+    def _retire_finished(self):
+        """Resolve and remove sequences that hit EOS, a stop string or their token limit"""
+        keep = []
+        for row, sequence in enumerate(self._active):
+            stopper = sequence.stopper
+            finished = (
+                sequence.generated_ids[-1] == self.eos_token_id
+                or len(sequence.generated_ids) >= sequence.max_new_tokens
+                or (stopper is not None and stopper.stopped)
+            )
+            if sequence.future.cancelled():
+                if sequence.streamer is not None:
+                    sequence.streamer.end()
+                continue
+            if not finished:
+                keep.append(row)
+                continue
+            
+            if sequence.streamer is not None:
+                sequence.streamer.end()
+            generated = sequence.generated_ids
+            if generated[-1] == self.eos_token_id:
+                generated = generated[:-1]
+            response = self.tokenizer.decode(generated, skip_special_tokens=True)
+            if stopper is not None:
+                response = truncate_reply(response, stopper.stop_strings, stopper.max_sentences)
+            sequence.future.set_result(self.brello._finalize_response(response))
+        
+        if len(keep) == len(self._active):
+            return
+        if not keep:
+            self._reset_batch()
+            return
+        
+        indices = torch.tensor(keep, device=self._attention_mask.device)
+        self._active = [self._active[row] for row in keep]
+        self._cache = select_batch(self._cache, indices)
+        self._attention_mask = self._attention_mask.index_select(0, indices)
+        self._next_tokens = self._next_tokens.index_select(0, indices)
+        
+        # Drop leading columns that are padding for every remaining sequence
+        real_columns = self._attention_mask.any(dim=0).nonzero()
+        padding = int(real_columns[0]) if len(real_columns) else 0
+        if padding:
+            self._cache = trim_left(self._cache, padding)
+            self._attention_mask = self._attention_mask[:, padding:]
+    
+    def _reset_batch(self):
+        self._active = []
+        self._cache = None
+        self._attention_mask = None
+        self._next_tokens = None
+    
+    def _fail_all(self, error: Exception):
+        with self._lock:
+            sequences = self._active + list(self._waiting)
+            self._waiting.clear()
+        self._reset_batch()
+        self._fail(sequences, error)
+    
+    @staticmethod
+    def _fail(sequences: List[_Sequence], error: Exception):
+        for sequence in sequences:
+            if sequence.streamer is not None:
+                sequence.streamer.fail(error)
+            if not sequence.future.done():
+                sequence.future.set_exception(error)
+    
+    @staticmethod
+    def _pad_mask(mask: torch.Tensor, length: int) -> torch.Tensor:
+        missing = length - mask.shape[1]
+        if missing <= 0:
+            return mask
+        return torch.cat([mask.new_zeros(mask.shape[0], missing), mask], dim=1)
@@ -0,0 +1,261 @@
+"""
+CPU Autotuning - Brello EI 0
+Created by Epic Systems | Engineered by Rehan Temkar
+
+Picks the fastest way to run a model on this machine's CPU. The CPU is
+probed for the instruction sets that matter (bf16 is only tried where the
+hardware computes it natively), then each precision is timed on a short
+greedy generation at a few thread counts. The fastest configuration whose
+next-token predictions stay close enough to fp32 wins.
+
+Results are cached per host, model and torch version, so the benchmark runs
+once per machine and later loads apply the tuned settings straight away.
+"""
+
+from __future__ import annotations
+
+import os
+import json
+import time
+import socket
+import hashlib
+import logging
+import platform
+from typing import Any, Dict, List, Optional, Sequence
+
+from lazy_imports import lazy_import
+from weight_snapshot import is_snapshot
+from exported_decoder import is_exported
+
+torch = lazy_import("torch")
+
+logger = logging.getLogger(__name__)
+
+AUTOTUNE_PRECISIONS = ("fp32", "bf16", "int8")
+
+# CPU flags reported by the probe
+CPU_FLAGS = ("avx2", "fma", "avx512f", "avx512_vnni", "avx512_bf16", "amx_bf16", "amx_int8")
+
+# Minimum top-1 agreement with fp32 for a precision to be chosen
+MIN_AGREEMENT = 0.95
+
+AUTOTUNE_PROMPT = "I'm feeling really anxious about my job interview tomorrow."
+AUTOTUNE_TOKENS = 32
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "brello_ei_0", "autotune")
+
+def probe_cpu() -> Dict[str, Any]:
+    """
+    Describe the CPU the process runs on
+    
+    Returns:
+        CPU model name, relevant instruction set flags, the vector capability
+        torch dispatches to, usable cores and whether bf16 is native
+    """
+    name, flags = platform.processor(), set()
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                key = key.strip()
+                if key == "model name":
+                    name = value.strip()
+                elif key == "flags":
+                    flags = set(value.split())
+                    break
+    except OSError:
+        pass
+    
+    if hasattr(os, "sched_getaffinity"):
+        cores = len(os.sched_getaffinity(0))
+    else:
+        cores = os.cpu_count() or 1
+    
+    return {
+        "name": name,
+        "flags": [flag for flag in CPU_FLAGS if flag in flags],
+        "capability": torch.backends.cpu.get_cpu_capability(),
+        "cores": cores,
+        "native_bf16": bool(flags & {"avx512_bf16", "amx_bf16"})
+    }
+
+def thread_candidates(cores: int) -> List[int]:
+    """Thread counts worth timing on a machine with the given number of cores"""
+    return sorted({1, max(1, cores // 2), cores})
+
+def precision_kwargs(precision: str) -> Dict[str, Any]:
+    """BrelloEI0 arguments that load a model in the given precision"""
+    if precision == "fp32":
+        return {"torch_dtype": torch.float32}
+    if precision == "bf16":
+        return {"torch_dtype": torch.bfloat16}
+    if precision == "int8":
+        return {"cpu_quantization": "int8"}
+    raise ValueError(f"precision must be one of {AUTOTUNE_PRECISIONS}")
+
+def cache_file(cache_dir: Optional[str], model_path: str, cpu: Dict[str, Any]) -> str:
+    """
+    Path of the cached tuning of a model on this host
+    
+    Args:
+        cache_dir: Cache directory (None for the default)
+        model_path: Model that was tuned
+        cpu: Probe of the CPU the tuning ran on
+    
+    Returns:
+        Cache file path
+    """
+    name = os.path.abspath(model_path) if os.path.isdir(model_path) else model_path
+    identity = json.dumps([name, cpu["name"], cpu["flags"], cpu["cores"], torch.__version__])
+    digest = hashlib.sha1(identity.encode("utf-8")).hexdigest()[:16]
+    return os.path.join(cache_dir or DEFAULT_CACHE_DIR, f"{socket.gethostname()}-{digest}.json")
+
+def load_tuning(model_path: str, cache_dir: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    Cached tuning of a model on this host
+    
+    Args:
+        model_path: Model that was tuned
+        cache_dir: Cache directory (None for the default)
+    
+    Returns:
+        The tuning, or None if the model has not been tuned on this host
+    """
+    path = cache_file(cache_dir, model_path, probe_cpu())
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"⚠️  Ignoring unreadable autotune cache {path}: {e}")
+        return None
+
+def _reference_predictions(model, prompt_ids: List[int], reply_ids: List[int]):
+    """Teacher-forced top-1 predictions of a model over a reply"""
+    input_ids = torch.tensor([prompt_ids + reply_ids], device=model.device)
+    with torch.no_grad():
+        logits = model.model(input_ids).logits[0, len(prompt_ids) - 1:-1]
+    return logits.argmax(-1).cpu()
+
+def autotune(
+    model_path: str,
+    cache_dir: Optional[str] = None,
+    precisions: Sequence[str] = AUTOTUNE_PRECISIONS,
+    thread_counts: Optional[Sequence[int]] = None,
+    min_agreement: float = MIN_AGREEMENT,
+    max_new_tokens: int = AUTOTUNE_TOKENS
+) -> Dict[str, Any]:
+    """
+    Time every precision and thread count on this CPU and cache the fastest
+    
+    fp32 always runs first: its greedy reply is the reference that the other
+    precisions are scored against, by how often their teacher-forced top-1
+    prediction matches. Snapshots and exported packages have their dtype fixed
+    when they were written, so only their thread count (and int8, for
+    snapshots) is tuned, with "fp32" standing for the stored dtype.
+    
+    Args:
+        model_path: Model, snapshot or exported package to tune
+        cache_dir: Cache directory (None for the default)
+        precisions: Precisions to try, from 'fp32', 'bf16' and 'int8'
+        thread_counts: Thread counts to try (default 1, half and all of the usable cores)
+        min_agreement: Minimum top-1 agreement with fp32 for a precision to be chosen
+        max_new_tokens: Tokens generated per timing run
+    
+    Returns:
+        The chosen precision and thread count, with the result of every run
+    """
+    from brello_ei_0 import BrelloEI0
+    
+    for precision in precisions:
+        precision_kwargs(precision)
+    cpu = probe_cpu()
+    thread_counts = sorted(set(thread_counts or thread_candidates(cpu["cores"])))
+    if is_exported(model_path):
+        precisions = ["fp32"]
+    elif is_snapshot(model_path):
+        precisions = [precision for precision in precisions if precision != "bf16"]
+    precisions = ["fp32"] + [precision for precision in precisions if precision != "fp32"]
+    
+    logger.info(f"Autotuning {model_path} on {cpu['name']} ({cpu['cores']} cores, {cpu['capability']})")
+    original_threads = torch.get_num_threads()
+    results = []
+    reference = None
+    try:
+        for precision in precisions:
+            if precision == "bf16" and not cpu["native_bf16"]:
+                results.append({"precision": precision, "skipped": "no native bf16 support"})
+                continue
+            
+            model = BrelloEI0(
+                model_path=model_path,
+                device="cpu",
+                response_cache_size=0,
+                **precision_kwargs(precision)
+            )
+            prompt_ids = model._tokenize_prompts([AUTOTUNE_PROMPT])[0]
+            if reference is None:
+                with torch.no_grad():
+                    inputs = model._prepare_inputs([prompt_ids])
+                    output_ids = model.model.generate(
+                        inputs["input_ids"],
+                        attention_mask=inputs["attention_mask"],
+                        past_key_values=inputs["past_key_values"],
+                        max_new_tokens=max_new_tokens,
+                        min_new_tokens=max_new_tokens,
+                        do_sample=False,
+                        pad_token_id=model.tokenizer.pad_token_id
+                    )
+                reply_ids = output_ids[0, inputs["input_ids"].shape[1]:].tolist()
+                reference = _reference_predictions(model, prompt_ids, reply_ids)
+                agreement = 1.0
+            else:
+                predictions = _reference_predictions(model, prompt_ids, reply_ids)
+                agreement = (predictions == reference).float().mean().item()
+            
+            for num_threads in thread_counts:
+                torch.set_num_threads(num_threads)
+                model._warmup_generate([prompt_ids], max_new_tokens=2)
+                tokens_per_second = model._warmup_generate([prompt_ids], max_new_tokens=max_new_tokens)
+                results.append({
+                    "precision": precision,
+                    "dtype": str(model.torch_dtype),
+                    "num_threads": num_threads,
+                    "tokens_per_second": tokens_per_second,
+                    "agreement": agreement
+                })
+                logger.info(
+                    f"{precision} x {num_threads} threads: {tokens_per_second:.1f} tokens/s, "
+                    f"{agreement:.1%} agreement with fp32"
+                )
+            del model
+    finally:
+        torch.set_num_threads(original_threads)
+    
+    eligible = [result for result in results if result.get("agreement", 0.0) >= min_agreement]
+    best = max(eligible, key=lambda result: result["tokens_per_second"])
+    tuning = {
+        "model_path": model_path,
+        "host": socket.gethostname(),
+        "cpu": cpu,
+        "torch_version": torch.__version__,
+        "created": time.time(),
+        "min_agreement": min_agreement,
+        "precision": best["precision"],
+        "num_threads": best["num_threads"],
+        "tokens_per_second": best["tokens_per_second"],
+        "results": results
+    }
+    
+    path = cache_file(cache_dir, model_path, cpu)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(tuning, f, indent=2)
+    os.replace(tmp_path, path)
+    logger.info(
+        f"✅ Autotuned {model_path}: {best['precision']} with {best['num_threads']} threads "
+        f"({best['tokens_per_second']:.1f} tokens/s), saved to {path}"
+    )
+    return tuning
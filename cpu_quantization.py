@@ -0,0 +1,361 @@
+"""
+CPU Quantization - Brello EI 0
+Created by Epic Systems | Engineered by Rehan Temkar
+
+Quantized inference modes that run on plain CPUs, without bitsandbytes:
+
+- ``int8``: dynamic int8 quantization of the Linear layers. Weights are
+  stored as int8 per output channel, and activations are quantized on the
+  fly so the matrix products run in int8.
+- ``int4``: weight-only 4-bit quantization. Weights are stored as 4-bit
+  values with a scale and offset per group of inputs, and dequantized on
+  the fly. It saves the most memory, at some cost in speed.
+
+The output layer stays in full precision in both modes. Quantized models are
+cached to disk, so later loads skip both the fp32 load and the quantization.
+The cache is keyed by the size and modification time of the model's weight
+files, so changed weights are quantized again.
+"""
+
+from __future__ import annotations
+
+import os
+import hashlib
+import logging
+import tempfile
+from typing import Any, Optional
+
+from lazy_imports import lazy_import
+
+torch = lazy_import("torch")
+transformers = lazy_import("transformers")
+
+logger = logging.getLogger(__name__)
+
+CPU_QUANTIZATION_MODES = ("int8", "int4")
+
+# Inputs sharing one 4-bit scale and offset
+INT4_GROUP_SIZE = 64
+
+# Int4 layers multiply by the packed weights directly for up to this many
+# tokens (decoding), and dequantize the whole weight for longer inputs
+INT4_BMM_MAX_TOKENS = 32
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "brello_ei_0", "quantized")
+
+# Files whose size and modification time key the cache
+WEIGHT_FILE_EXTENSIONS = (".safetensors", ".bin", ".pt", ".pth")
+
+class Int4Linear(torch.nn.Module):
+    """Linear layer with group-wise 4-bit weights, dequantized on the fly"""
+    
+    def __init__(self, in_features: int, out_features: int, bias: bool = True, group_size: int = INT4_GROUP_SIZE):
+        """
+        Initialize an empty layer
+        
+        Args:
+            in_features: Size of each input
+            out_features: Size of each output
+            bias: Whether the layer has a bias
+            group_size: Inputs sharing one scale and offset
+        """
+        super().__init__()
+        self.in_features = in_features
+        self.out_features = out_features
+        self.group_size = group_size
+        groups = in_features // group_size
+        
+        # Laid out [group, input pair, output] so each group is a ready-made
+        # matrix for bmm; even inputs are in the low nibble, odd in the high one
+        self.register_buffer("packed_weight", torch.zeros(groups, group_size // 2, out_features, dtype=torch.uint8))
+        self.register_buffer("scales", torch.ones(groups, out_features, dtype=torch.float16))
+        self.register_buffer("offsets", torch.zeros(groups, out_features, dtype=torch.float16))
+        if bias:
+            self.bias = torch.nn.Parameter(torch.zeros(out_features))
+        else:
+            self.register_parameter("bias", None)
+    
+    @classmethod
+    def from_linear(cls, linear, group_size: int = INT4_GROUP_SIZE) -> "Int4Linear":
+        """
+        Quantize a ``torch.nn.Linear`` layer
+        
+        Args:
+            linear: Layer to quantize
+            group_size: Inputs sharing one scale and offset
+        
+        Returns:
+            Quantized layer
+        """
+        weight = linear.weight.detach().float()
+        grouped = weight.reshape(linear.out_features, -1, group_size)
+        
+        # Round the scale and offset first so quantization uses the values
+        # that dequantization will see
+        low = grouped.amin(dim=-1, keepdim=True).half().float()
+        scales = ((grouped.amax(dim=-1, keepdim=True) - low) / 15).half().float()
+        scales[scales == 0] = 1.0
+        values = ((grouped - low) / scales).round().clamp(0, 15).to(torch.uint8)
+        packed = values[..., 0::2] | (values[..., 1::2] << 4)
+        
+        layer = cls(linear.in_features, linear.out_features, linear.bias is not None, group_size)
+        layer.packed_weight.copy_(packed.permute(1, 2, 0))
+        layer.scales.copy_(scales.squeeze(-1).t())
+        layer.offsets.copy_(low.squeeze(-1).t())
+        if linear.bias is not None:
+            layer.bias.data.copy_(linear.bias.detach())
+        return layer
+    
+    def dequantize(self, dtype=None) -> torch.Tensor:
+        """Weight matrix in floating point, shaped like ``torch.nn.Linear.weight``"""
+        dtype = dtype or torch.float32
+        values = torch.stack([self.packed_weight & 0x0F, self.packed_weight >> 4], dim=2)
+        values = values.reshape(-1, self.group_size, self.out_features).to(dtype)
+        weight = values * self.scales.to(dtype).unsqueeze(1) + self.offsets.to(dtype).unsqueeze(1)
+        return weight.reshape(self.in_features, self.out_features).t()
+    
+    def forward(self, input: torch.Tensor) -> torch.Tensor:
+        x = input.reshape(-1, self.in_features)
+        tokens = x.shape[0]
+        
+        if tokens > INT4_BMM_MAX_TOKENS:
+            # Long prompts: dequantizing once is cheaper than a bmm per group
+            output = torch.nn.functional.linear(x, self.dequantize(x.dtype))
+        else:
+            # Decoding: multiply by the raw 4-bit values one group at a time and
+            # apply the scales and offsets to the much smaller per-group results
+            groups = self.in_features // self.group_size
+            pairs = x.reshape(tokens, groups, self.group_size // 2, 2).permute(1, 0, 3, 2)
+            partial = torch.bmm(pairs[:, :, 0], (self.packed_weight & 0x0F).to(x.dtype))
+            partial = torch.baddbmm(partial, pairs[:, :, 1], (self.packed_weight >> 4).to(x.dtype))
+            output = (partial * self.scales.to(x.dtype).unsqueeze(1)).sum(dim=0)
+            output = output + x.reshape(tokens, groups, self.group_size).sum(dim=-1) @ self.offsets.to(x.dtype)
+        
+        if self.bias is not None:
+            output = output + self.bias.to(x.dtype)
+        return output.reshape(*input.shape[:-1], self.out_features)
+    
+    def extra_repr(self) -> str:
+        return f"in_features={self.in_features}, out_features={self.out_features}, group_size={self.group_size}"
+
+def conv1d_to_linear(model):
+    """
+    Replace GPT-2 style ``Conv1D`` layers with equivalent ``torch.nn.Linear`` layers
+    
+    ``Conv1D`` stores its weight transposed and is not recognized by the
+    quantizers, so it is converted first.
+    
+    Args:
+        model: Model to convert in place
+    """
+    from transformers.pytorch_utils import Conv1D
+    
+    for module in list(model.modules()):
+        for name, child in list(module.named_children()):
+            if isinstance(child, Conv1D):
+                in_features, out_features = child.weight.shape
+                linear = torch.nn.Linear(
+                    in_features,
+                    out_features,
+                    device=child.weight.device,
+                    dtype=child.weight.dtype
+                )
+                linear.weight = torch.nn.Parameter(child.weight.detach().t().contiguous())
+                linear.bias = child.bias
+                setattr(module, name, linear)
+
+def quantize_model(model, mode: str):
+    """
+    Quantize a full-precision model in place
+    
+    Args:
+        model: fp32 model on CPU
+        mode: One of ``CPU_QUANTIZATION_MODES``
+    """
+    conv1d_to_linear(model)
+    _replace_linears(model, mode, lambda linear: _quantize_linear(linear, mode))
+
+def model_memory_footprint(model) -> int:
+    """Bytes used by a model's weights, including packed int8 weights"""
+    from torch.ao.nn.quantized.dynamic import Linear as DynamicQuantizedLinear
+    
+    footprint = model.get_memory_footprint()
+    for module in model.modules():
+        if isinstance(module, DynamicQuantizedLinear):
+            weight, bias = module._packed_params._weight_bias()
+            footprint += weight.numel() * weight.element_size()
+            if bias is not None:
+                footprint += bias.numel() * bias.element_size()
+    return footprint
+
+def cache_file(cache_dir: Optional[str], model_path: str, mode: str) -> str:
+    """
+    Path of the cached quantized weights of a model
+    
+    Args:
+        cache_dir: Cache directory (None for the default)
+        model_path: Model the weights come from
+        mode: Quantization mode
+    
+    Returns:
+        Cache file path
+    """
+    name = os.path.abspath(model_path) if os.path.isdir(model_path) else model_path
+    name = name.strip(os.sep).replace(os.sep, "--").replace(":", "--")
+    fingerprint = weights_fingerprint(model_path)
+    suffix = f"-{fingerprint}" if fingerprint else ""
+    return os.path.join(cache_dir or DEFAULT_CACHE_DIR, f"{name}-{mode}{suffix}.pt")
+
+def weights_fingerprint(model_path: str) -> Optional[str]:
+    """
+    Short hash of the names, sizes and modification times of a model's weight files
+    
+    Args:
+        model_path: Model directory, or a Hugging Face model id already in the local hub cache
+    
+    Returns:
+        Fingerprint, or None if the weight files cannot be found locally
+    """
+    model_dir = model_path
+    if not os.path.isdir(model_dir):
+        try:
+            from huggingface_hub import snapshot_download
+            model_dir = snapshot_download(model_path, local_files_only=True)
+        except Exception:
+            return None
+    
+    entries = []
+    for name in sorted(os.listdir(model_dir)):
+        if name.endswith(WEIGHT_FILE_EXTENSIONS):
+            stat = os.stat(os.path.join(model_dir, name))
+            entries.append(f"{name}:{stat.st_size}:{stat.st_mtime_ns}")
+    if not entries:
+        return None
+    return hashlib.sha256("\n".join(entries).encode()).hexdigest()[:16]
+
+def save_quantized(model, path: str, model_path: str, mode: str):
+    """
+    Cache a quantized model's weights
+    
+    Args:
+        model: Model quantized with ``quantize_model()``
+        path: Cache file
+        model_path: Model the weights come from
+        mode: Quantization mode
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    
+    # Non-persistent buffers (e.g. rotary frequencies) are not in the state
+    # dict, but the meta-device skeleton needs real values for them
+    state_dict = model.state_dict()
+    buffers = {name: buffer for name, buffer in model.named_buffers() if name not in state_dict}
+    
+    # Write to a temporary file first so an interrupted save, or another
+    # process saving the same model, never leaves a truncated cache file
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            torch.save({
+                "model_path": model_path,
+                "mode": mode,
+                "torch_version": str(torch.__version__),
+                "transformers_version": transformers.__version__,
+                "state_dict": state_dict,
+                "buffers": buffers
+            }, f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    logger.info(f"Saved {mode} quantized weights to {path}")
+
+def load_quantized(path: str, model_path: str, mode: str) -> Optional[Any]:
+    """
+    Load a model from cached quantized weights
+    
+    Args:
+        path: Cache file written by ``save_quantized()``
+        model_path: Model the weights must come from
+        mode: Quantization mode the weights must use
+    
+    Returns:
+        Quantized model, or None if there is no matching, readable cache
+    """
+    if not os.path.exists(path):
+        return None
+    
+    try:
+        data = torch.load(path, map_location="cpu", weights_only=True)
+    except Exception as e:
+        logger.warning(f"⚠️  Could not read quantized weights at {path} ({e}); quantizing again")
+        return None
+    
+    # Packed int8 weights depend on the torch build that created them, and
+    # the module layout (buffers included) on the transformers release
+    if (
+        data["model_path"] != model_path
+        or data["mode"] != mode
+        or data["torch_version"] != str(torch.__version__)
+        or data.get("transformers_version") != transformers.__version__
+    ):
+        logger.warning(f"⚠️  Quantized weights at {path} do not match this model; quantizing again")
+        return None
+    
+    config = transformers.AutoConfig.from_pretrained(model_path, trust_remote_code=True)
+    with torch.device("meta"):
+        model = transformers.AutoModelForCausalLM.from_config(config, trust_remote_code=True)
+        conv1d_to_linear(model)
+    _replace_linears(model, mode, lambda linear: _empty_quantized_linear(linear, mode))
+    
+    model.load_state_dict(data["state_dict"], strict=True, assign=True)
+    for name, buffer in data["buffers"].items():
+        module_name, _, buffer_name = name.rpartition(".")
+        model.get_submodule(module_name).register_buffer(buffer_name, buffer, persistent=False)
+    model.tie_weights()
+    
+    try:
+        model.generation_config = transformers.GenerationConfig.from_pretrained(model_path)
+    except OSError:
+        pass
+    model.eval()
+    logger.info(f"Loaded {mode} quantized weights from {path}")
+    return model
+
+def _replace_linears(model, mode: str, factory):
+    """Swap every quantizable Linear layer for the layer ``factory`` returns"""
+    output_layer = model.get_output_embeddings()
+    for module in list(model.modules()):
+        for name, child in list(module.named_children()):
+            if (
+                type(child) is torch.nn.Linear
+                and child is not output_layer
+                and (mode != "int4" or child.in_features % INT4_GROUP_SIZE == 0)
+            ):
+                setattr(module, name, factory(child))
+
+def _quantize_linear(linear, mode: str):
+    """Quantize one Linear layer"""
+    if mode == "int4":
+        return Int4Linear.from_linear(linear)
+    
+    from torch.ao.nn.quantized.dynamic import Linear as DynamicQuantizedLinear
+    from torch.ao.quantization import per_channel_dynamic_qconfig
+    
+    linear.qconfig = per_channel_dynamic_qconfig
+    return DynamicQuantizedLinear.from_float(linear)
+
+def _empty_quantized_linear(linear, mode: str):
+    """Quantized layer of the right shape for cached weights to be loaded into"""
+    if mode == "int4":
+        with torch.device("meta"):
+            return Int4Linear(linear.in_features, linear.out_features, linear.bias is not None)
+    
+    from torch.ao.nn.quantized.dynamic import Linear as DynamicQuantizedLinear
+    
+    with torch.device("cpu"):
+        return DynamicQuantizedLinear(
+            linear.in_features,
+            linear.out_features,
+            bias_=linear.bias is not None,
+            dtype=torch.qint8
+        )
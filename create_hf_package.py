@@ -25,7 +25,39 @@ def main():
     # Copy main files
     print("📁 Copying files...")
     shutil.copy("brello_ei_0.py", hf_dir / "brello_ei_0.py")
+    shutil.copy("kv_cache.py", hf_dir / "kv_cache.py")
+    shutil.copy("continuous_batching.py", hf_dir / "continuous_batching.py")
+    shutil.copy("chat_sessions.py", hf_dir / "chat_sessions.py")
+    shutil.copy("streaming.py", hf_dir / "streaming.py")
+    shutil.copy("async_brello_ei_0.py", hf_dir / "async_brello_ei_0.py")
+    shutil.copy("response_cache.py", hf_dir / "response_cache.py")
+    shutil.copy("semantic_cache.py", hf_dir / "semantic_cache.py")
+    shutil.copy("speculative_decoding.py", hf_dir / "speculative_decoding.py")
+    shutil.copy("lazy_imports.py", hf_dir / "lazy_imports.py")
+    shutil.copy("light_tokenizer.py", hf_dir / "light_tokenizer.py")
+    shutil.copy("model_registry.py", hf_dir / "model_registry.py")
+    shutil.copy("weight_snapshot.py", hf_dir / "weight_snapshot.py")
+    shutil.copy("cpu_quantization.py", hf_dir / "cpu_quantization.py")
+    shutil.copy("model_compile.py", hf_dir / "model_compile.py")
+    shutil.copy("exported_decoder.py", hf_dir / "exported_decoder.py")
+    shutil.copy("export_model.py", hf_dir / "export_model.py")
+    shutil.copy("cpu_autotune.py", hf_dir / "cpu_autotune.py")
+    shutil.copy("worker_pool.py", hf_dir / "worker_pool.py")
+    shutil.copy("brello_serve.py", hf_dir / "brello_serve.py")
+    shutil.copy("request_scheduler.py", hf_dir / "request_scheduler.py")
+    shutil.copy("stop_sequences.py", hf_dir / "stop_sequences.py")
+    shutil.copy("logits_processors.py", hf_dir / "logits_processors.py")
+    shutil.copy("fused_sampling.py", hf_dir / "fused_sampling.py")
+    shutil.copy("generation_output.py", hf_dir / "generation_output.py")
+    shutil.copy("prompt_builder.py", hf_dir / "prompt_builder.py")
     shutil.copy("example_usage.py", hf_dir / "example_usage.py")
+    shutil.copy("benchmark_decoding.py", hf_dir / "benchmark_decoding.py")
+    shutil.copy("benchmark_startup.py", hf_dir / "benchmark_startup.py")
+    shutil.copy("benchmark_quantization.py", hf_dir / "benchmark_quantization.py")
+    shutil.copy("benchmark_autotune.py", hf_dir / "benchmark_autotune.py")
+    shutil.copy("benchmark_workers.py", hf_dir / "benchmark_workers.py")
+    shutil.copy("benchmark_stopping.py", hf_dir / "benchmark_stopping.py")
+    shutil.copy("benchmark_sampling.py", hf_dir / "benchmark_sampling.py")
     shutil.copy("test_brello_ei_0.py", hf_dir / "test_brello_ei_0.py")
     shutil.copy("requirements.txt", hf_dir / "requirements.txt")
     
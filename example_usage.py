@@ -6,7 +6,7 @@ Created by Epic Systems | Engineered by Rehan Temkar
 Demonstrates how to use Brello EI 0 for emotionally intelligent conversations.
 """
 
-from brello_ei_0 import BrelloEI0, load_brello_ei_0
+from brello_ei_0 import load_brello_ei_0
 
 def main():
     """Example usage of Brello EI 0"""
@@ -20,7 +20,7 @@ def main():
     
     try:
         # Load the model with standard loading
-        model = BrelloEI0(
+        model = load_brello_ei_0(
             model_path="microsoft/DialoGPT-medium",
             load_in_4bit=False
         )
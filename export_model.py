@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Export Brello EI 0
+Created by Epic Systems | Engineered by Rehan Temkar
+
+Builds the ahead-of-time compiled package of Brello EI 0. Workers that load
+the package start without constructing the model or compiling it:
+
+    python export_model.py --model microsoft/DialoGPT-medium --output brello_ei_0_exported
+"""
+
+import argparse
+import time
+
+from brello_ei_0 import BrelloEI0
+from exported_decoder import MAX_BATCH_SIZE
+
+MESSAGE = "I'm feeling really anxious about my job interview tomorrow."
+
+def main():
+    """Export the model and check the package against it"""
+    parser = argparse.ArgumentParser(description="Export Brello EI 0 ahead of time")
+    parser.add_argument("--model", default="microsoft/DialoGPT-medium", help="Model or snapshot to export")
+    parser.add_argument("--output", default="brello_ei_0_exported", help="Package directory")
+    parser.add_argument("--device", default="cpu", help="Device the package will run on")
+    parser.add_argument("--max-batch-size", type=int, default=MAX_BATCH_SIZE, help="Largest batch the package accepts")
+    args = parser.parse_args()
+    
+    print("🤖 Exporting Brello EI 0")
+    print("Created by Epic Systems | Engineered by Rehan Temkar")
+    print("=" * 50)
+    
+    model = BrelloEI0(model_path=args.model, device=args.device, response_cache_size=0)
+    model.config["do_sample"] = False
+    
+    start_time = time.perf_counter()
+    model.export_package(args.output, max_batch_size=args.max_batch_size)
+    print(f"📦 Exported to {args.output} in {time.perf_counter() - start_time:.1f}s")
+    
+    start_time = time.perf_counter()
+    exported = BrelloEI0(model_path=args.output, response_cache_size=0)
+    print(f"⚡ Package loaded in {time.perf_counter() - start_time:.2f}s")
+    exported.config["do_sample"] = False
+    
+    # Greedy replies should match the model the package was exported from
+    expected = model.generate_response(MESSAGE, max_new_tokens=32)
+    reply = exported.generate_response(MESSAGE, max_new_tokens=32)
+    print(f"✅ Greedy reply matches the original model: {reply == expected}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,412 @@
+"""
+Exported Decoder - Brello EI 0
+Created by Epic Systems | Engineered by Rehan Temkar
+
+Ahead-of-time export of the decoder. One forward step (new tokens plus the
+KV cache in, logits plus the extended cache out) is captured with
+``torch.export`` and compiled to native code with AOTInductor. The weights
+are kept out of the compiled package, in a safetensors file that is
+memory-mapped and handed to the kernels as is. Loading a package therefore
+constructs no model class, compiles nothing and copies no weights.
+
+``ExportedDecoder`` exposes the parts of the transformers model interface
+that Brello EI 0 uses (forward calls, ``generate``, ``device``, ``config``),
+so a loaded package is a drop-in replacement for the model.
+"""
+
+from __future__ import annotations
+
+import os
+import json
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+from lazy_imports import lazy_import
+from kv_cache import cache_to_tuples, tuples_to_cache, cache_length
+
+torch = lazy_import("torch")
+transformers = lazy_import("transformers")
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FILE = "brello_export.json"
+PACKAGE_FILE = "decoder.pt2"
+WEIGHTS_FILE = "weights.safetensors"
+
+# Largest batch the exported step accepts
+MAX_BATCH_SIZE = 64
+
+def is_exported(path: str) -> bool:
+    """Whether a path is a package written by ``export_decoder()``"""
+    return os.path.isfile(os.path.join(path, EXPORT_FILE))
+
+def require_aoti():
+    """
+    Check that the installed torch can build and load AOTInductor packages
+    
+    Packages with their weights outside the compiled code need
+    ``aoti_compile_and_package``, ``aoti_load_package`` and the
+    ``aot_inductor.package_constants_*`` options of recent torch releases.
+    
+    Raises:
+        RuntimeError: If the installed torch lacks them
+    """
+    import torch._inductor
+    import torch._inductor.config
+    
+    if not (
+        hasattr(torch._inductor, "aoti_compile_and_package")
+        and hasattr(torch._inductor, "aoti_load_package")
+        and hasattr(torch._inductor.config.aot_inductor, "package_constants_on_disk_format")
+    ):
+        raise RuntimeError(
+            f"Ahead-of-time export needs AOTInductor packaging, which torch {torch.__version__} "
+            "does not have; upgrade torch to export or load decoder packages"
+        )
+
+def export_decoder(model, path: str, info: Dict[str, Any], max_batch_size: int = MAX_BATCH_SIZE):
+    """
+    Export and compile a model's decoder step into a package directory
+    
+    Args:
+        model: Loaded model, in the dtype and on the device it should be served on
+        path: Destination directory
+        info: Extra fields stored in the package description
+        max_batch_size: Largest batch the package will accept
+    """
+    from safetensors.torch import save_file
+    
+    require_aoti()
+    os.makedirs(path, exist_ok=True)
+    device = model.device
+    package_path = os.path.join(path, PACKAGE_FILE)
+    
+    # The KV layout (layers, heads, head size) is read off a real forward
+    # pass rather than from config fields that differ between architectures
+    with torch.no_grad():
+        probe = model(input_ids=torch.zeros((1, 1), dtype=torch.long, device=device), use_cache=True)
+    pairs = cache_to_tuples(probe.past_key_values)
+    layers = len(pairs)
+    _, heads, _, head_dim = pairs[0][0].shape
+    dtype = pairs[0][0].dtype
+    max_positions = (
+        getattr(model.config, "max_position_embeddings", None)
+        or getattr(model.config, "n_positions", None)
+        or 4096
+    )
+    
+    # Example sizes of 2 and more keep every dimension symbolic
+    batch_size, tokens, past = 2, 3, 4
+    example = (
+        torch.zeros((batch_size, tokens), dtype=torch.long, device=device),
+        torch.ones((batch_size, past), dtype=torch.long, device=device),
+        torch.ones((batch_size, tokens), dtype=torch.long, device=device),
+        torch.arange(past, past + tokens, device=device).expand(batch_size, tokens).contiguous(),
+        torch.zeros((layers, batch_size, heads, past, head_dim), dtype=dtype, device=device),
+        torch.zeros((layers, batch_size, heads, past, head_dim), dtype=dtype, device=device)
+    )
+    batch = torch.export.Dim("batch", min=1, max=max_batch_size)
+    new_tokens = torch.export.Dim("tokens", min=1, max=max_positions)
+    cached = torch.export.Dim("past", min=1, max=max_positions)
+    dynamic_shapes = {
+        "input_ids": {0: batch, 1: new_tokens},
+        "past_mask": {0: batch, 1: cached},
+        "token_mask": {0: batch, 1: new_tokens},
+        "position_ids": {0: batch, 1: new_tokens},
+        "keys": {1: batch, 3: cached},
+        "values": {1: batch, 3: cached}
+    }
+    
+    logger.info(f"Exporting the decoder step ({layers} layers, {heads} KV heads of size {head_dim})")
+    step = _decoder_step(model)
+    with torch.no_grad():
+        program = torch.export.export(step, example, dynamic_shapes=dynamic_shapes, strict=False)
+        logger.info("Compiling the exported decoder with AOTInductor")
+        torch._inductor.aoti_compile_and_package(
+            program,
+            package_path=package_path,
+            inductor_configs={
+                "aot_inductor.package_constants_in_so": False,
+                "aot_inductor.package_constants_on_disk_format": None
+            }
+        )
+    
+    # Store exactly the weights the kernels ask for, under their names; tied
+    # weights are asked for once
+    tensors = dict(step.state_dict(keep_vars=True))
+    tensors.update(step.named_buffers())
+    names = torch._inductor.aoti_load_package(package_path).get_constant_fqns()
+    save_file({name: tensors[name].detach().to("cpu").contiguous() for name in names}, os.path.join(path, WEIGHTS_FILE))
+    
+    model.config.save_pretrained(path)
+    if model.generation_config is not None:
+        model.generation_config.save_pretrained(path)
+    
+    description = dict(
+        info,
+        device=str(device),
+        dtype=str(dtype).replace("torch.", ""),
+        layers=layers,
+        heads=heads,
+        head_dim=head_dim,
+        max_batch_size=max_batch_size,
+        max_positions=max_positions,
+        torch_version=str(torch.__version__)
+    )
+    with open(os.path.join(path, EXPORT_FILE), "w") as f:
+        json.dump(description, f, indent=2)
+    
+    logger.info(f"Exported decoder to {path}")
+
+def load_exported(path: str) -> "ExportedDecoder":
+    """
+    Load a package written by ``export_decoder()``
+    
+    Args:
+        path: Package directory
+    
+    Returns:
+        Decoder backed by the compiled package
+    """
+    require_aoti()
+    with open(os.path.join(path, EXPORT_FILE)) as f:
+        info = json.load(f)
+    
+    # Compiled kernels are tied to the torch build that produced them
+    if info["torch_version"] != str(torch.__version__):
+        raise ValueError(
+            f"Package {path} was built with torch {info['torch_version']}, "
+            f"but torch {torch.__version__} is installed; export it again"
+        )
+    return ExportedDecoder(path, info)
+
+def _decoder_step(model):
+    """Wrap a model as one decoding step over stacked KV tensors, for export"""
+    
+    class DecoderStep(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.model = model
+        
+        def forward(self, input_ids, past_mask, token_mask, position_ids, keys, values):
+            cache = tuples_to_cache(tuple(zip(keys.unbind(0), values.unbind(0))), self.model)
+            outputs = self.model(
+                input_ids=input_ids,
+                attention_mask=torch.cat([past_mask, token_mask], dim=1),
+                position_ids=position_ids,
+                past_key_values=cache,
+                use_cache=True
+            )
+            pairs = cache_to_tuples(outputs.past_key_values)
+            return (
+                outputs.logits,
+                torch.stack([key for key, _ in pairs]),
+                torch.stack([value for _, value in pairs])
+            )
+    
+    return DecoderStep().eval()
+
+class ExportedDecoder:
+    """
+    AOT-compiled decoder with the model interface Brello EI 0 relies on
+    
+    Caches are plain per-layer (key, value) tuples. Forward calls return
+    logits for every input position, like the original model.
+    """
+    
+    # Past-key-values stay per-layer tuples (see kv_cache.tuples_to_cache)
+    _supports_cache_class = False
+    
+    def __init__(self, path: str, info: Dict[str, Any]):
+        """
+        Load the compiled package
+        
+        Args:
+            path: Package directory
+            info: Package description from ``export_decoder()``
+        """
+        self.path = path
+        self.info = info
+        self.device = torch.device(info["device"])
+        self.dtype = getattr(torch, info["dtype"])
+        self.config = transformers.AutoConfig.from_pretrained(path)
+        if os.path.isfile(os.path.join(path, "generation_config.json")):
+            self.generation_config = transformers.GenerationConfig.from_pretrained(path)
+        else:
+            self.generation_config = transformers.GenerationConfig()
+        
+        from safetensors.torch import load_file
+        
+        # user_managed makes the kernels read the mapped tensors in place;
+        # they are kept referenced here for as long as the decoder lives
+        self._runner = torch._inductor.aoti_load_package(os.path.join(path, PACKAGE_FILE))
+        self._weights = load_file(os.path.join(path, WEIGHTS_FILE), device=str(self.device))
+        self._runner.load_constants(self._weights, check_full_update=True, user_managed=True)
+    
+    def __call__(
+        self,
+        input_ids: torch.Tensor,
+        attention_mask: Optional[torch.Tensor] = None,
+        position_ids: Optional[torch.Tensor] = None,
+        past_key_values: Any = None,
+        use_cache: bool = True,
+        **kwargs
+    ):
+        """Forward pass with the arguments of a transformers causal LM"""
+        pairs = cache_to_tuples(past_key_values)
+        keys = values = None
+        if pairs:
+            keys = torch.stack([key for key, _ in pairs])
+            values = torch.stack([value for _, value in pairs])
+        logits, keys, values = self._step(input_ids, attention_mask, position_ids, keys, values)
+        return transformers.modeling_outputs.CausalLMOutputWithPast(
+            logits=logits,
+            past_key_values=tuple(zip(keys.unbind(0), values.unbind(0)))
+        )
+    
+    def generate(
+        self,
+        input_ids: torch.Tensor,
+        attention_mask: Optional[torch.Tensor] = None,
+        past_key_values: Any = None,
+        **gen_params
+    ):
+        """
+        Greedy or sampled decoding with the same parameters as ``model.generate``
+        
+        Args:
+            input_ids: Prompt token ids, left-padded
+            attention_mask: Mask of the prompt columns (None for no padding)
+            past_key_values: Cache covering the first columns of the prompt, if any
+            **gen_params: Generation parameters (see ``speculative_decoding.SUPPORTED_PARAMS``)
+        
+        Returns:
+            Prompt plus generated token ids, or a ``GenerateDecoderOnlyOutput``
+            with the cache when ``return_dict_in_generate`` is set
+        """
+        from speculative_decoding import SUPPORTED_PARAMS, build_logits_processors
+        
+        unsupported = set(gen_params) - SUPPORTED_PARAMS
+        if unsupported:
+            raise ValueError(f"Exported decoders do not support {sorted(unsupported)}")
+        
+        batch_size, prompt_length = input_ids.shape
+        max_new_tokens = gen_params.get("max_new_tokens")
+        if max_new_tokens is None:
+            max_new_tokens = gen_params.get("max_length", self.generation_config.max_length) - prompt_length
+        eos_token_id = gen_params.get("eos_token_id", self.generation_config.eos_token_id)
+        eos_token_ids = torch.tensor(
+            eos_token_id if isinstance(eos_token_id, (list, tuple)) else [eos_token_id],
+            device=self.device
+        )
+        pad_token_id = gen_params.get("pad_token_id")
+        if pad_token_id is None:
+            pad_token_id = int(eos_token_ids[0])
+        processors, warpers = build_logits_processors(self, gen_params, prompt_length)
+        stopping_criteria = gen_params.get("stopping_criteria") or []
+        streamer = gen_params.get("streamer")
+        
+        if attention_mask is None:
+            attention_mask = torch.ones_like(input_ids)
+        pairs = cache_to_tuples(past_key_values)
+        cached = cache_length(pairs)
+        keys = values = None
+        if pairs:
+            keys = torch.stack([key for key, _ in pairs])
+            values = torch.stack([value for _, value in pairs])
+        
+        if streamer is not None:
+            streamer.put(input_ids.cpu())
+        
+        sequences = input_ids
+        feed = input_ids[:, cached:]
+        unfinished = torch.ones(batch_size, dtype=torch.bool, device=self.device)
+        for _ in range(max_new_tokens):
+            logits, keys, values = self._step(feed, attention_mask, None, keys, values)
+            scores = processors(sequences, logits[:, -1, :].float())
+            if gen_params.get("do_sample"):
+                probs = torch.softmax(warpers(sequences, scores), dim=-1)
+                next_tokens = torch.multinomial(probs, num_samples=1).squeeze(1)
+            else:
+                next_tokens = scores.argmax(dim=-1)
+            
+            # Finished rows keep producing padding, as in model.generate
+            next_tokens = torch.where(unfinished, next_tokens, torch.full_like(next_tokens, pad_token_id))
+            sequences = torch.cat([sequences, next_tokens[:, None]], dim=1)
+            attention_mask = torch.cat([attention_mask, attention_mask.new_ones(batch_size, 1)], dim=1)
+            feed = next_tokens[:, None]
+            if streamer is not None:
+                streamer.put(next_tokens.cpu())
+            
+            unfinished &= ~torch.isin(next_tokens, eos_token_ids)
+            for criterion in stopping_criteria:
+                unfinished &= ~criterion(sequences, scores)
+            if not unfinished.any():
+                break
+        
+        if streamer is not None:
+            streamer.end()
+        
+        if gen_params.get("return_dict_in_generate"):
+            # Like model.generate, the cache covers all but the last token
+            cache = tuple(zip(keys.unbind(0), values.unbind(0))) if keys is not None else None
+            return transformers.generation.GenerateDecoderOnlyOutput(sequences=sequences, past_key_values=cache)
+        return sequences
+    
+    def _step(
+        self,
+        input_ids: torch.Tensor,
+        attention_mask: Optional[torch.Tensor],
+        position_ids: Optional[torch.Tensor],
+        keys: Optional[torch.Tensor],
+        values: Optional[torch.Tensor]
+    ) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+        """Run the compiled step on stacked [layers, batch, heads, positions, head_dim] caches"""
+        batch_size, tokens = input_ids.shape
+        if batch_size > self.info["max_batch_size"]:
+            raise ValueError(f"Batch of {batch_size} exceeds the exported maximum of {self.info['max_batch_size']}")
+        
+        past = keys.shape[3] if keys is not None else 0
+        if attention_mask is None:
+            attention_mask = torch.ones((batch_size, past + tokens), dtype=torch.long, device=self.device)
+        if position_ids is None:
+            position_ids = (attention_mask.cumsum(dim=1) - 1).clamp(min=0)[:, past:]
+        past_mask = attention_mask[:, :past]
+        token_mask = attention_mask[:, past:]
+        
+        # The step always takes a cache; an empty one is stood in for by a
+        # single masked-out position that is dropped again afterwards
+        if keys is None:
+            shape = (self.info["layers"], batch_size, self.info["heads"], 1, self.info["head_dim"])
+            keys = torch.zeros(shape, dtype=self.dtype, device=self.device)
+            values = torch.zeros(shape, dtype=self.dtype, device=self.device)
+            past_mask = attention_mask.new_zeros(batch_size, 1)
+        
+        logits, keys, values = self._runner(
+            input_ids.contiguous(),
+            past_mask.contiguous(),
+            token_mask.contiguous(),
+            position_ids.contiguous(),
+            keys.contiguous(),
+            values.contiguous()
+        )
+        if past == 0:
+            keys, values = keys[:, :, :, 1:], values[:, :, :, 1:]
+        return logits, keys, values
+    
+    @property
+    def base_model(self):
+        raise ValueError("Exported decoders only produce logits; embeddings need the full model")
+    
+    def get_memory_footprint(self) -> int:
+        """Bytes used by the weights"""
+        return sum(tensor.numel() * tensor.element_size() for tensor in self._weights.values())
+    
+    def to(self, device) -> "ExportedDecoder":
+        """Packages run on the device they were exported on"""
+        if torch.device(device).type != self.device.type:
+            raise ValueError(f"Package was exported for {self.device}, not {device}")
+        return self
+    
+    def eval(self) -> "ExportedDecoder":
+        return self
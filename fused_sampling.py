@@ -0,0 +1,131 @@
+"""
+Fused Sampling - Brello EI 0
+Created by Epic Systems | Engineered by Rehan Temkar
+
+Temperature, top-k and top-p in one pass over a batch of logits. The
+transformers warpers run one after another, and top-p sorts the whole
+vocabulary at every step. The fused sampler first selects a small candidate
+set with ``topk``. It then finds the nucleus inside that set, using a
+normalizer computed over the full vocabulary, so no full sort is needed.
+
+With a ``top_k`` (the model's generation config default is 50), the
+candidate set is exactly the top-k tokens, and the distribution matches the
+warpers. Without one, the candidates are the ``FUSED_CANDIDATES`` most
+likely tokens. A batch with a row whose nucleus is wider than that, which
+only happens for very flat distributions, falls back to a full sort.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, Optional, Tuple
+
+from lazy_imports import lazy_import
+
+torch = lazy_import("torch")
+
+# Candidate tokens kept before nucleus filtering when no top_k is set
+FUSED_CANDIDATES = 256
+
+class FusedSampler:
+    """
+    Temperature, top-k and top-p sampling for a batch of logits
+    
+    Use it as the only warper of ``model.generate`` (it returns scores with
+    every token outside the nucleus at -inf), or call ``sample()`` to draw
+    the next tokens directly from the candidates.
+    """
+    
+    def __init__(
+        self,
+        temperature: float = 1.0,
+        top_p: float = 1.0,
+        top_k: Optional[int] = None,
+        candidates: int = FUSED_CANDIDATES
+    ):
+        """
+        Initialize the sampler
+        
+        Args:
+            temperature: Sampling temperature
+            top_p: Probability mass of the nucleus (1.0 for no nucleus filtering)
+            top_k: Number of most likely tokens to sample from (None or 0 for no limit)
+            candidates: Candidate tokens kept when there is no top_k
+        """
+        if not temperature or temperature <= 0:
+            raise ValueError(f"temperature must be a strictly positive float, got {temperature}")
+        if top_p is None or not 0 < top_p <= 1:
+            raise ValueError(f"top_p must be in (0, 1], got {top_p}")
+        if candidates < 1:
+            raise ValueError("candidates must be at least 1")
+        self.temperature = temperature
+        self.top_p = top_p
+        self.top_k = top_k or None
+        self.candidates = candidates
+    
+    def __call__(self, input_ids: torch.Tensor, scores: torch.Tensor) -> torch.Tensor:
+        values, indices = self.nucleus(scores)
+        return torch.full_like(scores, -float("inf")).scatter(1, indices, values)
+    
+    def sample(self, scores: torch.Tensor, generator: Optional[torch.Generator] = None) -> torch.Tensor:
+        """
+        Draw the next token of every row
+        
+        Args:
+            scores: Processed logits, shape (batch, vocab)
+            generator: Random number generator (default: torch's global one)
+        
+        Returns:
+            Sampled token ids, shape (batch,)
+        """
+        values, indices = self.nucleus(scores)
+        choice = torch.multinomial(torch.softmax(values, dim=-1), num_samples=1, generator=generator)
+        return indices.gather(1, choice).squeeze(1)
+    
+    def nucleus(self, scores: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+        """
+        Candidate tokens of every row, most likely first
+        
+        Args:
+            scores: Processed logits, shape (batch, vocab)
+        
+        Returns:
+            Temperature-scaled scores of the candidates, -inf outside the
+            nucleus, and their token ids; both of shape (batch, candidates)
+        """
+        if self.temperature != 1.0:
+            scores = scores / self.temperature
+        k = min(self.top_k or self.candidates, scores.shape[-1])
+        values, indices = torch.topk(scores, k, dim=-1)
+        if self.top_p < 1.0:
+            # Top-k renormalizes over its own tokens; otherwise the whole
+            # vocabulary counts, including the tokens outside the candidates
+            normalizer = torch.logsumexp(values if self.top_k else scores, dim=-1, keepdim=True)
+            probs = torch.exp(values - normalizer)
+            if not self.top_k and k < scores.shape[-1] and (probs.sum(dim=-1) < self.top_p).any():
+                # The nucleus of a flat row is wider than the candidates: sort everything
+                values, indices = torch.sort(scores, dim=-1, descending=True)
+                probs = torch.exp(values - normalizer)
+            # A token stays while the more likely tokens hold less than top_p
+            mass_before = probs.cumsum(dim=-1) - probs
+            values = values.masked_fill(mass_before >= self.top_p, -float("inf"))
+        return values, indices
+
+def fused_sampler(gen_params: Dict[str, Any], generation_config) -> FusedSampler:
+    """
+    Fused sampler for a set of generation parameters
+    
+    Args:
+        gen_params: Generation parameters
+        generation_config: Model generation config, for the values ``gen_params`` leaves out
+    
+    Returns:
+        Sampler matching the temperature, top_k and top_p ``model.generate`` would use
+    """
+    temperature = gen_params.get("temperature", generation_config.temperature)
+    top_p = gen_params.get("top_p", generation_config.top_p)
+    top_k = gen_params.get("top_k", generation_config.top_k)
+    return FusedSampler(
+        temperature=temperature if temperature is not None else 1.0,
+        top_p=top_p if top_p is not None else 1.0,
+        top_k=top_k
+    )
@@ -0,0 +1,203 @@
+"""
+Generation Output - Brello EI 0
+Created by Epic Systems | Engineered by Rehan Temkar
+
+Structured results for generated replies. Only the generated tokens are
+decoded: the prompt columns, system persona included, are sliced off the
+output ids first, along with the padding of rows that finished early. The
+cost of detokenizing a reply grows with the reply, not with the prompt.
+
+Every result carries the reply text, the prompt and completion token counts
+and why generation finished. The finish reasons are those of the OpenAI
+API, "stop" for the end of the turn and "length" for the token limit, plus
+"cancelled" for generations stopped by their caller.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+from lazy_imports import lazy_import
+from streaming import TokenStreamer, stream_text
+from stop_sequences import DEFAULT_STOP_STRINGS, truncate_reply
+
+torch = lazy_import("torch")
+
+class GenerationResult:
+    """A generated reply with its token counts and finish reason"""
+    
+    def __init__(
+        self,
+        text: str,
+        prompt_tokens: int,
+        completion_tokens: int,
+        finish_reason: str,
+        cached: bool = False
+    ):
+        """
+        Initialize the result
+        
+        Args:
+            text: Reply text
+            prompt_tokens: Tokens in the prompt
+            completion_tokens: Tokens generated, up to and including the end of sequence
+            finish_reason: 'stop', 'length' or 'cancelled'
+            cached: Whether the reply came from a response cache; cached
+                replies count no tokens, since nothing was run for them
+        """
+        self.text = text
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        self.finish_reason = finish_reason
+        self.cached = cached
+    
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Plain dict of the result, with token usage laid out like the OpenAI API"""
+        return {
+            "text": self.text,
+            "finish_reason": self.finish_reason,
+            "cached": self.cached,
+            "usage": {
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "total_tokens": self.total_tokens
+            }
+        }
+    
+    def __repr__(self) -> str:
+        return (
+            f"GenerationResult(text={self.text!r}, prompt_tokens={self.prompt_tokens}, "
+            f"completion_tokens={self.completion_tokens}, finish_reason={self.finish_reason!r}, "
+            f"cached={self.cached})"
+        )
+
+def reply_token_ids(
+    sequences: torch.Tensor,
+    prompt_width: int,
+    eos_token_id: Union[int, Sequence[int], None],
+    pad_token_id: Optional[int] = None
+) -> List[List[int]]:
+    """
+    Generated ids of every row of a ``generate`` output
+    
+    Args:
+        sequences: Prompt plus generated ids, shape (batch, length)
+        prompt_width: Width of the (left-padded) prompt
+        eos_token_id: End of sequence id(s); a row ends at its first one
+        pad_token_id: Padding added to rows that stopped early (None for none)
+    
+    Returns:
+        Per row, the ids after the prompt up to and including the end of
+        sequence, without padding
+    
+    When the padding is an end of sequence id, a batched row stopped by a
+    stop string looks like it ended with an end of sequence. Trailing
+    padding of batched rows is then dropped before looking for the end, so
+    no row counts a token it did not generate. A single row is never padded.
+    """
+    eos_token_ids = set(eos_token_id if isinstance(eos_token_id, (list, tuple)) else [eos_token_id])
+    rows = sequences[:, prompt_width:].tolist()
+    for row in rows:
+        if pad_token_id in eos_token_ids and len(rows) > 1:
+            while row and row[-1] == pad_token_id:
+                row.pop()
+        end = next((index + 1 for index, token_id in enumerate(row) if token_id in eos_token_ids), None)
+        if end is not None:
+            del row[end:]
+        elif pad_token_id is not None:
+            while row and row[-1] == pad_token_id:
+                row.pop()
+    return rows
+
+def extract_reply(
+    tokenizer,
+    token_ids: List[int],
+    max_new_tokens: int,
+    stop_strings: Sequence[str] = DEFAULT_STOP_STRINGS,
+    max_sentences: Optional[int] = None,
+    cancelled: bool = False
+) -> Tuple[str, str]:
+    """
+    Reply text of generated ids and why generation finished
+    
+    Args:
+        tokenizer: Tokenizer used for generation
+        token_ids: Generated ids only, as returned by ``reply_token_ids()``
+        max_new_tokens: Token limit of the generation
+        stop_strings: Text that ends the reply
+        max_sentences: Sentences the reply may keep (None for no budget)
+        cancelled: Whether the caller stopped the generation
+    
+    Returns:
+        The reply cut at its stop string or sentence budget, and the finish
+        reason: 'length' only when the limit was hit before the turn ended
+    """
+    full_text = tokenizer.decode(token_ids, skip_special_tokens=True)
+    text = truncate_reply(full_text, stop_strings, max_sentences)
+    if cancelled:
+        return text, "cancelled"
+    
+    ended = (
+        not token_ids
+        or len(token_ids) < max_new_tokens
+        or token_ids[-1] == tokenizer.eos_token_id
+        or len(text) < len(full_text)
+    )
+    return text, "stop" if ended else "length"
+
+class ResponseStream:
+    """
+    Text pieces of a streamed reply, then its structured result
+    
+    Iterate over it to get the pieces as they are generated. Once the reply
+    has finished, ``result`` holds its ``GenerationResult``. Closing the
+    stream early stops generation at the next token.
+    """
+    
+    def __init__(
+        self,
+        streamer: TokenStreamer,
+        tokenizer,
+        stop_strings: Sequence[str],
+        finish: Callable[[List[int]], GenerationResult],
+        close: Callable[[], None]
+    ):
+        """
+        Initialize the stream
+        
+        Args:
+            streamer: Streamer fed by the generation
+            tokenizer: Tokenizer used for generation
+            stop_strings: Text that ends the reply; it is not streamed
+            finish: Builds the result from the generated ids
+            close: Stops the generation and waits for it
+        """
+        self.streamer = streamer
+        self.tokenizer = tokenizer
+        self.stop_strings = stop_strings
+        self.token_ids: List[int] = []
+        self.result: Optional[GenerationResult] = None
+        self._finish = finish
+        self._close = close
+    
+    def __iter__(self) -> Iterator[str]:
+        try:
+            yield from stream_text(self._tokens(), self.tokenizer, self.stop_strings)
+            self.result = self._finish(self.token_ids)
+        finally:
+            self.close()
+    
+    def close(self):
+        """Stop the generation if it is still running"""
+        if self._close is not None:
+            self._close()
+            self._close = None
+    
+    def _tokens(self) -> Iterator[int]:
+        for token_id in self.streamer:
+            self.token_ids.append(token_id)
+            yield token_id
@@ -0,0 +1,109 @@
+"""
+KV Cache Helpers - Brello EI 0
+Created by Epic Systems | Engineered by Rehan Temkar
+
+Helpers for converting the model's past-key-values to plain per-layer
+(key, value) tuples so they can be padded, sliced and merged across
+sequences, and converted back before the next forward pass.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Optional, Sequence, Tuple
+
+from lazy_imports import lazy_import
+
+torch = lazy_import("torch")
+
+# One (key, value) pair per layer, each shaped [batch, heads, seq_len, head_dim]
+KVPairs = Tuple[Tuple["torch.Tensor", "torch.Tensor"], ...]
+
+def cache_to_tuples(cache: Any) -> Optional[KVPairs]:
+    """
+    Convert a model cache object to per-layer (key, value) tuples
+    
+    Args:
+        cache: ``past_key_values`` returned by the model
+    
+    Returns:
+        Per-layer (key, value) tuples, or None if there is no cache
+    """
+    if cache is None:
+        return None
+    if isinstance(cache, (tuple, list)):
+        return tuple((layer[0], layer[1]) for layer in cache)
+    if hasattr(cache, "layers"):
+        return tuple((layer.keys, layer.values) for layer in cache.layers)
+    return tuple(cache.to_legacy_cache())
+
+def tuples_to_cache(pairs: Optional[KVPairs], model: Any) -> Any:
+    """
+    Convert per-layer (key, value) tuples to the cache format the model expects
+    
+    Args:
+        pairs: Per-layer (key, value) tuples
+        model: Model the cache will be passed to
+    
+    Returns:
+        Cache object (or legacy tuples for models without cache class support)
+    """
+    if pairs is None:
+        return None
+    if not getattr(model, "_supports_cache_class", True):
+        return tuple(pairs)
+    
+    from transformers import DynamicCache
+    
+    if hasattr(DynamicCache, "from_legacy_cache"):
+        return DynamicCache.from_legacy_cache(tuple(pairs))
+    return DynamicCache(ddp_cache_data=pairs, config=model.config)
+
+def cache_length(pairs: Optional[KVPairs]) -> int:
+    """Number of cached positions"""
+    if not pairs:
+        return 0
+    return pairs[0][0].shape[2]
+
+def pad_left(pairs: KVPairs, length: int) -> KVPairs:
+    """Left-pad every layer with zeros up to ``length`` positions"""
+    missing = length - cache_length(pairs)
+    if missing <= 0:
+        return pairs
+    
+    padded = []
+    for key, value in pairs:
+        key_pad = key.new_zeros(key.shape[0], key.shape[1], missing, key.shape[3])
+        value_pad = value.new_zeros(value.shape[0], value.shape[1], missing, value.shape[3])
+        padded.append((torch.cat([key_pad, key], dim=2), torch.cat([value_pad, value], dim=2)))
+    return tuple(padded)
+
+def concat_batches(caches: Sequence[KVPairs]) -> KVPairs:
+    """Left-pad caches to a common length and stack them along the batch dimension"""
+    length = max(cache_length(pairs) for pairs in caches)
+    caches = [pad_left(pairs, length) for pairs in caches]
+    return tuple(
+        (
+            torch.cat([pairs[layer][0] for pairs in caches], dim=0),
+            torch.cat([pairs[layer][1] for pairs in caches], dim=0)
+        )
+        for layer in range(len(caches[0]))
+    )
+
+def select_batch(pairs: KVPairs, indices: torch.Tensor) -> KVPairs:
+    """Keep only the batch rows in ``indices``"""
+    return tuple(
+        (key.index_select(0, indices), value.index_select(0, indices))
+        for key, value in pairs
+    )
+
+def trim_left(pairs: KVPairs, count: int) -> KVPairs:
+    """Drop the first ``count`` positions from every layer"""
+    if count <= 0:
+        return pairs
+    return tuple((key[:, :, count:], value[:, :, count:]) for key, value in pairs)
+
+def crop(pairs: KVPairs, length: int) -> KVPairs:
+    """Keep only the first ``length`` positions of every layer"""
+    if length >= cache_length(pairs):
+        return pairs
+    return tuple((key[:, :, :length], value[:, :, :length]) for key, value in pairs)
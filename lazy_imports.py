@@ -0,0 +1,53 @@
+"""
+Lazy Imports - Brello EI 0
+Created by Epic Systems | Engineered by Rehan Temkar
+
+Deferred imports for the heavy dependencies (torch, transformers, numpy).
+Modules bind ``torch = lazy_import("torch")`` at the top and use it as usual;
+the real import happens on the first attribute access, so importing
+``brello_ei_0`` stays fast for tools that never build a model.
+"""
+
+import sys
+import importlib
+from types import ModuleType
+from typing import Any
+
+class LazyModule(ModuleType):
+    """Module placeholder that imports the real module on first use"""
+    
+    def __init__(self, name: str):
+        super().__init__(name)
+        self._lazy_module = None
+    
+    def __getattr__(self, attr: str) -> Any:
+        # Import machinery probes dunders like __path__ and __spec__; only
+        # __version__ is worth importing the module for
+        if attr.startswith("__") and attr != "__version__":
+            raise AttributeError(attr)
+        module = self.__dict__["_lazy_module"]
+        if module is None:
+            module = importlib.import_module(self.__name__)
+            self.__dict__["_lazy_module"] = module
+        value = getattr(module, attr)
+        # Cache the attribute so later lookups skip __getattr__
+        setattr(self, attr, value)
+        return value
+    
+    def __dir__(self):
+        return dir(importlib.import_module(self.__name__))
+
+def lazy_import(name: str) -> ModuleType:
+    """
+    Return a module that is imported on first attribute access
+    
+    Args:
+        name: Fully qualified module name
+    
+    Returns:
+        The module itself if it is already imported, otherwise a placeholder
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    return LazyModule(name)
@@ -0,0 +1,78 @@
+"""
+Light Tokenizer - Brello EI 0
+Created by Epic Systems | Engineered by Rehan Temkar
+
+Tokenizer for tokenizer-only mode. It reads the model's ``tokenizer.json``
+with the ``tokenizers`` library directly, which gives the same ids as the
+fast tokenizer ``transformers`` would load, without importing torch or
+transformers.
+"""
+
+import os
+import logging
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+TOKENIZER_FILE = "tokenizer.json"
+
+class LightTokenizer:
+    """Minimal ``encode``/``decode`` interface over a ``tokenizers.Tokenizer``"""
+    
+    def __init__(self, tokenizer):
+        """
+        Initialize the tokenizer
+        
+        Args:
+            tokenizer: Loaded ``tokenizers.Tokenizer``
+        """
+        self.backend = tokenizer
+    
+    def encode(self, text: str, add_special_tokens: bool = True) -> List[int]:
+        """
+        Convert text to token ids
+        
+        Args:
+            text: Text to tokenize
+            add_special_tokens: Whether to add the model's special tokens (e.g. BOS)
+        
+        Returns:
+            Token ids
+        """
+        return self.backend.encode(text, add_special_tokens=add_special_tokens).ids
+    
+    def encode_batch(self, texts: List[str], add_special_tokens: bool = True) -> List[List[int]]:
+        """Convert several texts to token ids in one call"""
+        return [encoding.ids for encoding in self.backend.encode_batch(texts, add_special_tokens=add_special_tokens)]
+    
+    def decode(self, token_ids: List[int], skip_special_tokens: bool = False) -> str:
+        """Convert token ids back to text"""
+        return self.backend.decode(token_ids, skip_special_tokens=skip_special_tokens)
+    
+    def __len__(self) -> int:
+        return self.backend.get_vocab_size(with_added_tokens=True)
+
+def load_light_tokenizer(model_path: str) -> Optional[LightTokenizer]:
+    """
+    Load ``tokenizer.json`` from a local model directory or the Hugging Face Hub
+    
+    Args:
+        model_path: Local directory or Hub model id
+    
+    Returns:
+        Loaded tokenizer, or None if the model has no ``tokenizer.json``
+    """
+    try:
+        import tokenizers
+        
+        if os.path.isdir(model_path):
+            path = os.path.join(model_path, TOKENIZER_FILE)
+            if not os.path.exists(path):
+                return None
+        else:
+            from huggingface_hub import hf_hub_download
+            path = hf_hub_download(model_path, TOKENIZER_FILE)
+        return LightTokenizer(tokenizers.Tokenizer.from_file(path))
+    except Exception as e:
+        logger.warning(f"⚠️  Could not load {TOKENIZER_FILE} for {model_path}: {e}")
+        return None
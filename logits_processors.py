@@ -0,0 +1,213 @@
+"""
+Logits Processors - Brello EI 0
+Created by Epic Systems | Engineered by Rehan Temkar
+
+Incremental replacements for the ``no_repeat_ngram_size`` and
+``repetition_penalty`` processors of ``transformers``. They give the same
+scores. The transformers processors rebuild their state from the whole
+sequence at every step: the n-gram ban is a Python loop over every token,
+and the penalty gathers a score for every token. These processors keep
+their state between steps and only add the new tokens:
+
+- ``IncrementalNoRepeatNGram`` keeps a hash table per sequence that maps
+  each (n-1)-token prefix to the tokens that followed it, and bans them all
+  with one scatter.
+- ``IncrementalRepetitionPenalty`` keeps a count per vocabulary entry and
+  an index of the distinct tokens of each sequence, and penalizes them with
+  one gather and one scatter.
+
+Both check each call's sequences against the ones they saw last. When they
+differ, as with speculative candidates that were rejected, the diverging
+tokens are rolled back first.
+"""
+
+from __future__ import annotations
+
+from typing import Dict, List, Optional, Tuple
+
+from lazy_imports import lazy_import
+
+torch = lazy_import("torch")
+transformers = lazy_import("transformers")
+
+class _IncrementalProcessor:
+    """Keeps a processor's state in step with the sequences it is called with"""
+    
+    def __init__(self):
+        self._input_ids: Optional[torch.Tensor] = None
+    
+    def _sync(self, input_ids: torch.Tensor, scores: torch.Tensor):
+        """Roll back the tokens that changed since the last call, then add the new ones"""
+        previous = self._input_ids
+        if previous is None or previous.shape[0] != input_ids.shape[0]:
+            self._reset(input_ids, scores)
+            start = 0
+        else:
+            common = min(previous.shape[1], input_ids.shape[1])
+            changed = (previous[:, :common] != input_ids[:, :common]).any(dim=0).nonzero()
+            start = int(changed[0]) if len(changed) else common
+            if start < previous.shape[1]:
+                self._remove(previous, start)
+        if start < input_ids.shape[1]:
+            self._add(input_ids, start)
+        self._input_ids = input_ids.clone()
+    
+    def _reset(self, input_ids: torch.Tensor, scores: torch.Tensor):
+        raise NotImplementedError
+    
+    def _add(self, input_ids: torch.Tensor, start: int):
+        raise NotImplementedError
+    
+    def _remove(self, input_ids: torch.Tensor, start: int):
+        raise NotImplementedError
+
+class IncrementalNoRepeatNGram(_IncrementalProcessor):
+    """
+    Bans tokens that would repeat an n-gram, like ``NoRepeatNGramLogitsProcessor``
+    
+    Each sequence's table maps an (n-1)-token prefix to how often every token
+    followed it, so rolled back n-grams can be removed again.
+    """
+    
+    def __init__(self, ngram_size: int):
+        """
+        Initialize the processor
+        
+        Args:
+            ngram_size: Size of n-grams that may only occur once
+        """
+        if not isinstance(ngram_size, int) or ngram_size <= 0:
+            raise ValueError(f"ngram_size must be a positive integer, got {ngram_size}")
+        super().__init__()
+        self.ngram_size = ngram_size
+        self._tokens: List[List[int]] = []
+        self._tables: List[Dict[Tuple[int, ...], Dict[int, int]]] = []
+    
+    def __call__(self, input_ids: torch.Tensor, scores: torch.Tensor) -> torch.Tensor:
+        self._sync(input_ids, scores)
+        if input_ids.shape[1] + 1 < self.ngram_size:
+            return scores
+        
+        size = self.ngram_size
+        rows: List[int] = []
+        banned: List[int] = []
+        for row, tokens in enumerate(self._tokens):
+            followers = self._tables[row].get(tuple(tokens[len(tokens) - size + 1:]))
+            if followers:
+                rows.extend([row] * len(followers))
+                banned.extend(followers)
+        if not banned:
+            return scores
+        return scores.index_put(
+            (torch.tensor(rows, device=scores.device), torch.tensor(banned, device=scores.device)),
+            torch.tensor(-float("inf"), dtype=scores.dtype, device=scores.device)
+        )
+    
+    def _reset(self, input_ids: torch.Tensor, scores: torch.Tensor):
+        self._tokens = [[] for _ in range(input_ids.shape[0])]
+        self._tables = [{} for _ in range(input_ids.shape[0])]
+    
+    def _add(self, input_ids: torch.Tensor, start: int):
+        size = self.ngram_size
+        for tokens, table, new_tokens in zip(self._tokens, self._tables, input_ids[:, start:].tolist()):
+            for token in new_tokens:
+                tokens.append(token)
+                if len(tokens) >= size:
+                    followers = table.setdefault(tuple(tokens[len(tokens) - size:-1]), {})
+                    followers[token] = followers.get(token, 0) + 1
+    
+    def _remove(self, input_ids: torch.Tensor, start: int):
+        size = self.ngram_size
+        for tokens, table in zip(self._tokens, self._tables):
+            while len(tokens) > start:
+                if len(tokens) >= size:
+                    prefix = tuple(tokens[len(tokens) - size:-1])
+                    followers = table[prefix]
+                    followers[tokens[-1]] -= 1
+                    if not followers[tokens[-1]]:
+                        del followers[tokens[-1]]
+                        if not followers:
+                            del table[prefix]
+                tokens.pop()
+
+class IncrementalRepetitionPenalty(_IncrementalProcessor):
+    """
+    Penalizes tokens already in the sequence, like ``RepetitionPenaltyLogitsProcessor``
+    
+    Negative scores are multiplied by the penalty and positive ones divided
+    by it, so values above 1.0 make repeats less likely. Only the distinct
+    tokens of each sequence are gathered and scattered back, however often
+    they occur.
+    """
+    
+    def __init__(self, penalty: float):
+        """
+        Initialize the processor
+        
+        Args:
+            penalty: Repetition penalty (1.0 for none)
+        """
+        if not isinstance(penalty, (int, float)) or penalty <= 0:
+            raise ValueError(f"penalty must be a strictly positive float, got {penalty}")
+        super().__init__()
+        self.penalty = penalty
+        self._counts: Optional[torch.Tensor] = None
+        self._seen: Optional[torch.Tensor] = None
+    
+    def __call__(self, input_ids: torch.Tensor, scores: torch.Tensor) -> torch.Tensor:
+        self._sync(input_ids, scores)
+        score = torch.gather(scores, 1, self._seen)
+        score = torch.where(score < 0, score * self.penalty, score / self.penalty)
+        return scores.scatter(1, self._seen, score)
+    
+    def _reset(self, input_ids: torch.Tensor, scores: torch.Tensor):
+        self._counts = torch.zeros(
+            (input_ids.shape[0], scores.shape[1]), dtype=torch.int32, device=scores.device
+        )
+        self._seen = None
+    
+    def _add(self, input_ids: torch.Tensor, start: int):
+        token_ids = input_ids[:, start:].to(self._counts.device)
+        if token_ids.shape[1] == 1 and self._seen is not None:
+            # One new token per row: append it to the rows that had not seen it
+            fresh = self._counts.gather(1, token_ids) == 0
+            self._counts.scatter_add_(1, token_ids, torch.ones_like(token_ids, dtype=torch.int32))
+            if fresh.any():
+                self._seen = torch.cat([self._seen, torch.where(fresh, token_ids, self._seen[:, :1])], dim=1)
+            return
+        self._counts.scatter_add_(1, token_ids, torch.ones_like(token_ids, dtype=torch.int32))
+        self._index_seen()
+    
+    def _remove(self, input_ids: torch.Tensor, start: int):
+        token_ids = input_ids[:, start:].to(self._counts.device)
+        self._counts.scatter_add_(1, token_ids, torch.full_like(token_ids, -1, dtype=torch.int32))
+        self._index_seen()
+    
+    def _index_seen(self):
+        """Distinct tokens of every row, padded by repeating the row's first one"""
+        rows = [row.nonzero().squeeze(1) for row in self._counts]
+        width = max(len(ids) for ids in rows)
+        self._seen = torch.stack([
+            torch.cat([ids, ids[:1].expand(width - len(ids))]) for ids in rows
+        ]) if width else None
+
+def build_repetition_processors(
+    repetition_penalty: Optional[float] = None,
+    no_repeat_ngram_size: Optional[int] = None
+) -> transformers.LogitsProcessorList:
+    """
+    Incremental processors for the repetition settings, in the order ``model.generate`` applies them
+    
+    Args:
+        repetition_penalty: Repetition penalty (None or 1.0 for none)
+        no_repeat_ngram_size: Size of n-grams that may not repeat (None or 0 for none)
+    
+    Returns:
+        List of the processors that apply
+    """
+    processors = transformers.LogitsProcessorList()
+    if repetition_penalty is not None and repetition_penalty != 1.0:
+        processors.append(IncrementalRepetitionPenalty(repetition_penalty))
+    if no_repeat_ngram_size:
+        processors.append(IncrementalNoRepeatNGram(no_repeat_ngram_size))
+    return processors
@@ -6,7 +6,7 @@ Created by Epic Systems | Engineered by Rehan Temkar
 Demonstrates different model options for Brello EI 0.
 """
 
-from brello_ei_0 import BrelloEI0
+from brello_ei_0 import load_brello_ei_0, model_registry
 
 def test_model_option(model_path, description):
     """Test a specific model option"""
@@ -16,7 +16,7 @@ def test_model_option(model_path, description):
     
     try:
         # Load the model
-        model = BrelloEI0(
+        model = load_brello_ei_0(
             model_path=model_path,
             load_in_4bit=False
         )
@@ -25,6 +25,9 @@ def test_model_option(model_path, description):
         test_message = "I'm feeling really stressed about my presentation tomorrow."
         response = model.generate_response(test_message)
         
+        # Free this option's weights before the next one is loaded
+        model_registry.remove(model)
+        
         print(f"Input: {test_message}")
         print(f"Response: {response}")
         print("✅ Model working!")
@@ -62,7 +65,7 @@ def main():
         if test_model_option(option["path"], option["description"]):
             working_models.append(option)
     
-    print(f"\n📊 Results:")
+    print("\n📊 Results:")
     print(f"✅ Working models: {len(working_models)}/{len(model_options)}")
     
     if working_models:
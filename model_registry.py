@@ -0,0 +1,163 @@
+"""
+Model Registry - Brello EI 0
+Created by Epic Systems | Engineered by Rehan Temkar
+
+Process-wide registry of loaded models. Each model is loaded once and shared
+by everyone who asks for it. When a memory budget is set, the least recently
+used models are dropped once the loaded weights exceed it.
+"""
+
+import gc
+import sys
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+class ModelRegistry:
+    """
+    LRU registry of shared model instances under a memory budget
+    
+    Instances must provide ``memory_footprint()`` returning their size in
+    bytes. Evicting a model only drops the registry's reference; its memory
+    is freed once callers holding it let go too.
+    """
+    
+    def __init__(self, memory_budget_gb: Optional[float] = None):
+        """
+        Initialize the registry
+        
+        Args:
+            memory_budget_gb: Memory the loaded models may use in total (None for no limit)
+        """
+        self.memory_budget_gb = memory_budget_gb
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._models: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._sizes: Dict[Hashable, int] = {}
+        self._loading: Dict[Hashable, threading.Lock] = {}
+        self._lock = threading.Lock()
+    
+    def get(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """
+        Return the shared instance for a key, loading it on first use
+        
+        Args:
+            key: Identity of the model (path, dtype, quantization, ...)
+            loader: Called to load the model when it is not registered
+        
+        Returns:
+            Shared model instance
+        """
+        with self._lock:
+            if key in self._models:
+                self.hits += 1
+                self._models.move_to_end(key)
+                return self._models[key]
+            key_lock = self._loading.setdefault(key, threading.Lock())
+        
+        # Load outside the registry lock so other models stay available;
+        # concurrent requests for the same key wait for a single load
+        with key_lock:
+            with self._lock:
+                if key in self._models:
+                    self.hits += 1
+                    self._models.move_to_end(key)
+                    return self._models[key]
+                self.misses += 1
+            
+            instance = loader()
+            size = instance.memory_footprint()
+            
+            with self._lock:
+                self._models[key] = instance
+                self._sizes[key] = size
+                self._loading.pop(key, None)
+                evicted = self._evict_over_budget(keep=key)
+        
+        if evicted:
+            self._release_memory()
+        return instance
+    
+    def remove(self, instance: Any) -> bool:
+        """
+        Drop a model from the registry
+        
+        Args:
+            instance: Instance returned by ``get()``
+        
+        Returns:
+            Whether the model was registered
+        """
+        with self._lock:
+            key = next((key for key, model in self._models.items() if model is instance), None)
+            if key is None:
+                return False
+            del self._models[key]
+            del self._sizes[key]
+        self._release_memory()
+        return True
+    
+    def clear(self):
+        """Drop every registered model"""
+        with self._lock:
+            self._models.clear()
+            self._sizes.clear()
+        self._release_memory()
+    
+    def memory_usage(self) -> int:
+        """Bytes used by the registered models"""
+        with self._lock:
+            return sum(self._sizes.values())
+    
+    def stats(self) -> Dict[str, Any]:
+        """Hit, miss and eviction counters"""
+        lookups = self.hits + self.misses
+        return {
+            "models": len(self._models),
+            "memory_gb": self.memory_usage() / 1024**3,
+            "memory_budget_gb": self.memory_budget_gb,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+    
+    def _evict_over_budget(self, keep: Hashable) -> int:
+        """Evict least recently used models until the budget is met; call with the lock held"""
+        if self.memory_budget_gb is None:
+            return 0
+        
+        budget = self.memory_budget_gb * 1024**3
+        evicted = 0
+        for key in list(self._models):
+            if sum(self._sizes.values()) <= budget:
+                break
+            if key == keep:
+                continue
+            del self._models[key]
+            size = self._sizes.pop(key)
+            evicted += 1
+            self.evictions += 1
+            logger.info(f"Evicted {key} from the model registry ({size / 1024**3:.2f} GB)")
+        
+        if sum(self._sizes.values()) > budget:
+            logger.warning(f"⚠️  Model {keep} alone exceeds the {self.memory_budget_gb} GB memory budget")
+        return evicted
+    
+    @staticmethod
+    def _release_memory():
+        """Return freed weights to the system"""
+        gc.collect()
+        torch = sys.modules.get("torch")
+        if torch is not None and torch.cuda.is_available():
+            torch.cuda.empty_cache()
+    
+    def __len__(self) -> int:
+        return len(self._models)
+    
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._models
@@ -0,0 +1,219 @@
+"""
+Prompt Builder - Brello EI 0
+Created by Epic Systems | Engineered by Rehan Temkar
+
+Builds prompt token ids from template segments that are tokenized once.
+Every prompt is the same system text and role markers around the user's
+message. Re-tokenizing the whole prompt string for every request
+repeats the same work each time. The builder keeps the token ids of the
+fixed segments, tokenizes only the user messages (a whole batch at a time
+through the fast tokenizer), and joins the ids.
+
+Joining ids is only valid when the tokenizer splits the prompt at the
+segment boundaries anyway. That is checked once per tokenizer on a set of
+probe messages:
+
+- When every boundary holds, prompts are joined entirely at the id level.
+- When only the system prompt splits cleanly, its ids are reused and the
+  user turn is tokenized as one string.
+- Otherwise the whole prompt is tokenized, as before.
+
+All three give the ids of tokenizing the full prompt string. The builder can
+also take its layout from the tokenizer's own chat template.
+"""
+
+import logging
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Stands in for the user's message when the prompt template is split into segments
+USER_PLACEHOLDER = "<<BRELLO_USER_INPUT>>"
+
+# Messages the segment boundaries are checked with: plain text, surrounding
+# whitespace, line breaks, non-ASCII text, an empty message and a role marker
+PROBE_MESSAGES = (
+    "I'm feeling stressed.",
+    " I just got promoted at work and I'm so excited! ",
+    "\nIt's been a long week.\n\nI need a break ",
+    "¿Qué tal? Je suis épuisé 🙂",
+    "",
+    "</s> <|assistant|> ok"
+)
+
+def encode_batch(tokenizer, texts: Sequence[str], add_special_tokens: bool = False) -> List[List[int]]:
+    """
+    Token ids of several texts in one call to the tokenizer
+    
+    Args:
+        tokenizer: Tokenizer used for generation, or a ``LightTokenizer``
+        texts: Texts to tokenize
+        add_special_tokens: Whether to add the model's special tokens (e.g. BOS)
+    
+    Returns:
+        Token ids of each text
+    """
+    if not texts:
+        return []
+    if len(texts) == 1:
+        # A batch call costs more than it saves for a single text
+        return [tokenizer.encode(texts[0], add_special_tokens=add_special_tokens)]
+    if hasattr(tokenizer, "encode_batch"):
+        return tokenizer.encode_batch(list(texts), add_special_tokens=add_special_tokens)
+    return tokenizer(list(texts), add_special_tokens=add_special_tokens)["input_ids"]
+
+class PromptBuilder:
+    """
+    Prompt token ids from pre-tokenized template segments
+    
+    A prompt is ``prefix + turn_head + user_input + turn_tail``. The prefix
+    is the part shared with earlier turns of a conversation and the one
+    the system prompt KV cache covers.
+    """
+    
+    def __init__(
+        self,
+        tokenizer,
+        prefix: str,
+        turn_head: str,
+        turn_tail: str,
+        add_special_tokens: bool = True,
+        system_message: Optional[str] = None
+    ):
+        """
+        Initialize the builder and check its segment boundaries
+        
+        Args:
+            tokenizer: Tokenizer used for generation
+            prefix: System prompt text in front of every user turn
+            turn_head: Text between the prefix and the user's message
+            turn_tail: Text after the user's message, up to where the reply starts
+            add_special_tokens: Whether the full prompt is tokenized with the model's special tokens
+            system_message: System message content, when the segments come from the
+                tokenizer's chat template (see ``from_chat_template()``)
+        """
+        self.tokenizer = tokenizer
+        self.prefix = prefix
+        self.turn_head = turn_head
+        self.turn_tail = turn_tail
+        self.add_special_tokens = add_special_tokens
+        self.system_message = system_message
+        self.chat_template = system_message is not None
+        
+        self.prefix_ids = tokenizer.encode(prefix, add_special_tokens=add_special_tokens)
+        self.head_ids = tokenizer.encode(turn_head, add_special_tokens=False) if turn_head else []
+        self.tail_ids = tokenizer.encode(turn_tail, add_special_tokens=False) if turn_tail else []
+        self.prefix_exact, self.exact = self._check_boundaries()
+        if not self.exact:
+            logger.info(
+                "Prompt template segments do not tokenize independently; "
+                + ("tokenizing user turns whole" if self.prefix_exact else "tokenizing whole prompts")
+            )
+    
+    @classmethod
+    def from_chat_template(cls, tokenizer, system_message: str) -> Optional["PromptBuilder"]:
+        """
+        Builder laid out by the tokenizer's chat template
+        
+        Args:
+            tokenizer: Tokenizer used for generation
+            system_message: Content of the system message
+        
+        Returns:
+            Builder for the template, or None if the tokenizer has no chat template
+        """
+        if not getattr(tokenizer, "chat_template", None):
+            return None
+        rendered = _render_chat(tokenizer, [("system", system_message), ("user", USER_PLACEHOLDER)])
+        if rendered.count(USER_PLACEHOLDER) != 1:
+            logger.warning("⚠️  Chat template does not render the user message verbatim; not using it")
+            return None
+        prefix, turn_tail = rendered.split(USER_PLACEHOLDER)
+        return cls(tokenizer, prefix, "", turn_tail, add_special_tokens=False, system_message=system_message)
+    
+    def render(self, user_input: str) -> str:
+        """
+        Full prompt text for a message
+        
+        Args:
+            user_input: User's message
+        
+        Returns:
+            Prompt text the model sees
+        """
+        if self.chat_template:
+            return _render_chat(self.tokenizer, [("system", self.system_message), ("user", user_input)])
+        return self.prefix + self.turn_head + user_input + self.turn_tail
+    
+    def build(self, user_inputs: Sequence[str]) -> List[List[int]]:
+        """
+        Prompt token ids for a batch of messages
+        
+        Args:
+            user_inputs: User messages
+        
+        Returns:
+            Token ids of each full prompt, the same as tokenizing ``render()``
+        """
+        if self.exact:
+            return [
+                self.prefix_ids + self.head_ids + ids + self.tail_ids
+                for ids in encode_batch(self.tokenizer, user_inputs)
+            ]
+        if self.prefix_exact:
+            turns = [self.turn_head + text + self.turn_tail for text in user_inputs]
+            return [self.prefix_ids + ids for ids in encode_batch(self.tokenizer, turns)]
+        return encode_batch(
+            self.tokenizer, [self.render(text) for text in user_inputs], add_special_tokens=self.add_special_tokens
+        )
+    
+    def build_conversation(self, turns: List[Tuple[str, str]], user_input: str) -> List[int]:
+        """
+        Prompt token ids for a message that follows earlier turns, laid out by the chat template
+        
+        Args:
+            turns: (user message, reply) pairs, oldest first
+            user_input: User's new message
+        
+        Returns:
+            Token ids of the full prompt, starting with ``prefix_ids`` when
+            the prefix tokenizes independently
+        """
+        if not self.chat_template:
+            raise ValueError("build_conversation() needs a builder made with from_chat_template()")
+        messages = [("system", self.system_message)]
+        for user, reply in turns:
+            messages += [("user", user), ("assistant", reply)]
+        rendered = _render_chat(self.tokenizer, messages + [("user", user_input)])
+        if self.prefix_exact and rendered.startswith(self.prefix):
+            return self.prefix_ids + self.tokenizer.encode(rendered[len(self.prefix):], add_special_tokens=False)
+        return self.tokenizer.encode(rendered, add_special_tokens=self.add_special_tokens)
+    
+    def _check_boundaries(self) -> Tuple[bool, bool]:
+        """Whether the prefix, and every segment, tokenize the same as the full prompt"""
+        exact = True
+        for text in PROBE_MESSAGES:
+            full_ids = self.tokenizer.encode(self.render(text), add_special_tokens=self.add_special_tokens)
+            turn_ids = self.tokenizer.encode(self.turn_head + text + self.turn_tail, add_special_tokens=False)
+            if self.prefix_ids + turn_ids != full_ids:
+                return False, False
+            text_ids = self.tokenizer.encode(text, add_special_tokens=False) if text else []
+            exact = exact and self.prefix_ids + self.head_ids + text_ids + self.tail_ids == full_ids
+        if self.chat_template:
+            # Conversations must start with the prefix for the system prompt KV cache to apply
+            rendered = _render_chat(self.tokenizer, [
+                ("system", self.system_message),
+                ("user", PROBE_MESSAGES[0]),
+                ("assistant", PROBE_MESSAGES[1]),
+                ("user", PROBE_MESSAGES[2])
+            ])
+            if not rendered.startswith(self.prefix) or self.prefix_ids + self.tokenizer.encode(
+                rendered[len(self.prefix):], add_special_tokens=False
+            ) != self.tokenizer.encode(rendered, add_special_tokens=False):
+                return False, False
+        return True, exact
+
+def _render_chat(tokenizer, messages: List[Tuple[str, str]]) -> str:
+    """Chat template text of (role, content) messages, ready for the assistant's reply"""
+    conversation: List[Dict[str, Any]] = [{"role": role, "content": content} for role, content in messages]
+    return tokenizer.apply_chat_template(conversation, tokenize=False, add_generation_prompt=True)
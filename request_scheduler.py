@@ -0,0 +1,341 @@
+"""
+Request Scheduler - Brello EI 0
+Created by Epic Systems | Engineered by Rehan Temkar
+
+Priority and deadline aware scheduling in front of BrelloEI0. Requests
+carry a priority and an optional deadline. The scheduler runs them one at a
+time: the highest priority first, and the earliest deadline first within a
+priority.
+
+Each request's cost is estimated from the prompt tokens it has to prefill
+and its ``max_new_tokens``. The per-token costs are measured when the
+scheduler starts and corrected by how long requests actually take. When a
+request can no longer finish by its deadline, it is rejected right away
+instead of waiting in the queue, so callers can retry elsewhere or degrade.
+Interactive chats keep their latency while batch jobs wait behind them.
+"""
+
+from __future__ import annotations
+
+import time
+import heapq
+import logging
+import threading
+import itertools
+from collections import defaultdict
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Tokens generated by the calibration run that measures the decode cost
+CALIBRATION_TOKENS = 8
+
+# Weight of the latest request when updating the cost correction
+CORRECTION_SMOOTHING = 0.2
+
+class DeadlineExceeded(RuntimeError):
+    """Raised for a request that cannot finish by its deadline"""
+    
+    def __init__(self, message: str, estimated_seconds: float):
+        super().__init__(message)
+        self.estimated_seconds = estimated_seconds
+
+class _Request:
+    """A queued request; ordered by priority, then deadline, then arrival"""
+    
+    def __init__(
+        self,
+        order: int,
+        user_input: str,
+        kwargs: Dict[str, Any],
+        priority: int,
+        deadline: Optional[float],
+        base_cost: float,
+        cost: float,
+        future: Future
+    ):
+        self.order = order
+        self.user_input = user_input
+        self.kwargs = kwargs
+        self.priority = priority
+        self.deadline = deadline
+        self.base_cost = base_cost
+        self.cost = cost
+        self.future = future
+        self.submitted = time.monotonic()
+    
+    def sort_key(self) -> tuple:
+        deadline = self.deadline if self.deadline is not None else float("inf")
+        return (-self.priority, deadline, self.order)
+    
+    def __lt__(self, other: "_Request") -> bool:
+        return self.sort_key() < other.sort_key()
+
+class RequestScheduler:
+    """
+    Priority scheduler with admission control for BrelloEI0
+    
+    Higher priorities run first, and within a priority the earliest deadline.
+    ``submit()`` returns a Future that resolves to the response, or fails
+    with ``DeadlineExceeded`` once the request can no longer finish in time.
+    Requests run one at a time on a background thread.
+    """
+    
+    def __init__(self, brello, calibrate: bool = True):
+        """
+        Initialize the scheduler and start its dispatch thread
+        
+        Args:
+            brello: Loaded BrelloEI0 instance
+            calibrate: Whether to time a short generation to measure the per-token costs
+        """
+        if brello.model is None or brello.tokenizer is None:
+            raise ValueError("Model not loaded. Call load_model() first.")
+        
+        self.brello = brello
+        self.prefill_seconds_per_token = 0.0
+        self.decode_seconds_per_token = 0.0
+        self.correction = 1.0
+        if calibrate:
+            self.calibrate()
+        
+        self._queue: List[_Request] = []
+        self._order = itertools.count()
+        self._running: Optional[_Request] = None
+        self._running_finish = 0.0
+        self._lock = threading.Condition()
+        self._closed = False
+        
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.missed_deadlines = 0
+        self._latency: Dict[int, List[float]] = defaultdict(lambda: [0.0, 0])
+        
+        self._thread = threading.Thread(target=self._loop, name="brello-scheduler", daemon=True)
+        self._thread.start()
+    
+    def calibrate(self):
+        """Measure the prefill and decode cost per token with two short greedy generations"""
+        brello = self.brello
+        prompt_ids = brello._tokenize_prompts(["Calibrating the request scheduler."])
+        new_tokens = len(prompt_ids[0]) - len(brello._prefix_ids or [])
+        
+        brello._warmup_generate(prompt_ids, max_new_tokens=1)
+        prefill_seconds = 1 / brello._warmup_generate(prompt_ids, max_new_tokens=1)
+        total_seconds = (CALIBRATION_TOKENS + 1) / brello._warmup_generate(prompt_ids, CALIBRATION_TOKENS + 1)
+        
+        self.prefill_seconds_per_token = prefill_seconds / max(new_tokens, 1)
+        self.decode_seconds_per_token = max(total_seconds - prefill_seconds, 0.0) / CALIBRATION_TOKENS
+        logger.info(
+            f"Scheduler calibrated: {self.prefill_seconds_per_token * 1000:.2f} ms per prompt token, "
+            f"{self.decode_seconds_per_token * 1000:.2f} ms per generated token"
+        )
+    
+    def estimate_cost(self, user_input: str, max_new_tokens: Optional[int] = None) -> float:
+        """
+        Estimated seconds to generate a response
+        
+        Args:
+            user_input: User's message
+            max_new_tokens: Maximum number of tokens to generate (default from the model config)
+        
+        Returns:
+            Estimated generation time, assuming the reply uses all of ``max_new_tokens``
+        """
+        return self.correction * self._base_cost(user_input, max_new_tokens)
+    
+    def _base_cost(self, user_input: str, max_new_tokens: Optional[int]) -> float:
+        """Calibrated cost of a request, before the correction from observed requests"""
+        brello = self.brello
+        prompt_tokens = len(brello._tokenize_prompts([user_input])[0]) - len(brello._prefix_ids or [])
+        max_new_tokens = max_new_tokens or brello.config["max_new_tokens"]
+        return prompt_tokens * self.prefill_seconds_per_token + max_new_tokens * self.decode_seconds_per_token
+    
+    def submit(
+        self,
+        user_input: str,
+        priority: int = 0,
+        deadline: Optional[float] = None,
+        **kwargs
+    ) -> Future:
+        """
+        Queue a message for generation
+        
+        Args:
+            user_input: User's message
+            priority: Higher priorities run first
+            deadline: Seconds from now by which the response must be ready (None for no deadline)
+            **kwargs: BrelloEI0.generate_response parameters
+        
+        Returns:
+            Future resolved with the response, or failed with DeadlineExceeded
+        """
+        base_cost = self._base_cost(user_input, kwargs.get("max_new_tokens"))
+        future: Future = Future()
+        now = time.monotonic()
+        request = _Request(
+            order=next(self._order),
+            user_input=user_input,
+            kwargs=kwargs,
+            priority=priority,
+            deadline=now + deadline if deadline is not None else None,
+            base_cost=base_cost,
+            cost=self.correction * base_cost,
+            future=future
+        )
+        
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Scheduler is closed")
+            heapq.heappush(self._queue, request)
+            shed = self._shed(now)
+            self._lock.notify()
+        self._reject(shed)
+        return future
+    
+    def generate_response(
+        self,
+        user_input: str,
+        priority: int = 0,
+        deadline: Optional[float] = None,
+        **kwargs
+    ) -> str:
+        """
+        Generate a response through the scheduler and wait for it
+        
+        Args:
+            user_input: User's message
+            priority: Higher priorities run first
+            deadline: Seconds from now by which the response must be ready (None for no deadline)
+            **kwargs: BrelloEI0.generate_response parameters
+        
+        Returns:
+            Generated response
+        
+        Raises:
+            DeadlineExceeded: If the request cannot finish by its deadline
+        """
+        return self.submit(user_input, priority=priority, deadline=deadline, **kwargs).result()
+    
+    def stats(self) -> Dict[str, Any]:
+        """Queue length, outcomes, cost model and mean latency per priority"""
+        with self._lock:
+            return {
+                "queued": len(self._queue),
+                "running": self._running is not None,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "missed_deadlines": self.missed_deadlines,
+                "prefill_seconds_per_token": self.prefill_seconds_per_token,
+                "decode_seconds_per_token": self.decode_seconds_per_token,
+                "correction": self.correction,
+                "mean_latency": {
+                    priority: total / count for priority, (total, count) in sorted(self._latency.items())
+                }
+            }
+    
+    def close(self):
+        """Stop once the running request finishes; queued requests are rejected"""
+        with self._lock:
+            self._closed = True
+            pending, self._queue = self._queue, []
+            self._lock.notify()
+        for request in pending:
+            request.future.set_exception(RuntimeError("Scheduler closed before the request ran"))
+        self._thread.join()
+    
+    def _shed(self, now: float) -> List[_Request]:
+        """
+        Remove the queued requests that can no longer meet their deadline
+        
+        Walks the queue in run order, adding up the estimated costs; a request
+        that would finish after its deadline is dropped and its cost is not
+        counted against the ones behind it. Called with the lock held.
+        """
+        finish = max(self._running_finish, now) if self._running is not None else now
+        kept, shed = [], []
+        for request in sorted(self._queue):
+            if request.future.cancelled():
+                continue
+            if request.deadline is not None and finish + request.cost > request.deadline:
+                shed.append(request)
+                continue
+            finish += request.cost
+            kept.append(request)
+        if shed:
+            self._queue = kept
+            heapq.heapify(self._queue)
+        return shed
+    
+    def _reject(self, requests: List[_Request]):
+        now = time.monotonic()
+        for request in requests:
+            with self._lock:
+                self.rejected += 1
+            remaining = request.deadline - now
+            request.future.set_exception(DeadlineExceeded(
+                f"Request cannot finish within its deadline ({max(remaining, 0.0):.2f}s left, "
+                f"about {request.cost:.2f}s of generation needed)",
+                estimated_seconds=request.cost
+            ))
+    
+    def _cache_hits(self) -> int:
+        """Hits so far of the model's response and semantic caches"""
+        hits = 0
+        for cache in (self.brello.response_cache, self.brello.semantic_cache):
+            if cache is not None:
+                hits += cache.hits
+        return hits
+    
+    def _loop(self):
+        while True:
+            with self._lock:
+                while not self._closed and not self._queue:
+                    self._lock.wait()
+                if self._closed:
+                    return
+                shed = self._shed(time.monotonic())
+                request = heapq.heappop(self._queue) if self._queue else None
+                if request is not None:
+                    self._running = request
+                    self._running_finish = time.monotonic() + request.cost
+            self._reject(shed)
+            if request is None or not request.future.set_running_or_notify_cancel():
+                with self._lock:
+                    self._running = None
+                continue
+            
+            cache_hits = self._cache_hits()
+            start_time = time.monotonic()
+            try:
+                response = self.brello.generate_response(request.user_input, **request.kwargs)
+            except Exception as e:
+                logger.error(f"❌ Scheduled generation failed: {e}")
+                response, error = None, e
+            else:
+                error = None
+            end_time = time.monotonic()
+            
+            with self._lock:
+                self._running = None
+                if error is None:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+                latency = self._latency[request.priority]
+                latency[0] += end_time - request.submitted
+                latency[1] += 1
+                if request.deadline is not None and end_time > request.deadline:
+                    self.missed_deadlines += 1
+                # Cache hits cost next to nothing and say nothing about generation speed
+                if request.base_cost > 0 and error is None and self._cache_hits() == cache_hits:
+                    observed = (end_time - start_time) / request.base_cost
+                    self.correction += CORRECTION_SMOOTHING * (observed - self.correction)
+            
+            if error is not None:
+                request.future.set_exception(error)
+            else:
+                request.future.set_result(response)
@@ -0,0 +1,169 @@
+"""
+Response Cache - Brello EI 0
+Created by Epic Systems | Engineered by Rehan Temkar
+
+Exact-match cache for generated responses. Entries are keyed on the
+normalized user message plus the effective generation parameters, kept in
+an in-memory LRU and optionally persisted to an on-disk SQLite tier.
+"""
+
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Optional, Dict, Any
+
+logger = logging.getLogger(__name__)
+
+def normalize_input(text: str) -> str:
+    """Normalize a user message so trivially different spellings share a cache entry"""
+    text = unicodedata.normalize("NFKC", text)
+    return " ".join(text.split()).casefold()
+
+def params_key(params: Dict[str, Any]) -> Optional[str]:
+    """Stable key for a set of generation parameters, or None if one is not a plain value"""
+    for value in params.values():
+        if value is not None and not isinstance(value, (str, int, float, bool)):
+            return None
+    payload = json.dumps(params, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class ResponseCache:
+    """
+    LRU response cache with an optional persistent tier
+    
+    Memory holds at most ``max_entries`` responses; the least recently used
+    entry is evicted first. When ``disk_path`` is set, every response is also
+    written to a SQLite database there, and memory misses fall back to it.
+    """
+    
+    def __init__(self, max_entries: int = 1024, disk_path: Optional[str] = None):
+        """
+        Initialize the cache
+        
+        Args:
+            max_entries: Maximum number of responses kept in memory
+            disk_path: SQLite file for the persistent tier (None for memory only)
+        """
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1")
+        
+        self.max_entries = max_entries
+        self.disk_path = disk_path
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        
+        self._db = None
+        if disk_path:
+            self._db = sqlite3.connect(disk_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses "
+                "(key TEXT PRIMARY KEY, response TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            self._db.commit()
+    
+    @staticmethod
+    def make_key(user_input: str, params: Dict[str, Any]) -> Optional[str]:
+        """
+        Build a cache key from a message and its generation parameters
+        
+        Args:
+            user_input: User's message
+            params: Effective generation parameters (including the seed)
+        
+        Returns:
+            Cache key, or None if a parameter cannot be part of a key
+        """
+        key = params_key(params)
+        if key is None:
+            return None
+        payload = normalize_input(user_input) + "\0" + key
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    
+    def get(self, key: str) -> Optional[str]:
+        """
+        Look up a response, checking memory first and then the disk tier
+        
+        Args:
+            key: Key from ``make_key()``
+        
+        Returns:
+            Cached response, or None on a miss
+        """
+        with self._lock:
+            response = self._entries.get(key)
+            if response is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return response
+            
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT response FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    self._remember(key, row[0])
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return row[0]
+            
+            self.misses += 1
+            return None
+    
+    def put(self, key: str, response: str):
+        """
+        Store a response
+        
+        Args:
+            key: Key from ``make_key()``
+            response: Generated response
+        """
+        with self._lock:
+            self._remember(key, response)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, response, created) VALUES (?, ?, ?)",
+                    (key, response, time.time())
+                )
+                self._db.commit()
+    
+    def clear(self):
+        """Remove every cached response, including the disk tier"""
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses")
+                self._db.commit()
+    
+    def stats(self) -> Dict[str, Any]:
+        """Hit and miss counters"""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "disk_hits": self.disk_hits,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._entries)
+        }
+    
+    def close(self):
+        """Close the disk tier"""
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def _remember(self, key: str, response: str):
+        self._entries[key] = response
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
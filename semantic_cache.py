@@ -0,0 +1,212 @@
+"""
+Semantic Response Cache - Brello EI 0
+Created by Epic Systems | Engineered by Rehan Temkar
+
+Cache that answers paraphrases of earlier messages. Messages are embedded by
+mean-pooling the loaded model's last hidden states, and stored in an
+in-memory NumPy index searched by cosine similarity.
+"""
+
+from __future__ import annotations
+
+import threading
+import logging
+from typing import Optional, Dict, Any, List
+
+from lazy_imports import lazy_import
+
+np = lazy_import("numpy")
+
+logger = logging.getLogger(__name__)
+
+class SemanticCache:
+    """
+    Nearest-neighbour response cache over message embeddings
+    
+    A lookup returns the reply of the most similar cached message generated
+    with the same parameters, if its cosine similarity reaches
+    ``threshold``. When ``max_entries`` is reached the least recently used
+    entry is overwritten.
+    """
+    
+    def __init__(self, max_entries: int = 1024, threshold: float = 0.95, model_path: Optional[str] = None):
+        """
+        Initialize the cache
+        
+        Args:
+            max_entries: Maximum number of cached responses
+            threshold: Minimum cosine similarity for a cache hit
+            model_path: Model the embeddings are computed with, checked on load
+        """
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1")
+        if not -1.0 <= threshold <= 1.0:
+            raise ValueError("threshold must be between -1 and 1")
+        
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.model_path = model_path
+        self.hits = 0
+        self.misses = 0
+        
+        # Index rows; the embedding matrix is allocated on the first insert,
+        # once the embedding size is known
+        self._embeddings: Optional[np.ndarray] = None
+        self._last_used = np.zeros(max_entries, dtype=np.int64)
+        self._param_ids = np.full(max_entries, -1, dtype=np.int64)
+        self._messages: List[str] = []
+        self._responses: List[str] = []
+        self._param_keys: Dict[str, int] = {}
+        self._clock = 0
+        self._lock = threading.Lock()
+    
+    def lookup(self, embedding: np.ndarray, params_key: str) -> Optional[str]:
+        """
+        Find the response of the most similar cached message
+        
+        Args:
+            embedding: Normalized embedding of the message
+            params_key: Key of the generation parameters the response must match
+        
+        Returns:
+            Cached response, or None on a miss
+        """
+        with self._lock:
+            param_id = self._param_keys.get(params_key)
+            if param_id is None or not self._responses:
+                self.misses += 1
+                return None
+            
+            count = len(self._responses)
+            similarities = self._embeddings[:count] @ embedding.astype(np.float32)
+            similarities[self._param_ids[:count] != param_id] = -np.inf
+            row = int(np.argmax(similarities))
+            if similarities[row] < self.threshold:
+                self.misses += 1
+                return None
+            
+            self._clock += 1
+            self._last_used[row] = self._clock
+            self.hits += 1
+            return self._responses[row]
+    
+    def add(self, embedding: np.ndarray, params_key: str, message: str, response: str):
+        """
+        Cache a response
+        
+        Args:
+            embedding: Normalized embedding of the message
+            params_key: Key of the generation parameters used
+            message: User's message
+            response: Generated response
+        """
+        embedding = embedding.astype(np.float32)
+        with self._lock:
+            if self._embeddings is None:
+                self._embeddings = np.zeros((self.max_entries, embedding.shape[0]), dtype=np.float32)
+            elif embedding.shape[0] != self._embeddings.shape[1]:
+                raise ValueError(
+                    f"Embedding size {embedding.shape[0]} does not match the index ({self._embeddings.shape[1]})"
+                )
+            
+            if len(self._responses) < self.max_entries:
+                row = len(self._responses)
+                self._messages.append(message)
+                self._responses.append(response)
+            else:
+                # Overwrite the least recently used entry
+                row = int(np.argmin(self._last_used))
+                self._messages[row] = message
+                self._responses[row] = response
+            
+            self._clock += 1
+            self._embeddings[row] = embedding
+            self._last_used[row] = self._clock
+            self._param_ids[row] = self._param_keys.setdefault(params_key, len(self._param_keys))
+    
+    def clear(self):
+        """Remove every cached response"""
+        with self._lock:
+            self._embeddings = None
+            self._last_used[:] = 0
+            self._param_ids[:] = -1
+            self._messages = []
+            self._responses = []
+            self._param_keys = {}
+            self._clock = 0
+    
+    def stats(self) -> Dict[str, Any]:
+        """Hit and miss counters"""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._responses)
+        }
+    
+    def save(self, path: str):
+        """
+        Save the index to an ``.npz`` file
+        
+        Args:
+            path: Destination file
+        """
+        with self._lock:
+            count = len(self._responses)
+            param_keys = sorted(self._param_keys, key=self._param_keys.get)
+            embeddings = self._embeddings[:count] if self._embeddings is not None else np.zeros((0, 0), np.float32)
+            with open(path, "wb") as f:
+                np.savez(
+                    f,
+                    embeddings=embeddings,
+                    last_used=self._last_used[:count],
+                    param_ids=self._param_ids[:count],
+                    param_keys=np.array(param_keys, dtype=str),
+                    messages=np.array(self._messages, dtype=str),
+                    responses=np.array(self._responses, dtype=str),
+                    model_path=np.array(self.model_path or "")
+                )
+        logger.info(f"Saved semantic cache with {count} entries to {path}")
+    
+    def load(self, path: str) -> bool:
+        """
+        Load an index saved with ``save()``, replacing the current entries
+        
+        Args:
+            path: File written by ``save()``
+        
+        Returns:
+            Whether the index matched this model and was loaded
+        """
+        with np.load(path, allow_pickle=False) as data:
+            saved_model = str(data["model_path"])
+            if self.model_path and saved_model != self.model_path:
+                logger.warning(f"⚠️  Semantic cache at {path} was built for another model; ignoring it")
+                return False
+            
+            # Keep the most recently used entries if the file holds more than fit
+            order = np.argsort(data["last_used"])[::-1][:self.max_entries][::-1]
+            embeddings = data["embeddings"][order]
+            param_ids = data["param_ids"][order]
+            messages = data["messages"][order].tolist()
+            responses = data["responses"][order].tolist()
+            param_keys = data["param_keys"].tolist()
+        
+        self.clear()
+        with self._lock:
+            count = len(responses)
+            if count:
+                self._embeddings = np.zeros((self.max_entries, embeddings.shape[1]), dtype=np.float32)
+                self._embeddings[:count] = embeddings
+            self._last_used[:count] = np.arange(1, count + 1)
+            self._param_ids[:count] = param_ids
+            self._messages = messages
+            self._responses = responses
+            self._param_keys = {key: i for i, key in enumerate(param_keys)}
+            self._clock = count
+        logger.info(f"Loaded semantic cache with {count} entries from {path}")
+        return True
+    
+    def __len__(self) -> int:
+        return len(self._responses)
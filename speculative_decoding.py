@@ -0,0 +1,444 @@
+"""
+Speculative Decoding - Brello EI 0
+Created by Epic Systems | Engineered by Rehan Temkar
+
+Single-sequence decoding loop in which a cheap proposer (a small draft model,
+or n-gram lookup in the prompt) suggests several next tokens and the main model verifies all of them in one
+forward pass. The main model's logits processors are applied at every
+verified position, and draft tokens are accepted by rejection sampling, so
+the output follows the main model's distribution (and matches its greedy
+output exactly).
+"""
+
+from __future__ import annotations
+
+import time
+import threading
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from lazy_imports import lazy_import
+from kv_cache import KVPairs, cache_to_tuples, tuples_to_cache, cache_length, crop
+from logits_processors import build_repetition_processors
+from fused_sampling import fused_sampler
+
+torch = lazy_import("torch")
+transformers = lazy_import("transformers")
+
+logger = logging.getLogger(__name__)
+
+# Generation parameters the speculative loop understands; requests using
+# anything else fall back to regular ``model.generate``
+SUPPORTED_PARAMS = frozenset({
+    "max_length",
+    "max_new_tokens",
+    "min_length",
+    "min_new_tokens",
+    "temperature",
+    "top_p",
+    "top_k",
+    "do_sample",
+    "pad_token_id",
+    "eos_token_id",
+    "repetition_penalty",
+    "length_penalty",
+    "no_repeat_ngram_size",
+    "streamer",
+    "stopping_criteria",
+    "return_dict_in_generate",
+    "use_cache",
+    "fused_sampling"
+})
+
+def build_logits_processors(
+    model,
+    gen_params: Dict[str, Any],
+    prompt_length: int
+) -> Tuple[transformers.LogitsProcessorList, transformers.LogitsProcessorList]:
+    """
+    Build the logits processors ``model.generate`` would use for these parameters
+    
+    Args:
+        model: Model the parameters are meant for
+        gen_params: Generation parameters
+        prompt_length: Number of prompt tokens
+    
+    Returns:
+        Processors applied at every step, and warpers applied when sampling
+    """
+    eos_token_id = gen_params.get("eos_token_id")
+    processors = build_repetition_processors(
+        gen_params.get("repetition_penalty"), gen_params.get("no_repeat_ngram_size")
+    )
+    if eos_token_id is not None and gen_params.get("min_length"):
+        processors.append(transformers.MinLengthLogitsProcessor(gen_params["min_length"], eos_token_id))
+    if eos_token_id is not None and gen_params.get("min_new_tokens"):
+        processors.append(
+            transformers.MinNewTokensLengthLogitsProcessor(prompt_length, gen_params["min_new_tokens"], eos_token_id)
+        )
+    
+    warpers = transformers.LogitsProcessorList()
+    if gen_params.get("do_sample") and gen_params.get("fused_sampling"):
+        warpers.append(fused_sampler(gen_params, model.generation_config))
+    elif gen_params.get("do_sample"):
+        # Like ``model.generate``, fall back to the model's generation config
+        generation_config = model.generation_config
+        temperature = gen_params.get("temperature", generation_config.temperature)
+        top_k = gen_params.get("top_k", generation_config.top_k)
+        top_p = gen_params.get("top_p", generation_config.top_p)
+        if temperature is not None and temperature != 1.0:
+            warpers.append(transformers.TemperatureLogitsWarper(temperature))
+        if top_k:
+            warpers.append(transformers.TopKLogitsWarper(top_k))
+        if top_p is not None and top_p < 1.0:
+            warpers.append(transformers.TopPLogitsWarper(top_p))
+    return processors, warpers
+
+class DraftModelProposer:
+    """
+    Proposes candidate tokens by decoding ahead with a small draft model
+    
+    The draft model keeps its own KV cache across steps and only feeds the
+    tokens it has not seen yet. The number of proposed tokens grows by two
+    after a fully accepted step and shrinks by one otherwise.
+    """
+    
+    def __init__(
+        self,
+        draft_model,
+        processors: transformers.LogitsProcessorList,
+        warpers: transformers.LogitsProcessorList,
+        do_sample: bool,
+        num_tokens: int = 5
+    ):
+        """
+        Initialize the proposer
+        
+        Args:
+            draft_model: Draft model sharing the main model's tokenizer
+            processors: Logits processors of the main model
+            warpers: Sampling warpers of the main model
+            do_sample: Whether candidates are sampled (otherwise greedy)
+            num_tokens: Initial number of tokens proposed per step
+        """
+        self.model = draft_model
+        self.processors = processors
+        self.warpers = warpers
+        self.do_sample = do_sample
+        self.num_tokens = num_tokens
+        self._token_ids: List[int] = []
+        self._cache: Optional[KVPairs] = None
+    
+    def propose(self, token_ids: List[int], max_tokens: int) -> Tuple[List[int], Optional[torch.Tensor]]:
+        """
+        Propose the tokens that follow ``token_ids``
+        
+        Args:
+            token_ids: Prompt and generated tokens so far
+            max_tokens: Maximum number of tokens to propose
+        
+        Returns:
+            Candidate tokens, and the draft probabilities they were sampled
+            from (None for greedy proposals)
+        """
+        count = min(self.num_tokens, max_tokens)
+        if count <= 0:
+            return [], None
+        
+        # Reuse the draft cache for the longest prefix it shares with the sequence
+        shared = 0
+        for cached_id, token_id in zip(self._token_ids, token_ids[:-1]):
+            if cached_id != token_id:
+                break
+            shared += 1
+        cache = crop(self._cache, shared) if self._cache is not None else None
+        feed = token_ids[shared:]
+        
+        context = list(token_ids)
+        candidates: List[int] = []
+        probabilities = []
+        device = self.model.device
+        for _ in range(count):
+            outputs = self.model(
+                input_ids=torch.tensor([feed], device=device),
+                past_key_values=tuples_to_cache(cache, self.model),
+                use_cache=True
+            )
+            cache = cache_to_tuples(outputs.past_key_values)
+            
+            input_ids = torch.tensor([context], device=device)
+            scores = self.processors(input_ids, outputs.logits[:, -1, :].float())
+            if self.do_sample:
+                probs = torch.softmax(self.warpers(input_ids, scores), dim=-1)[0]
+                token = int(torch.multinomial(probs, num_samples=1))
+                probabilities.append(probs)
+            else:
+                token = int(scores[0].argmax())
+            
+            candidates.append(token)
+            context.append(token)
+            feed = [token]
+        
+        # The cache now covers everything but the last candidate
+        self._token_ids = context[:-1]
+        self._cache = cache
+        return candidates, torch.stack(probabilities) if probabilities else None
+    
+    def update(self, accepted: int, proposed: int):
+        """Adapt the number of proposed tokens to how many were accepted"""
+        if accepted == proposed:
+            self.num_tokens += 2
+        else:
+            self.num_tokens = max(1, self.num_tokens - 1)
+
+class PromptLookupProposer:
+    """
+    Proposes candidate tokens by copying from earlier in the sequence
+    
+    The last few tokens are matched against the prompt and conversation so
+    far, and the tokens that followed the most recent earlier occurrence are
+    proposed. Continuations that ``no_repeat_ngram_size`` would forbid are
+    never proposed, since they could not be accepted.
+    """
+    
+    def __init__(self, num_tokens: int = 10, max_ngram_size: int = 2, no_repeat_ngram_size: int = 0):
+        """
+        Initialize the proposer
+        
+        Args:
+            num_tokens: Maximum number of tokens copied per step
+            max_ngram_size: Longest n-gram matched against earlier text
+            no_repeat_ngram_size: Size of n-grams that may not repeat (0 for none)
+        """
+        self.num_tokens = num_tokens
+        self.max_ngram_size = max_ngram_size
+        self.no_repeat_ngram_size = no_repeat_ngram_size
+    
+    def propose(self, token_ids: List[int], max_tokens: int) -> Tuple[List[int], Optional[torch.Tensor]]:
+        """
+        Propose the tokens that follow ``token_ids``
+        
+        Args:
+            token_ids: Prompt and generated tokens so far
+            max_tokens: Maximum number of tokens to propose
+        
+        Returns:
+            Candidate tokens (possibly none), and None since copies have no draft probabilities
+        """
+        count = min(self.num_tokens, max_tokens)
+        length = len(token_ids)
+        max_ngram_size = self.max_ngram_size
+        if self.no_repeat_ngram_size:
+            # Continuing a match of n >= no_repeat_ngram_size - 1 tokens always
+            # repeats an n-gram, so such matches are useless
+            max_ngram_size = min(max_ngram_size, self.no_repeat_ngram_size - 2)
+        if count <= 0 or max_ngram_size <= 0:
+            return [], None
+        
+        seen = self._seen_ngrams(token_ids)
+        for size in range(min(max_ngram_size, length - 1), 0, -1):
+            ngram = token_ids[-size:]
+            # Most recent earlier occurrence first
+            for start in range(length - size - 1, -1, -1):
+                if token_ids[start:start + size] != ngram:
+                    continue
+                candidates = self._allowed(token_ids, token_ids[start + size:start + size + count], seen)
+                if candidates:
+                    return candidates, None
+        return [], None
+    
+    def update(self, accepted: int, proposed: int):
+        """Copies do not adapt to acceptance"""
+    
+    def _seen_ngrams(self, token_ids: List[int]) -> set:
+        size = self.no_repeat_ngram_size
+        if not size:
+            return set()
+        return {tuple(token_ids[i:i + size]) for i in range(len(token_ids) - size + 1)}
+    
+    def _allowed(self, token_ids: List[int], candidates: List[int], seen: set) -> List[int]:
+        """Cut candidates before the first one that would repeat a banned n-gram"""
+        size = self.no_repeat_ngram_size
+        if not size:
+            return candidates
+        context = token_ids[-(size - 1):] if size > 1 else []
+        allowed = []
+        new_ngrams = set()
+        for token in candidates:
+            ngram = tuple(context + [token])[-size:]
+            if len(ngram) == size and (ngram in seen or ngram in new_ngrams):
+                break
+            new_ngrams.add(ngram)
+            allowed.append(token)
+            context = (context + [token])[-(size - 1):] if size > 1 else []
+        return allowed
+
+class SpeculativeStats:
+    """Running totals for speculative generations"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+    
+    def record(self, steps: int, tokens: int, draft_tokens: int, accepted_tokens: int, seconds: float):
+        """
+        Add one generation to the totals
+        
+        Args:
+            steps: Verification steps (main model forward passes)
+            tokens: Tokens generated
+            draft_tokens: Tokens proposed
+            accepted_tokens: Proposed tokens that were accepted
+            seconds: Wall-clock time of the generation
+        """
+        with self._lock:
+            self.generations += 1
+            self.steps += steps
+            self.tokens += tokens
+            self.draft_tokens += draft_tokens
+            self.accepted_tokens += accepted_tokens
+            self.seconds += seconds
+    
+    def reset(self):
+        """Clear the totals"""
+        with self._lock:
+            self.generations = 0
+            self.steps = 0
+            self.tokens = 0
+            self.draft_tokens = 0
+            self.accepted_tokens = 0
+            self.seconds = 0.0
+    
+    def stats(self) -> Dict[str, Any]:
+        """Acceptance rate, tokens per step and throughput"""
+        return {
+            "generations": self.generations,
+            "steps": self.steps,
+            "tokens": self.tokens,
+            "draft_tokens": self.draft_tokens,
+            "accepted_tokens": self.accepted_tokens,
+            "acceptance_rate": self.accepted_tokens / self.draft_tokens if self.draft_tokens else 0.0,
+            "tokens_per_step": self.tokens / self.steps if self.steps else 0.0,
+            "accepted_tokens_per_step": self.accepted_tokens / self.steps if self.steps else 0.0,
+            "tokens_per_second": self.tokens / self.seconds if self.seconds else 0.0
+        }
+
+def speculative_generate(
+    model,
+    token_ids: List[int],
+    cache: Optional[KVPairs],
+    proposer,
+    gen_params: Dict[str, Any],
+    stats: Optional[SpeculativeStats] = None
+) -> Tuple[List[int], KVPairs]:
+    """
+    Generate a continuation from proposed tokens verified by ``model``
+    
+    Args:
+        model: Main model
+        token_ids: Prompt token ids
+        cache: KV cache covering a prefix of ``token_ids``, if any
+        proposer: Object with ``propose(token_ids, max_tokens)`` and ``update(accepted, proposed)``
+        gen_params: Generation parameters (see ``SUPPORTED_PARAMS``)
+        stats: Statistics to record the generation in
+    
+    Returns:
+        Generated token ids, and the KV cache covering every token but the last
+    """
+    start_time = time.perf_counter()
+    prompt_length = len(token_ids)
+    max_new_tokens = gen_params.get("max_new_tokens")
+    if max_new_tokens is None:
+        max_new_tokens = gen_params.get("max_length", model.generation_config.max_length) - prompt_length
+    eos_token_id = gen_params.get("eos_token_id")
+    eos_token_ids = set(eos_token_id if isinstance(eos_token_id, (list, tuple)) else [eos_token_id])
+    do_sample = gen_params.get("do_sample", False)
+    processors, warpers = build_logits_processors(model, gen_params, prompt_length)
+    stopping_criteria = gen_params.get("stopping_criteria") or []
+    streamer = gen_params.get("streamer")
+    device = model.device
+    
+    if streamer is not None:
+        streamer.put(torch.tensor([token_ids]))
+    
+    token_ids = list(token_ids)
+    # At least the last prompt token has to be fed to get the first logits
+    cache = crop(cache, prompt_length - 1) if cache is not None else None
+    steps = proposed = accepted = 0
+    finished = False
+    while not finished and len(token_ids) - prompt_length < max_new_tokens:
+        remaining = max_new_tokens - (len(token_ids) - prompt_length)
+        candidates, draft_probs = proposer.propose(token_ids, remaining - 1)
+        
+        # Score every candidate, plus the token after them, in one pass
+        cached = cache_length(cache)
+        feed = token_ids[cached:] + candidates
+        outputs = model(
+            input_ids=torch.tensor([feed], device=device),
+            attention_mask=torch.ones((1, cached + len(feed)), dtype=torch.long, device=device),
+            past_key_values=tuples_to_cache(cache, model),
+            use_cache=True
+        )
+        logits = outputs.logits[0, -(len(candidates) + 1):].float()
+        
+        # Keep candidates while they agree with the main model; the first
+        # disagreement is replaced by the main model's own token
+        new_tokens: List[int] = []
+        step_accepted = 0
+        for position in range(len(candidates) + 1):
+            input_ids = torch.tensor([token_ids + new_tokens], device=device)
+            scores = processors(input_ids, logits[position:position + 1])
+            candidate = candidates[position] if position < len(candidates) else None
+            
+            if not do_sample:
+                token = int(scores[0].argmax())
+            elif candidate is not None and draft_probs is not None:
+                # Rejection sampling against the draft distribution
+                probs = torch.softmax(warpers(input_ids, scores), dim=-1)[0]
+                draft = draft_probs[position]
+                if torch.rand(()) * draft[candidate] < probs[candidate]:
+                    token = candidate
+                else:
+                    residual = (probs - draft).clamp(min=0)
+                    if residual.sum() <= 0:
+                        residual = probs
+                    token = int(torch.multinomial(residual / residual.sum(), num_samples=1))
+            else:
+                probs = torch.softmax(warpers(input_ids, scores), dim=-1)[0]
+                token = int(torch.multinomial(probs, num_samples=1))
+            
+            new_tokens.append(token)
+            if token != candidate:
+                break
+            step_accepted += 1
+            if token in eos_token_ids:
+                break
+        
+        steps += 1
+        proposed += len(candidates)
+        accepted += step_accepted
+        proposer.update(step_accepted, len(candidates))
+        
+        token_ids.extend(new_tokens)
+        cache = crop(cache_to_tuples(outputs.past_key_values), len(token_ids) - 1)
+        if streamer is not None:
+            streamer.put(torch.tensor(new_tokens))
+        
+        finished = new_tokens[-1] in eos_token_ids or any(
+            bool(criterion(torch.tensor([token_ids], device=device), None).all())
+            for criterion in stopping_criteria
+        )
+    
+    if streamer is not None:
+        streamer.end()
+    
+    generated = token_ids[prompt_length:]
+    if stats is not None:
+        stats.record(
+            steps=steps,
+            tokens=len(generated),
+            draft_tokens=proposed,
+            accepted_tokens=accepted,
+            seconds=time.perf_counter() - start_time
+        )
+    return generated, cache
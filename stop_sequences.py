@@ -0,0 +1,199 @@
+"""
+Stop Sequences - Brello EI 0
+Created by Epic Systems | Engineered by Rehan Temkar
+
+Ends generation at the end of the assistant's turn. Models fine-tuned on the
+``<|system|>/<|user|>/<|assistant|>`` template tend to close their reply
+with ``</s>`` and then write the user's next turn themselves. Decoding
+that text is wasted work. Every new token is checked against a set of stop
+strings, and optionally against a sentence budget, and the sequence stops
+as soon as one is hit. The stop text is then cut from the reply.
+
+Only the text of the new tokens is decoded, through an incremental decoder
+per sequence, so the check costs the same at every step however long the
+reply gets.
+"""
+
+from __future__ import annotations
+
+from typing import List, Optional, Sequence, Tuple
+
+from lazy_imports import lazy_import
+from streaming import IncrementalDecoder
+
+torch = lazy_import("torch")
+
+# End of the assistant turn, and the start of an invented user turn
+DEFAULT_STOP_STRINGS = ("</s>", "<|user|>")
+
+# Characters ending a sentence; a run of them ("?!", "...") ends one sentence
+SENTENCE_END_CHARS = ".!?"
+
+# Characters that close a sentence after its end mark
+SENTENCE_CLOSE_CHARS = "\"')]"
+
+class ReplyStopper:
+    """
+    Tracks one sequence's reply text and tells when it should stop
+    
+    A sentence is counted when a run of end marks starts, so "Really?!" and
+    "Wait..." count once.
+    """
+    
+    def __init__(self, tokenizer, stop_strings: Sequence[str] = DEFAULT_STOP_STRINGS, max_sentences: Optional[int] = None):
+        """
+        Initialize the stopper
+        
+        Args:
+            tokenizer: Tokenizer used for generation
+            stop_strings: Text that ends the reply as soon as it is generated
+            max_sentences: Sentences after which the reply ends (None for no budget)
+        """
+        self.stop_strings = [text for text in stop_strings or () if text]
+        self.max_sentences = max_sentences
+        self.stopped = False
+        self.sentences = 0
+        self._decoder = IncrementalDecoder(tokenizer)
+        self._window = max((len(text) for text in self.stop_strings), default=0)
+        self._tail = ""
+        # Last character of the reply; a space before the first, which is no end mark
+        self._previous = " "
+    
+    def push(self, token_ids: Sequence[int]) -> bool:
+        """
+        Add generated tokens
+        
+        Args:
+            token_ids: Newly generated token ids
+        
+        Returns:
+            Whether the reply has hit a stop string or its sentence budget
+        """
+        for token_id in token_ids:
+            if self.stopped:
+                break
+            text = self._decoder.push(token_id)
+            if not text:
+                continue
+            
+            tail = self._tail + text
+            if any(stop in tail for stop in self.stop_strings):
+                self.stopped = True
+            self._tail = tail[-self._window:] if self._window else ""
+            
+            if self.max_sentences:
+                previous = self._previous
+                for char in text:
+                    if char in SENTENCE_END_CHARS and previous not in SENTENCE_END_CHARS:
+                        self.sentences += 1
+                    previous = char
+                if self.sentences >= self.max_sentences:
+                    self.stopped = True
+            self._previous = text[-1]
+        return self.stopped
+
+class StopOnText:
+    """Stopping criterion that ends each sequence of a batch at a stop string or its sentence budget"""
+    
+    def __init__(
+        self,
+        tokenizer,
+        prompt_length: int,
+        stop_strings: Sequence[str] = DEFAULT_STOP_STRINGS,
+        max_sentences: Optional[int] = None
+    ):
+        """
+        Initialize the criterion for one ``generate`` call
+        
+        Args:
+            tokenizer: Tokenizer used for generation
+            prompt_length: Width of the (padded) prompt; later tokens are the reply
+            stop_strings: Text that ends a reply as soon as it is generated
+            max_sentences: Sentences after which a reply ends (None for no budget)
+        """
+        self.tokenizer = tokenizer
+        self.stop_strings = stop_strings
+        self.max_sentences = max_sentences
+        self._seen = prompt_length
+        self._stoppers: Optional[List[ReplyStopper]] = None
+    
+    def __call__(self, input_ids: torch.Tensor, scores: torch.Tensor, **kwargs) -> torch.Tensor:
+        if self._stoppers is None:
+            self._stoppers = [
+                ReplyStopper(self.tokenizer, self.stop_strings, self.max_sentences)
+                for _ in range(input_ids.shape[0])
+            ]
+        new_ids = input_ids[:, self._seen:].tolist()
+        self._seen = input_ids.shape[1]
+        stopped = [stopper.push(token_ids) for stopper, token_ids in zip(self._stoppers, new_ids)]
+        return torch.tensor(stopped, dtype=torch.bool, device=input_ids.device)
+
+def truncate_reply(
+    text: str,
+    stop_strings: Sequence[str] = DEFAULT_STOP_STRINGS,
+    max_sentences: Optional[int] = None
+) -> str:
+    """
+    Cut a reply at its first stop string and after its last allowed sentence
+    
+    Args:
+        text: Decoded reply
+        stop_strings: Text that ends the reply; it is removed along with everything after it
+        max_sentences: Sentences the reply may keep (None for no budget)
+    
+    Returns:
+        The reply up to where generation should have stopped
+    """
+    for stop in stop_strings or ():
+        if stop:
+            index = text.find(stop)
+            if index >= 0:
+                text = text[:index]
+    
+    if max_sentences:
+        sentences, previous = 0, " "
+        for index, char in enumerate(text):
+            if char in SENTENCE_END_CHARS and previous not in SENTENCE_END_CHARS:
+                sentences += 1
+            previous = char
+            if sentences == max_sentences and char in SENTENCE_END_CHARS:
+                end = index + 1
+                while end < len(text) and text[end] in SENTENCE_END_CHARS + SENTENCE_CLOSE_CHARS:
+                    end += 1
+                return text[:end]
+    return text
+
+def truncate_reply_ids(
+    tokenizer,
+    token_ids: List[int],
+    stop_strings: Sequence[str] = DEFAULT_STOP_STRINGS,
+    max_sentences: Optional[int] = None
+) -> Tuple[List[int], str]:
+    """
+    Cut generated token ids where ``truncate_reply`` cuts their text
+    
+    Args:
+        tokenizer: Tokenizer used for generation
+        token_ids: Generated token ids
+        stop_strings: Text that ends the reply
+        max_sentences: Sentences the reply may keep (None for no budget)
+    
+    Returns:
+        The longest prefix of the ids whose text stays within the cut, and the
+        cut text; whitespace in front of a cut is dropped with it
+    """
+    full_text = tokenizer.decode(token_ids, skip_special_tokens=True)
+    text = truncate_reply(full_text, stop_strings, max_sentences)
+    if len(text) == len(full_text):
+        return token_ids, text
+    text = text.rstrip()
+    
+    # Decoded length grows with the number of tokens, so binary search the cut
+    low, high = 0, len(token_ids)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if len(tokenizer.decode(token_ids[:middle], skip_special_tokens=True)) <= len(text):
+            low = middle
+        else:
+            high = middle - 1
+    return token_ids[:low], text
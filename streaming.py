@@ -0,0 +1,256 @@
+"""
+Streaming Helpers - Brello EI 0
+Created by Epic Systems | Engineered by Rehan Temkar
+
+Building blocks for token streaming: a streamer that hands generated token
+ids from ``model.generate`` to a consumer thread or event loop, an
+incremental detokenizer that only decodes a small window per token, a
+filter that keeps stop strings out of the streamed text, and a stopping
+criterion that ends generation when the consumer goes away.
+"""
+
+from __future__ import annotations
+
+import queue
+import asyncio
+import threading
+from typing import Any, AsyncIterator, Iterator, List, Optional, Sequence
+
+from lazy_imports import lazy_import
+
+torch = lazy_import("torch")
+
+_END = object()
+
+class TokenStreamer:
+    """
+    Streamer passed to ``model.generate`` that forwards generated token ids
+    
+    Token ids are delivered to a thread-safe queue for synchronous consumers,
+    or to an ``asyncio.Queue`` when created with an event loop.
+    """
+    
+    def __init__(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        """
+        Initialize the streamer
+        
+        Args:
+            loop: Event loop of an async consumer, if any
+        """
+        self.loop = loop
+        self.queue = asyncio.Queue() if loop is not None else queue.Queue()
+        self._prompt_pending = True
+    
+    def put(self, value: torch.Tensor):
+        """Called by ``model.generate`` with the prompt, then with each new token"""
+        # The first call carries the prompt ids, which are not streamed
+        if self._prompt_pending:
+            self._prompt_pending = False
+            return
+        for token_id in value.reshape(-1).tolist():
+            self._push(token_id)
+    
+    def end(self):
+        """Called by ``model.generate`` when generation finishes"""
+        self._push(_END)
+    
+    def fail(self, error: Exception):
+        """Forward an error raised during generation to the consumer"""
+        self._push(error)
+    
+    def __iter__(self) -> Iterator[int]:
+        while True:
+            item = self.queue.get()
+            if item is _END:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    
+    async def aiter(self):
+        """Asynchronously iterate over generated token ids"""
+        while True:
+            item = await self.queue.get()
+            if item is _END:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    
+    def _push(self, item: Any):
+        if self.loop is not None:
+            try:
+                self.loop.call_soon_threadsafe(self.queue.put_nowait, item)
+            except RuntimeError:
+                # The consumer's event loop has shut down; nobody is listening
+                pass
+        else:
+            self.queue.put(item)
+
+class IncrementalDecoder:
+    """
+    Detokenize a growing sequence of token ids one token at a time
+    
+    Only the last few tokens are re-decoded at each step, so the cost per
+    token stays constant instead of growing with the length of the reply.
+    Text is held back while the window ends in an incomplete multi-byte
+    character.
+    """
+    
+    def __init__(self, tokenizer, skip_special_tokens: bool = True):
+        """
+        Initialize the decoder
+        
+        Args:
+            tokenizer: Tokenizer used for generation
+            skip_special_tokens: Whether to drop special tokens from the text
+        """
+        self.tokenizer = tokenizer
+        self.skip_special_tokens = skip_special_tokens
+        self.token_ids: List[int] = []
+        self._prefix_offset = 0
+        self._read_offset = 0
+    
+    def push(self, token_id: int) -> str:
+        """
+        Add a token and return the newly completed text
+        
+        Args:
+            token_id: Next generated token id
+        
+        Returns:
+            Text produced by this token (may be empty)
+        """
+        self.token_ids.append(token_id)
+        
+        # Decode with a little left context so merges and leading spaces are
+        # rendered the same way as when decoding the whole sequence
+        prefix_text = self._decode(self.token_ids[self._prefix_offset:self._read_offset])
+        new_text = self._decode(self.token_ids[self._prefix_offset:])
+        
+        if len(new_text) > len(prefix_text) and not new_text.endswith("\ufffd"):
+            self._prefix_offset = self._read_offset
+            self._read_offset = len(self.token_ids)
+            return new_text[len(prefix_text):]
+        return ""
+    
+    def flush(self) -> str:
+        """Return any text still held back at the end of generation"""
+        prefix_text = self._decode(self.token_ids[self._prefix_offset:self._read_offset])
+        new_text = self._decode(self.token_ids[self._prefix_offset:])
+        self._prefix_offset = self._read_offset = len(self.token_ids)
+        return new_text[len(prefix_text):]
+    
+    def _decode(self, token_ids: List[int]) -> str:
+        return self.tokenizer.decode(token_ids, skip_special_tokens=self.skip_special_tokens)
+
+class StopStringFilter:
+    """
+    Holds back streamed text that might be the start of a stop string
+    
+    Text is released once it can no longer be part of a stop string. Once a
+    stop string is complete, nothing from it onwards is released, nor the
+    whitespace in front of it.
+    """
+    
+    def __init__(self, stop_strings: Sequence[str]):
+        self.stop_strings = [text for text in stop_strings or () if text]
+        self.stopped = False
+        self._pending = ""
+    
+    def push(self, piece: str) -> str:
+        """
+        Add a streamed piece
+        
+        Args:
+            piece: Next piece of text
+        
+        Returns:
+            Text safe to release (may be empty)
+        """
+        if self.stopped:
+            return ""
+        pending = self._pending + piece
+        cuts = [index for index in (pending.find(stop) for stop in self.stop_strings) if index >= 0]
+        if cuts:
+            self.stopped = True
+            self._pending = ""
+            return pending[:min(cuts)].rstrip()
+        if not self.stop_strings:
+            return pending
+        
+        # Hold back the longest ending that some stop string starts with, and
+        # the whitespace in front of it, which is dropped if the stop completes
+        hold = 0
+        for stop in self.stop_strings:
+            for length in range(min(len(stop) - 1, len(pending)), hold, -1):
+                if pending.endswith(stop[:length]):
+                    hold = length
+                    break
+        released = pending[:len(pending) - hold].rstrip()
+        self._pending = pending[len(released):]
+        return released
+    
+    def flush(self) -> str:
+        """Release the text still held back at the end of the stream"""
+        pending, self._pending = self._pending, ""
+        return "" if self.stopped else pending
+
+def stream_text(streamer: TokenStreamer, tokenizer, stop_strings: Sequence[str] = ()) -> Iterator[str]:
+    """
+    Turn streamed token ids into text pieces
+    
+    Args:
+        streamer: Streamer fed by ``model.generate``
+        tokenizer: Tokenizer used for generation
+        stop_strings: Text that ends the reply; it and everything after it is not yielded
+    
+    Yields:
+        Non-empty text pieces, with leading whitespace of the reply removed
+    """
+    decoder = IncrementalDecoder(tokenizer)
+    stop_filter = StopStringFilter(stop_strings)
+    started = False
+    for token_id in streamer:
+        piece = stop_filter.push(decoder.push(token_id))
+        if not started:
+            piece = piece.lstrip()
+            started = bool(piece)
+        if piece:
+            yield piece
+    
+    piece = stop_filter.push(decoder.flush()) + stop_filter.flush()
+    if not started:
+        piece = piece.lstrip()
+    if piece:
+        yield piece
+
+async def astream_text(streamer: TokenStreamer, tokenizer, stop_strings: Sequence[str] = ()) -> AsyncIterator[str]:
+    """Async variant of ``stream_text()`` for streamers created with an event loop"""
+    decoder = IncrementalDecoder(tokenizer)
+    stop_filter = StopStringFilter(stop_strings)
+    started = False
+    async for token_id in streamer.aiter():
+        piece = stop_filter.push(decoder.push(token_id))
+        if not started:
+            piece = piece.lstrip()
+            started = bool(piece)
+        if piece:
+            yield piece
+    
+    piece = stop_filter.push(decoder.flush()) + stop_filter.flush()
+    if not started:
+        piece = piece.lstrip()
+    if piece:
+        yield piece
+
+class StopOnEvent:
+    """Stopping criterion that ends generation once an event is set"""
+    
+    def __init__(self, event: threading.Event):
+        self.event = event
+    
+    def __call__(self, input_ids: torch.Tensor, scores: torch.Tensor, **kwargs) -> torch.Tensor:
+        return torch.full(
+            (input_ids.shape[0],), self.event.is_set(), dtype=torch.bool, device=input_ids.device
+        )
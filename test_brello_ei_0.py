@@ -6,16 +6,66 @@ Created by Epic Systems | Engineered by Rehan Temkar
 Test script to verify Brello EI 0 functionality and emotional intelligence capabilities.
 """
 
+import numpy as np
 import torch
-from brello_ei_0 import BrelloEI0
+import transformers
+from brello_ei_0 import BrelloEI0, load_brello_ei_0, model_registry
+from continuous_batching import ContinuousBatchingEngine
+from request_scheduler import RequestScheduler, DeadlineExceeded
+from logits_processors import build_repetition_processors
+from fused_sampling import FusedSampler
+from generation_output import reply_token_ids
+from prompt_builder import PROBE_MESSAGES
+from exported_decoder import export_decoder, load_exported
+from brello_serve import BrelloServer
+from async_brello_ei_0 import AsyncBrelloEI0, QueueFullError
+from semantic_cache import SemanticCache
+from kv_cache import cache_length, cache_to_tuples, concat_batches, crop, select_batch, trim_left, tuples_to_cache
+from speculative_decoding import PromptLookupProposer
+from weight_snapshot import is_snapshot
+from model_compile import DEFAULT_COMPILE_BUCKETS, CompileStats, bucket_width, compile_model, eager_execution
+from cpu_autotune import autotune, load_tuning, probe_cpu
+from worker_pool import WorkerPool, core_sets
+from stop_sequences import DEFAULT_STOP_STRINGS, ReplyStopper, StopOnText, truncate_reply, truncate_reply_ids
+import asyncio
+import json
+import os
+import tempfile
+import threading
 import time
+import http.client
+from unittest import mock
+
+# Prompts used by the response tests and the quantization quality benchmark
+TEST_CASES = [
+    {
+        "input": "I'm feeling really anxious about my job interview tomorrow.",
+        "expected_keywords": ["understand", "anxious", "natural", "stress", "nervous"]
+    },
+    {
+        "input": "I just got promoted at work and I'm so excited!",
+        "expected_keywords": ["wonderful", "excited", "congratulations", "proud", "achievement"]
+    },
+    {
+        "input": "I'm feeling overwhelmed with all my responsibilities.",
+        "expected_keywords": ["understand", "overwhelmed", "responsibilities", "help", "manage"]
+    },
+    {
+        "input": "I'm really grateful for my friends and family.",
+        "expected_keywords": ["grateful", "beautiful", "appreciate", "wonderful", "support"]
+    },
+    {
+        "input": "I'm not sure what I want to do with my life.",
+        "expected_keywords": ["common", "natural", "uncertain", "figure", "challenge"]
+    }
+]
 
 def test_model_loading():
     """Test model loading functionality"""
     print("🧪 Testing Model Loading...")
     
     try:
-        model = BrelloEI0(
+        model = load_brello_ei_0(
             model_path="microsoft/DialoGPT-medium",
             load_in_4bit=False
         )
@@ -29,30 +79,7 @@ def test_emotional_intelligence_responses(model):
     """Test emotional intelligence response generation"""
     print("\n🧪 Testing Emotional Intelligence Responses...")
     
-    test_cases = [
-        {
-            "input": "I'm feeling really anxious about my job interview tomorrow.",
-            "expected_keywords": ["understand", "anxious", "natural", "stress", "nervous"]
-        },
-        {
-            "input": "I just got promoted at work and I'm so excited!",
-            "expected_keywords": ["wonderful", "excited", "congratulations", "proud", "achievement"]
-        },
-        {
-            "input": "I'm feeling overwhelmed with all my responsibilities.",
-            "expected_keywords": ["understand", "overwhelmed", "responsibilities", "help", "manage"]
-        },
-        {
-            "input": "I'm really grateful for my friends and family.",
-            "expected_keywords": ["grateful", "beautiful", "appreciate", "wonderful", "support"]
-        },
-        {
-            "input": "I'm not sure what I want to do with my life.",
-            "expected_keywords": ["common", "natural", "uncertain", "figure", "challenge"]
-        }
-    ]
-    
-    for i, test_case in enumerate(test_cases, 1):
+    for i, test_case in enumerate(TEST_CASES, 1):
         print(f"\n{i}. Testing: '{test_case['input']}'")
         
         try:
@@ -83,10 +110,43 @@ def test_chat_interface(model):
     try:
         response = model.chat("Hello! How are you today?")
         print(f"Chat response: {response}")
+        
+        # Multi-turn conversation reusing the session's KV cache
+        model.chat("I'm feeling nervous about my exam.", maintain_history=True, session_id="test")
+        response = model.chat("What can I do about it?", maintain_history=True, session_id="test")
+        print(f"Follow-up response: {response}")
+        print(f"Session turns: {len(model.sessions.get('test').history)}")
+        model.sessions.end("test")
         print("✅ Chat interface working!")
     except Exception as e:
         print(f"❌ Chat interface failed: {e}")
 
+def test_session_truncation(model):
+    """Test that a session drops its oldest turns, after the system prompt, when the context fills up"""
+    print("\n🧪 Testing Session Truncation...")
+    
+    try:
+        # Without the prefix cache the system prompt must still come first
+        with mock.patch.multiple(model, _prefix_cache=None, _prefix_ids=None):
+            session = model.sessions.get("truncation")
+            session.send("I'm feeling nervous about my exam.", max_new_tokens=16)
+            session.send("I studied all week but I still feel unprepared.", max_new_tokens=16)
+            
+            message = "What can I do about it?"
+            kept = session.history[-1:]
+            expected = model._tokenize_conversation(kept, message)
+            with mock.patch.object(model, "_context_limit", return_value=len(expected) + 16):
+                session.send(message, max_new_tokens=16)
+            
+            print(f"Turns kept: {len(session.history)}")
+            assert session.history[0] == kept[0]
+            assert session._token_ids[:len(expected)] == expected
+            assert expected[:len(model.prompt_builder.prefix_ids)] == model.prompt_builder.prefix_ids
+            model.sessions.end("truncation")
+        print("✅ Session truncation working!")
+    except Exception as e:
+        print(f"❌ Session truncation failed: {e}")
+
 def test_generation_parameters(model):
     """Test custom generation parameters"""
     print("\n🧪 Testing Generation Parameters...")
@@ -111,24 +171,750 @@ def test_generation_parameters(model):
     except Exception as e:
         print(f"❌ Generation parameters failed: {e}")
 
+def test_batched_generation(model):
+    """Test batched response generation"""
+    print("\n🧪 Testing Batched Generation...")
+    
+    try:
+        messages = [
+            "I'm feeling stressed.",
+            "I just got promoted at work and I'm so excited!",
+            "I'm really grateful for my friends and family."
+        ]
+        
+        start_time = time.time()
+        responses = model.generate_responses(messages, batch_size=2)
+        generation_time = time.time() - start_time
+        
+        for message, response in zip(messages, responses):
+            print(f"Input: {message}")
+            print(f"Response: {response}")
+        print(f"Batch generation time: {generation_time:.2f}s")
+        
+        assert len(responses) == len(messages)
+        print("✅ Batched generation working!")
+    except Exception as e:
+        print(f"❌ Batched generation failed: {e}")
+
+def test_prefix_cache(model):
+    """Test the precomputed system prompt KV cache and its file"""
+    print("\n🧪 Testing Prefix Cache...")
+    
+    if model._prefix_cache is None:
+        print("⚠️  Prefix cache disabled, skipping")
+        return
+    
+    try:
+        # Prefilling the turn on top of the cached prefix gives the logits of the whole prompt
+        prompt_ids = model._tokenize_prompts(["I'm nervous about moving to a new city."])[0]
+        inputs = model._prepare_inputs([prompt_ids])
+        cached_length = inputs["cached_length"]
+        with torch.no_grad():
+            cached = model.model(
+                input_ids=inputs["input_ids"][:, cached_length:],
+                attention_mask=inputs["attention_mask"],
+                past_key_values=inputs["past_key_values"]
+            ).logits[:, -1]
+            full = model.model(torch.tensor([prompt_ids], device=model.model.device)).logits[:, -1]
+        print(f"Cached prefix: {cached_length} tokens")
+        assert torch.allclose(cached, full, atol=1e-4)
+        
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "prefix_cache.pt")
+            model.save_prefix_cache(path)
+            with mock.patch.object(model, "_prefix_cache", None):
+                assert model.load_prefix_cache(path)
+                loaded = model._prefix_cache
+            assert all(
+                torch.equal(key, loaded_key) and torch.equal(value, loaded_value)
+                for (key, value), (loaded_key, loaded_value) in zip(model._prefix_cache, loaded)
+            )
+            # A cache saved for another model is ignored
+            with mock.patch.object(model, "model_path", "another/model"):
+                assert not model.load_prefix_cache(path)
+        print("✅ Prefix cache working!")
+    except Exception as e:
+        print(f"❌ Prefix cache failed: {e}")
+
+def test_streaming(model):
+    """Test streaming response generation"""
+    print("\n🧪 Testing Streaming Generation...")
+    
+    try:
+        start_time = time.time()
+        first_piece_time = None
+        pieces = []
+        for piece in model.stream_response("I'm feeling overwhelmed with all my responsibilities."):
+            if first_piece_time is None:
+                first_piece_time = time.time() - start_time
+            pieces.append(piece)
+        
+        print(f"Streamed response: {''.join(pieces)}")
+        print(f"Time to first piece: {first_piece_time:.2f}s")
+        print(f"Total time: {time.time() - start_time:.2f}s")
+        print("✅ Streaming working!")
+    except Exception as e:
+        print(f"❌ Streaming failed: {e}")
+
+def test_response_cache(model):
+    """Test the exact-match response cache"""
+    print("\n🧪 Testing Response Cache...")
+    
+    if model.response_cache is None:
+        print("⚠️  Response cache disabled, skipping")
+        return
+    
+    try:
+        message = "I'm worried about my exam tomorrow."
+        first = model.generate_response(message, seed=0)
+        
+        start_time = time.time()
+        second = model.generate_response("  i'm worried about my EXAM tomorrow. ", seed=0)
+        cached_time = time.time() - start_time
+        
+        print(f"Same response: {first == second}")
+        print(f"Cached lookup time: {cached_time * 1000:.2f}ms")
+        print(f"Cache stats: {model.response_cache.stats()}")
+        
+        # Replies of a differently quantized or rewritten model are not reused
+        gen_params = model._build_generation_params(None, None, None)
+        key = model._response_cache_key(message, gen_params, seed=0)
+        with mock.patch.object(model, "cpu_quantization", "int8"):
+            assert model._response_cache_key(message, gen_params, seed=0) != key
+        with mock.patch.object(model, "torch_dtype", torch.bfloat16):
+            assert model._response_cache_key(message, gen_params, seed=0) != key
+        with mock.patch.object(model, "_weights_fingerprint", "0" * 16):
+            assert model._response_cache_key(message, gen_params, seed=0) != key
+        print("✅ Response cache working!")
+    except Exception as e:
+        print(f"❌ Response cache failed: {e}")
+
+def test_semantic_cache():
+    """Test semantic cache lookups, eviction and its saved index"""
+    print("\n🧪 Testing Semantic Cache...")
+    
+    try:
+        vectors = np.eye(3, dtype=np.float32)
+        cache = SemanticCache(max_entries=2, threshold=0.9, model_path="brello")
+        cache.add(vectors[0], "greedy", "I'm sad.", "Reply A")
+        cache.add(vectors[1], "greedy", "I'm happy!", "Reply B")
+        
+        # A close paraphrase hits; other parameters and distant messages miss
+        paraphrase = vectors[0] + 0.1 * vectors[2]
+        assert cache.lookup(paraphrase / np.linalg.norm(paraphrase), "greedy") == "Reply A"
+        assert cache.lookup(vectors[0], "sampled") is None
+        assert cache.lookup(vectors[2], "greedy") is None
+        
+        # The least recently used entry makes room for a new one
+        cache.add(vectors[2], "greedy", "I'm tired.", "Reply C")
+        assert len(cache) == 2
+        assert cache.lookup(vectors[1], "greedy") is None
+        assert cache.lookup(vectors[0], "greedy") == "Reply A"
+        
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "semantic_cache.npz")
+            cache.save(path)
+            
+            loaded = SemanticCache(max_entries=2, threshold=0.9, model_path="brello")
+            assert loaded.load(path)
+            assert loaded.lookup(vectors[0], "greedy") == "Reply A"
+            assert loaded.lookup(vectors[2], "greedy") == "Reply C"
+            
+            # A smaller cache keeps the most recently used entries
+            small = SemanticCache(max_entries=1, threshold=0.9, model_path="brello")
+            assert small.load(path)
+            assert small.lookup(vectors[0], "greedy") == "Reply A"
+            assert small.lookup(vectors[2], "greedy") is None
+            
+            # An index built with another model's embeddings is ignored
+            assert not SemanticCache(model_path="another/model").load(path)
+        print(f"Cache stats: {cache.stats()}")
+        print("✅ Semantic cache working!")
+    except Exception as e:
+        print(f"❌ Semantic cache failed: {e}")
+
+def test_structured_output(model):
+    """Test structured results for single, batched and streamed generation"""
+    print("\n🧪 Testing Structured Output...")
+    
+    try:
+        message = "I'm feeling nervous about my first day at a new job."
+        result = model.generate_result(message, max_new_tokens=32)
+        print(f"Result: {result.to_dict()}")
+        
+        results = model.generate_results([message, "I'm so proud of my sister!"], max_new_tokens=32)
+        print(f"Batched finish reasons: {[r.finish_reason for r in results]}")
+        
+        stream = model.stream_result(message, max_new_tokens=32)
+        streamed = "".join(stream)
+        print(f"Streamed: {streamed}")
+        print(f"Streamed result: {stream.result}")
+        
+        assert result.finish_reason in ("stop", "length")
+        assert result.prompt_tokens == model.count_prompt_tokens(message)
+        assert all(r.completion_tokens <= 32 for r in results)
+        assert stream.result is not None
+        print("✅ Structured output working!")
+    except Exception as e:
+        print(f"❌ Structured output failed: {e}")
+
+def test_repetition_processors():
+    """Test the incremental repetition processors against those of transformers"""
+    print("\n🧪 Testing Repetition Processors...")
+    
+    try:
+        generator = torch.Generator().manual_seed(0)
+        for ngram_size in (2, 3):
+            processors = build_repetition_processors(1.3, ngram_size)
+            reference = transformers.LogitsProcessorList([
+                transformers.RepetitionPenaltyLogitsProcessor(1.3),
+                transformers.NoRepeatNGramLogitsProcessor(ngram_size)
+            ])
+            input_ids = torch.randint(0, 12, (3, 5), generator=generator)
+            for step in range(60):
+                if step % 10 == 9:
+                    # Roll back, as speculative decoding does when drafts are rejected
+                    input_ids = input_ids[:, :-3]
+                else:
+                    input_ids = torch.cat([input_ids, torch.randint(0, 12, (3, 1), generator=generator)], dim=1)
+                scores = torch.randn(3, 16, generator=generator)
+                assert torch.equal(processors(input_ids, scores.clone()), reference(input_ids, scores.clone()))
+        
+        print("Same scores as transformers, including after rollbacks")
+        print("✅ Repetition processors working!")
+    except Exception as e:
+        print(f"❌ Repetition processors failed: {e}")
+
+def test_fused_sampler():
+    """Test the fused sampler against the warpers of transformers"""
+    print("\n🧪 Testing Fused Sampler...")
+    
+    try:
+        generator = torch.Generator().manual_seed(0)
+        # Rows from peaked to nearly flat; the flat ones have a nucleus wider than the candidates
+        logits = torch.randn(4, 1000, generator=generator) * torch.tensor([[4.0], [2.0], [1.0], [0.01]])
+        for temperature, top_k, top_p in ((0.7, 50, 0.9), (0.7, None, 0.9), (1.3, 20, 1.0)):
+            warpers = transformers.LogitsProcessorList([transformers.TemperatureLogitsWarper(temperature)])
+            if top_k:
+                warpers.append(transformers.TopKLogitsWarper(top_k))
+            if top_p < 1.0:
+                warpers.append(transformers.TopPLogitsWarper(top_p))
+            sampler = FusedSampler(temperature=temperature, top_p=top_p, top_k=top_k)
+            
+            expected = warpers(None, logits.clone())
+            scores = sampler(None, logits.clone())
+            assert torch.equal(scores.isfinite(), expected.isfinite())
+            assert torch.allclose(torch.softmax(scores, dim=-1), torch.softmax(expected, dim=-1), atol=1e-6)
+        
+        print("Same sampling distribution as transformers")
+        print("✅ Fused sampler working!")
+    except Exception as e:
+        print(f"❌ Fused sampler failed: {e}")
+
+def test_reply_token_ids():
+    """Test slicing generated ids out of a generate output"""
+    print("\n🧪 Testing Reply Token Ids...")
+    
+    try:
+        # Padding is the end of sequence id, as for GPT-2 style tokenizers;
+        # the second row was stopped by a stop string, the third ran to the end
+        sequences = torch.tensor([
+            [5, 5, 7, 8, 0, 0],
+            [5, 5, 7, 0, 0, 0],
+            [5, 5, 7, 8, 9, 1]
+        ])
+        assert reply_token_ids(sequences, 2, 0, 0) == [[7, 8], [7], [7, 8, 9, 1]]
+        assert reply_token_ids(sequences[:1, :5], 2, 0, 0) == [[7, 8, 0]]
+        
+        # With separate padding, the end of sequence is kept and padding dropped
+        sequences = torch.tensor([[5, 7, 0, 3, 3], [5, 7, 8, 3, 3]])
+        assert reply_token_ids(sequences, 1, 0, 3) == [[7, 0], [7, 8]]
+        print("✅ Reply token ids working!")
+    except Exception as e:
+        print(f"❌ Reply token ids failed: {e}")
+
+def test_async_front_end(model):
+    """Test the async front-end's queue policies and cancellation"""
+    print("\n🧪 Testing Async Front-End...")
+    
+    def blocking_generate(user_input, stopping_criteria=None, **kwargs):
+        # Holds its worker until the request is cancelled
+        cancel = stopping_criteria[-1].event
+        return "cancelled" if cancel.wait(timeout=30) else "timed out"
+    
+    async def hold_worker(front):
+        task = asyncio.create_task(front.generate_response("I'm feeling stuck."))
+        while front.pending == 0:
+            await asyncio.sleep(0.01)
+        return task
+    
+    async def run():
+        with mock.patch.object(model, "generate_response", side_effect=blocking_generate):
+            # A full queue rejects new requests right away...
+            front = AsyncBrelloEI0(model, max_workers=1, max_queue_size=0, queue_policy="reject")
+            task = await hold_worker(front)
+            try:
+                await front.generate_response("Is anyone there?")
+                raise AssertionError("Request was queued past the limit")
+            except QueueFullError as e:
+                print(f"Rejected: {e}")
+            
+            # ...and cancelling a request stops its generation and frees its slot
+            task.cancel()
+            try:
+                await task
+                raise AssertionError("Cancelled request completed")
+            except asyncio.CancelledError:
+                pass
+            for _ in range(500):
+                if front.pending == 0:
+                    break
+                await asyncio.sleep(0.01)
+            assert front.pending == 0
+            await front.close()
+            
+            # Under the wait policy, a request gives up after the queue timeout
+            front = AsyncBrelloEI0(model, max_workers=1, max_queue_size=0, queue_timeout=0.1)
+            task = await hold_worker(front)
+            try:
+                await front.generate_response("Is anyone there?")
+                raise AssertionError("Request did not time out")
+            except QueueFullError as e:
+                print(f"Timed out: {e}")
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            await front.close()
+    
+    try:
+        asyncio.run(run())
+        print("✅ Async front-end working!")
+    except Exception as e:
+        print(f"❌ Async front-end failed: {e}")
+
+def test_speculative_decoding(model):
+    """Test the KV cache helpers and greedy parity of speculative decoding"""
+    print("\n🧪 Testing Speculative Decoding...")
+    
+    try:
+        # Two layers of [batch, heads, seq_len, head_dim] keys and values
+        pairs = tuple(
+            (torch.randn(2, 2, 5, 4), torch.randn(2, 2, 5, 4))
+            for _ in range(2)
+        )
+        assert cache_length(pairs) == 5 and cache_length(None) == 0
+        assert crop(pairs, 5) is pairs and trim_left(pairs, 0) is pairs
+        cropped = crop(pairs, 3)
+        trimmed = trim_left(pairs, 2)
+        for (key, value), (cropped_key, cropped_value), (trimmed_key, trimmed_value) in zip(pairs, cropped, trimmed):
+            assert torch.equal(cropped_key, key[:, :, :3]) and torch.equal(cropped_value, value[:, :, :3])
+            assert torch.equal(trimmed_key, key[:, :, 2:]) and torch.equal(trimmed_value, value[:, :, 2:])
+        
+        # Shorter caches are left-padded when rows are stacked, and rows can be picked back out
+        stacked = concat_batches([cropped, pairs])
+        assert stacked[0][0].shape == (4, 2, 5, 4)
+        assert not stacked[0][0][:2, :, :2].any()
+        assert torch.equal(select_batch(stacked, torch.tensor([2, 3]))[1][1], pairs[1][1])
+        restored = cache_to_tuples(tuples_to_cache(pairs, model.model))
+        assert all(torch.equal(key, restored_key) for (key, _), (restored_key, _) in zip(pairs, restored))
+        
+        # Drafting with the model itself accepts every proposal and keeps the greedy reply
+        message = "I'm feeling overwhelmed with all my responsibilities."
+        with mock.patch.object(model, "response_cache", None), mock.patch.object(model, "semantic_cache", None):
+            expected = model.generate_response(message, max_new_tokens=24, do_sample=False)
+            generations = model.speculative_stats.generations
+            drafted = model.generate_response(message, max_new_tokens=24, do_sample=False, assistant_model=model.model)
+        print(f"Speculative stats: {model.speculative_stats.stats()}")
+        assert model.speculative_stats.generations == generations + 1
+        assert drafted == expected
+        print("✅ Speculative decoding working!")
+    except Exception as e:
+        print(f"❌ Speculative decoding failed: {e}")
+
+def test_prompt_lookup(model):
+    """Test prompt-lookup proposals and greedy parity of prompt-lookup decoding"""
+    print("\n🧪 Testing Prompt Lookup...")
+    
+    try:
+        # The tokens that followed the last occurrence of the trailing n-gram are proposed
+        proposer = PromptLookupProposer(num_tokens=3, max_ngram_size=2)
+        assert proposer.propose([1, 2, 3, 4, 5, 1, 2], 10) == ([3, 4, 5], None)
+        assert proposer.propose([1, 2, 3, 4, 5, 1, 2], 2) == ([3, 4], None)
+        assert proposer.propose([1, 2, 3], 10) == ([], None)
+        # Copies stop before a trigram that no_repeat_ngram_size=3 forbids
+        proposer = PromptLookupProposer(num_tokens=3, max_ngram_size=2, no_repeat_ngram_size=3)
+        assert proposer.propose([7, 2, 3, 4, 5, 1, 2], 10) == ([3], None)
+        
+        message = "I keep telling myself that I'm fine, but I'm not fine."
+        with mock.patch.object(model, "response_cache", None), mock.patch.object(model, "semantic_cache", None):
+            expected = model.generate_response(message, max_new_tokens=24, do_sample=False)
+            generations = model.prompt_lookup_stats.generations
+            looked_up = model.generate_response(message, max_new_tokens=24, do_sample=False, prompt_lookup_num_tokens=5)
+        print(f"Prompt lookup stats: {model.prompt_lookup_stats.stats()}")
+        assert model.prompt_lookup_stats.generations == generations + 1
+        assert looked_up == expected
+        print("✅ Prompt lookup working!")
+    except Exception as e:
+        print(f"❌ Prompt lookup failed: {e}")
+
+def test_stop_sequences(model):
+    """Test stopping at the end of the assistant turn and at a sentence budget"""
+    print("\n🧪 Testing Stop Sequences...")
+    
+    try:
+        tokenizer = model.tokenizer
+        assert truncate_reply("I hear you.</s>\n<|user|> thanks") == "I hear you."
+        assert truncate_reply("Really?! Wait... Okay.", max_sentences=2) == "Really?! Wait..."
+        
+        # Decoding stops at the token completing the stop string
+        token_ids = tokenizer.encode(" I hear you. That sounds hard.</s>\n<|user|> thanks", add_special_tokens=False)
+        reply_ids, reply = truncate_reply_ids(tokenizer, token_ids)
+        assert reply == " I hear you. That sounds hard."
+        assert tokenizer.decode(reply_ids) == reply
+        stopper = ReplyStopper(tokenizer)
+        stopped_at = next(index for index, token_id in enumerate(token_ids) if stopper.push([token_id]))
+        assert "</s>" in tokenizer.decode(token_ids[:stopped_at + 1])
+        assert "</s>" not in tokenizer.decode(token_ids[:stopped_at])
+        
+        # The sentence budget applies without stop strings too
+        for stop_strings in ((), DEFAULT_STOP_STRINGS):
+            stopper = ReplyStopper(tokenizer, stop_strings, max_sentences=1)
+            stopped_at = next(index for index, token_id in enumerate(token_ids) if stopper.push([token_id]))
+            assert tokenizer.decode(token_ids[:stopped_at + 1]) == " I hear you."
+        
+        # Each row of a batch stops on its own
+        criterion = StopOnText(tokenizer, 1, max_sentences=1)
+        prefix = tokenizer.encode(" I hear you", add_special_tokens=False)
+        rows = torch.tensor([[0] + prefix + tokenizer.encode(".", add_special_tokens=False), [0] + prefix + [prefix[-1]]])
+        assert criterion(rows, None).tolist() == [True, False]
+        print("✅ Stop sequences working!")
+    except Exception as e:
+        print(f"❌ Stop sequences failed: {e}")
+
+def test_prompt_builder(model):
+    """Test prompt assembly from pre-tokenized segments against whole-prompt tokenization"""
+    print("\n🧪 Testing Prompt Builder...")
+    
+    try:
+        builder = model.prompt_builder
+        messages = list(PROBE_MESSAGES) + [test_case["input"] for test_case in TEST_CASES]
+        expected = [
+            model.tokenizer.encode(builder.render(message), add_special_tokens=builder.add_special_tokens)
+            for message in messages
+        ]
+        
+        print(f"Segments join at the id level: {builder.exact}")
+        assert builder.build(messages) == expected
+        assert [builder.build([message])[0] for message in messages] == expected
+        print("Same ids as tokenizing the whole prompt")
+        print("✅ Prompt builder working!")
+    except Exception as e:
+        print(f"❌ Prompt builder failed: {e}")
+
+def test_continuous_batching(model):
+    """Test the continuous batching engine against batched generation"""
+    print("\n🧪 Testing Continuous Batching...")
+    
+    try:
+        messages = [
+            "I'm feeling stressed.",
+            "I just got promoted at work and I'm so excited!",
+            "I'm really grateful for my friends and family."
+        ]
+        expected = model.generate_responses(messages, max_new_tokens=24, do_sample=False)
+        
+        engine = ContinuousBatchingEngine(model, max_batch_size=2)
+        responses = engine.generate(messages, max_new_tokens=24, do_sample=False)
+        print(f"Same greedy responses as generate_responses: {responses == expected}")
+        assert responses == expected
+        # Top-k applies to sampling and temperature 0 decodes greedily, as in generate_response
+        assert engine.generate(messages, max_new_tokens=24, do_sample=True, top_k=1) == expected
+        assert engine.generate(messages, max_new_tokens=24, temperature=0) == expected
+        
+        # Minimum lengths hold back EOS the same way as in model.generate
+        expected = model.generate_responses(messages, max_new_tokens=24, do_sample=False, min_new_tokens=20)
+        assert engine.generate(messages, max_new_tokens=24, do_sample=False, min_new_tokens=20) == expected
+        
+        # A prompt that cannot fit in the context is rejected up front
+        try:
+            engine.submit("I'm feeling stressed. " * 2000)
+            raise AssertionError("Over-long prompt was accepted")
+        except ValueError as e:
+            print(f"Over-long prompt rejected: {e}")
+        
+        # A failed prefill fails only the new requests, not the running batch
+        engine.start()
+        try:
+            running = engine.submit(messages[0], max_new_tokens=48, do_sample=False)
+            while not engine._active and not running.done():
+                time.sleep(0.01)
+            with mock.patch.object(model, "_prepare_inputs", side_effect=RuntimeError("prefill failed")):
+                failed = engine.submit(messages[1], max_new_tokens=8)
+                try:
+                    failed.result(timeout=60)
+                    raise AssertionError("Failed prefill did not fail its request")
+                except RuntimeError as e:
+                    print(f"Admitted request failed: {e}")
+            print(f"Running request finished: {running.result(timeout=60)}")
+        finally:
+            engine.stop()
+        print("✅ Continuous batching working!")
+    except Exception as e:
+        print(f"❌ Continuous batching failed: {e}")
+
+def test_request_scheduler(model):
+    """Test deadline admission control of the request scheduler"""
+    print("\n🧪 Testing Request Scheduler...")
+    
+    scheduler = RequestScheduler(model)
+    try:
+        urgent = scheduler.submit("I'm feeling stressed.", priority=1, max_new_tokens=16)
+        impossible = scheduler.submit("I'm so proud of my sister!", deadline=0.0, max_new_tokens=16)
+        try:
+            impossible.result(timeout=60)
+            raise AssertionError("Request with an impossible deadline was run")
+        except DeadlineExceeded as e:
+            print(f"Impossible deadline rejected: {e}")
+        
+        print(f"Urgent response: {urgent.result(timeout=120)}")
+        
+        # A generation that raises fails its future and is not counted as completed
+        with mock.patch.object(model, "generate_response", side_effect=RuntimeError("generation failed")):
+            try:
+                scheduler.submit("I'm feeling lost.", max_new_tokens=16).result(timeout=60)
+                raise AssertionError("Failed generation resolved")
+            except RuntimeError:
+                pass
+        stats = scheduler.stats()
+        print(f"Scheduler stats: {stats}")
+        assert stats["completed"] == 1 and stats["failed"] == 1
+        print("✅ Request scheduler working!")
+    except Exception as e:
+        print(f"❌ Request scheduler failed: {e}")
+    finally:
+        scheduler.close()
+
+def test_serve(model):
+    """Test the OpenAI-compatible server end to end"""
+    print("\n🧪 Testing Serve...")
+    
+    try:
+        server = BrelloServer(("127.0.0.1", 0), lambda: model, max_batch_size=2)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        port = server.server_address[1]
+        
+        def request(method, path, body=None, headers=None):
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=120)
+            connection.request(method, path, body=body, headers=headers or {})
+            response = connection.getresponse()
+            data = response.read().decode("utf-8")
+            connection.close()
+            return response.status, data
+        
+        try:
+            # Alive before the model is loaded, ready after
+            assert request("GET", "/health")[0] == 200
+            assert request("GET", "/ready")[0] == 503
+            server.load()
+            assert request("GET", "/ready")[0] == 200
+            
+            body = {"messages": [{"role": "user", "content": "I'm feeling stressed about work"}], "max_tokens": 24, "temperature": 0}
+            status, data = request("POST", "/v1/chat/completions", json.dumps(body))
+            assert status == 200
+            content = json.loads(data)["choices"][0]["message"]["content"]
+            
+            status, data = request("POST", "/v1/chat/completions", json.dumps({**body, "stream": True}))
+            assert status == 200
+            events = [line[len("data: "):] for line in data.splitlines() if line.startswith("data: ")]
+            assert events[-1] == "[DONE]"
+            streamed = "".join(json.loads(event)["choices"][0]["delta"].get("content", "") for event in events[:-1])
+            print(f"Reply: {content!r}")
+            assert streamed == content
+            
+            assert request("POST", "/v1/chat/completions", "{not json")[0] == 400
+            assert request("POST", "/v1/chat/completions", "{}", {"Content-Length": "abc"})[0] == 400
+            assert request("POST", "/v1/chat/completions", "{}", {"Content-Length": "-1"})[0] == 400
+        finally:
+            server.shutdown()
+            server.server_close()
+        print("✅ Serve working!")
+    except Exception as e:
+        print(f"❌ Serve failed: {e}")
+
+def test_weight_snapshot(model):
+    """Test exporting a weight snapshot and loading it memory-mapped"""
+    print("\n🧪 Testing Weight Snapshot...")
+    
+    try:
+        with tempfile.TemporaryDirectory() as path:
+            model.export_snapshot(path)
+            assert is_snapshot(path)
+            
+            start_time = time.time()
+            snapshot = BrelloEI0.from_snapshot(path, device="cpu", response_cache_size=0)
+            print(f"Snapshot load time: {time.time() - start_time:.2f}s")
+            assert snapshot.model.dtype == model.model.dtype
+            
+            input_ids = torch.tensor([model._tokenize_prompts(["I'm proud of how far I've come."])[0]])
+            with torch.no_grad():
+                expected = model.model(input_ids.to(model.model.device)).logits.cpu()
+                logits = snapshot.model(input_ids).logits
+            assert torch.allclose(logits, expected, atol=1e-5)
+            del snapshot
+        
+        try:
+            BrelloEI0.from_snapshot(os.path.dirname(os.path.abspath(__file__)))
+            raise AssertionError("A directory without a snapshot was loaded")
+        except ValueError:
+            pass
+        print("✅ Weight snapshot working!")
+    except Exception as e:
+        print(f"❌ Weight snapshot failed: {e}")
+
+def test_cpu_autotune(model):
+    """Test CPU autotuning and reuse of its cached result"""
+    print("\n🧪 Testing CPU Autotune...")
+    
+    num_threads = torch.get_num_threads()
+    try:
+        cpu = probe_cpu()
+        print(f"CPU: {cpu['name']} ({cpu['cores']} cores, {cpu['capability']})")
+        
+        with tempfile.TemporaryDirectory() as cache_dir:
+            tuning = autotune(model.model_path, cache_dir, precisions=("fp32", "int8"), thread_counts=[1], max_new_tokens=4)
+            print(f"Chosen: {tuning['precision']} with {tuning['num_threads']} threads")
+            assert tuning["precision"] in ("fp32", "int8") and tuning["num_threads"] == 1
+            assert tuning["results"][0]["precision"] == "fp32" and tuning["results"][0]["agreement"] == 1.0
+            assert load_tuning(model.model_path, cache_dir)["precision"] == tuning["precision"]
+            
+            # A tuned host loads the cached choice instead of benchmarking again
+            with mock.patch("cpu_autotune.autotune", side_effect=AssertionError("autotune ran again")):
+                tuned = BrelloEI0(model.model_path, autotune=True, autotune_cache_dir=cache_dir, response_cache_size=0)
+            assert tuned.autotune["precision"] == tuning["precision"]
+            assert torch.get_num_threads() == 1
+            del tuned
+        print("✅ CPU autotune working!")
+    except Exception as e:
+        print(f"❌ CPU autotune failed: {e}")
+    finally:
+        torch.set_num_threads(num_threads)
+
+def test_worker_pool(model):
+    """Test the multi-process worker pool against in-process generation"""
+    print("\n🧪 Testing Worker Pool...")
+    
+    try:
+        assert core_sets(2, [0, 1, 2, 3, 4]) == [[0, 1, 2], [3, 4]]
+        assert core_sets(3, [0]) == [[0], [0], [0]]
+        
+        messages = ["I feel so alone lately.", "I finally finished my thesis!", "Work has been so stressful."]
+        with mock.patch.dict(model.config, {"do_sample": False}):
+            expected = [model.generate_response(message, max_new_tokens=12) for message in messages]
+        
+        with WorkerPool(model.model_path, num_workers=2, config={"do_sample": False}, response_cache_size=0) as pool:
+            assert pool.generate_response(messages[0], max_new_tokens=12) == expected[0]
+            assert pool.generate_responses(messages, max_new_tokens=12) == expected
+            print(f"Pool stats: {pool.stats()}")
+        print("✅ Worker pool working!")
+    except Exception as e:
+        print(f"❌ Worker pool failed: {e}")
+
+def test_tokenizer_only(model):
+    """Test tokenizer-only mode against the loaded model"""
+    print("\n🧪 Testing Tokenizer-Only Mode...")
+    
+    try:
+        start_time = time.time()
+        tokenizer_model = BrelloEI0(model_path=model.model_path, tokenizer_only=True)
+        load_time = time.time() - start_time
+        
+        message = "I just got promoted at work and I'm so excited!"
+        same_count = tokenizer_model.count_prompt_tokens(message) == model.count_prompt_tokens(message)
+        
+        print(f"Load time: {load_time:.2f}s")
+        print(f"Prompt tokens: {tokenizer_model.count_prompt_tokens(message)}")
+        print(f"Same count as full model: {same_count}")
+        print("✅ Tokenizer-only mode working!")
+    except Exception as e:
+        print(f"❌ Tokenizer-only mode failed: {e}")
+
+def test_model_compile():
+    """Test prompt bucketing and the compiled forward pass"""
+    print("\n🧪 Testing Model Compile...")
+    
+    try:
+        assert bucket_width(1, DEFAULT_COMPILE_BUCKETS) == 32
+        assert bucket_width(64, DEFAULT_COMPILE_BUCKETS) == 64
+        assert bucket_width(65, DEFAULT_COMPILE_BUCKETS) == 128
+        assert bucket_width(513, DEFAULT_COMPILE_BUCKETS) == 1024
+        
+        config = transformers.GPT2Config(n_layer=2, n_head=2, n_embd=64, n_positions=128, vocab_size=512)
+        tiny = transformers.GPT2LMHeadModel(config).eval()
+        input_ids = torch.randint(0, config.vocab_size, (1, 16), generator=torch.Generator().manual_seed(0))
+        with torch.no_grad():
+            expected = tiny(input_ids).logits
+            stats = CompileStats()
+            compile_model(tiny, stats)
+            logits = tiny(input_ids).logits
+            tiny(input_ids)
+            with eager_execution(tiny):
+                eager = tiny(input_ids).logits
+        
+        print(f"Compile stats: {stats.stats()}")
+        assert stats.compiles >= 1 and stats.hits >= 1
+        assert torch.allclose(logits, expected, atol=1e-4)
+        assert torch.equal(eager, expected)
+        print("✅ Model compile working!")
+    except Exception as e:
+        print(f"❌ Model compile failed: {e}")
+
+def test_exported_decoder():
+    """Test that an exported decoder package gives the logits of the eager model"""
+    print("\n🧪 Testing Exported Decoder...")
+    
+    try:
+        # A tiny randomly initialized model keeps the AOTInductor compile short
+        config = transformers.GPT2Config(n_layer=2, n_head=2, n_embd=64, n_positions=128, vocab_size=512)
+        eager = transformers.GPT2LMHeadModel(config).eval()
+        input_ids = torch.randint(0, config.vocab_size, (2, 12), generator=torch.Generator().manual_seed(0))
+        
+        with tempfile.TemporaryDirectory() as path:
+            export_decoder(eager, path, {"source_model_path": "test"}, max_batch_size=4)
+            decoder = load_exported(path)
+            
+            with torch.no_grad():
+                expected = eager(input_ids, use_cache=True)
+                outputs = decoder(input_ids)
+                # One more step on top of the cache
+                next_ids = expected.logits[:, -1:].argmax(dim=-1)
+                expected_step = eager(next_ids, past_key_values=expected.past_key_values)
+                step = decoder(next_ids, past_key_values=outputs.past_key_values)
+            
+            print(f"Largest logit difference: {(outputs.logits - expected.logits).abs().max().item():.2e}")
+            assert torch.allclose(outputs.logits, expected.logits, atol=1e-4)
+            assert torch.allclose(step.logits, expected_step.logits, atol=1e-4)
+        print("✅ Exported decoder working!")
+    except Exception as e:
+        print(f"❌ Exported decoder failed: {e}")
+
 def test_memory_efficiency():
     """Test memory efficiency"""
     print("\n🧪 Testing Memory Efficiency...")
     
     try:
-        # Test with standard loading
-        model_standard = BrelloEI0(
+        # Test with standard loading; the registry hands back the model
+        # loaded earlier instead of loading the weights again
+        model_standard = load_brello_ei_0(
             model_path="microsoft/DialoGPT-medium",
             load_in_4bit=False
         )
         
         # Get model size info
-        if hasattr(model_4bit.model, 'get_memory_footprint'):
-            memory_footprint = model_4bit.model.get_memory_footprint()
-            print(f"Model memory footprint: {memory_footprint / 1024**3:.2f} GB")
+        memory_footprint = model_standard.memory_footprint()
+        print(f"Model memory footprint: {memory_footprint / 1024**3:.2f} GB")
+        print(f"Registry stats: {model_registry.stats()}")
         
         print("✅ Memory efficiency test passed!")
-        return model_4bit
+        return model_standard
     except Exception as e:
         print(f"❌ Memory efficiency test failed: {e}")
         return None
@@ -149,7 +935,31 @@ def main():
     # Run all tests
     test_emotional_intelligence_responses(model)
     test_chat_interface(model)
+    test_session_truncation(model)
     test_generation_parameters(model)
+    test_batched_generation(model)
+    test_prefix_cache(model)
+    test_streaming(model)
+    test_response_cache(model)
+    test_semantic_cache()
+    test_structured_output(model)
+    test_repetition_processors()
+    test_fused_sampler()
+    test_reply_token_ids()
+    test_async_front_end(model)
+    test_speculative_decoding(model)
+    test_prompt_lookup(model)
+    test_stop_sequences(model)
+    test_prompt_builder(model)
+    test_continuous_batching(model)
+    test_request_scheduler(model)
+    test_serve(model)
+    test_weight_snapshot(model)
+    test_cpu_autotune(model)
+    test_worker_pool(model)
+    test_tokenizer_only(model)
+    test_model_compile()
+    test_exported_decoder()
     test_memory_efficiency()
     
     print("\n🎉 All tests completed!")
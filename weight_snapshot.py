@@ -0,0 +1,114 @@
+"""
+Weight Snapshots - Brello EI 0
+Created by Epic Systems | Engineered by Rehan Temkar
+
+Save a loaded model's weights in their final dtype and layout as a single
+safetensors file, and load them back memory-mapped. The model skeleton is
+built on the meta device and the mapped tensors are assigned to it
+directly, so loading does no dtype conversion or copy, and workers on the
+same host share the file's pages through the page cache.
+"""
+
+from __future__ import annotations
+
+import os
+import json
+import logging
+from typing import Any, Dict, Tuple
+
+from lazy_imports import lazy_import
+
+torch = lazy_import("torch")
+transformers = lazy_import("transformers")
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FILE = "brello_snapshot.json"
+WEIGHTS_FILE = "weights.safetensors"
+
+def is_snapshot(path: str) -> bool:
+    """Whether a path is a snapshot directory written by ``save_snapshot()``"""
+    return os.path.isfile(os.path.join(path, SNAPSHOT_FILE))
+
+def save_snapshot(model, path: str, info: Dict[str, Any]):
+    """
+    Save a model's weights, config and generation config to a directory
+    
+    Args:
+        model: Loaded model, in the dtype it should be served in
+        path: Destination directory
+        info: Extra fields stored in the snapshot description
+    """
+    from safetensors.torch import save_file
+    
+    os.makedirs(path, exist_ok=True)
+    
+    # Tied weights (e.g. lm_head and the input embeddings) are stored once
+    # and recorded as aliases of the name that was kept
+    tensors = {}
+    aliases = {}
+    stored = {}
+    for name, tensor in model.state_dict().items():
+        identity = (tensor.data_ptr(), tuple(tensor.shape), tensor.dtype)
+        if identity in stored:
+            aliases[name] = stored[identity]
+            continue
+        stored[identity] = name
+        tensors[name] = tensor.detach().to("cpu").contiguous()
+    
+    # Non-persistent buffers (e.g. rotary frequencies) are not part of the
+    # state dict, but the meta-device skeleton needs real values for them
+    state_names = set(model.state_dict())
+    buffers = []
+    for name, buffer in model.named_buffers():
+        if name not in state_names:
+            tensors[name] = buffer.detach().to("cpu").contiguous()
+            buffers.append(name)
+    
+    save_file(tensors, os.path.join(path, WEIGHTS_FILE))
+    model.config.save_pretrained(path)
+    if model.generation_config is not None:
+        model.generation_config.save_pretrained(path)
+    
+    description = dict(info, dtype=str(model.dtype).replace("torch.", ""), aliases=aliases, buffers=buffers)
+    with open(os.path.join(path, SNAPSHOT_FILE), "w") as f:
+        json.dump(description, f, indent=2)
+    
+    logger.info(f"Saved weight snapshot to {path}")
+
+def load_snapshot(path: str) -> Tuple[Any, Dict[str, Any]]:
+    """
+    Load a model from a snapshot directory with memory-mapped weights
+    
+    Args:
+        path: Directory written by ``save_snapshot()``
+    
+    Returns:
+        Model on CPU in the snapshot's dtype, and the snapshot description
+    """
+    from safetensors.torch import load_file
+    
+    with open(os.path.join(path, SNAPSHOT_FILE)) as f:
+        info = json.load(f)
+    
+    config = transformers.AutoConfig.from_pretrained(path)
+    with torch.device("meta"):
+        model = transformers.AutoModelForCausalLM.from_config(config)
+    
+    # load_file maps the file; assign=True keeps those tensors instead of
+    # copying them into freshly allocated parameters
+    tensors = load_file(os.path.join(path, WEIGHTS_FILE), device="cpu")
+    buffers = {name: tensors.pop(name) for name in info["buffers"]}
+    for name, source in info["aliases"].items():
+        tensors[name] = tensors[source]
+    model.load_state_dict(tensors, strict=True, assign=True)
+    for name, buffer in buffers.items():
+        module_name, _, buffer_name = name.rpartition(".")
+        module = model.get_submodule(module_name)
+        module.register_buffer(buffer_name, buffer, persistent=False)
+    model.tie_weights()
+    
+    if os.path.isfile(os.path.join(path, "generation_config.json")):
+        model.generation_config = transformers.GenerationConfig.from_pretrained(path)
+    model.eval()
+    return model, info
@@ -0,0 +1,383 @@
+"""
+Worker Pool - Brello EI 0
+Created by Epic Systems | Engineered by Rehan Temkar
+
+Runs BrelloEI0 in several worker processes that share one copy of the
+weights, so throughput scales with cores instead of being capped by a single
+synchronous generate loop.
+
+Two ways of sharing the weights are supported:
+
+- ``fork`` (the default where available): the model is loaded once in the
+  parent and the workers are forked from it. They read the parent's weights
+  through copy-on-write pages, which stay shared because inference never
+  writes to them.
+- ``spawn``: every worker starts a fresh interpreter and loads a weight
+  snapshot or exported package. Both memory-map their weights, so the
+  workers share the operating system's page cache instead of the parent.
+
+Each worker is pinned to its own set of cores and runs as many torch threads
+as it has cores. Requests go on a shared queue, and idle workers take the
+next one.
+"""
+
+from __future__ import annotations
+
+import os
+import queue
+import pickle
+import logging
+import threading
+import itertools
+import multiprocessing
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Sequence
+
+from lazy_imports import lazy_import
+from weight_snapshot import is_snapshot
+from exported_decoder import is_exported
+
+torch = lazy_import("torch")
+
+logger = logging.getLogger(__name__)
+
+# BrelloEI0 methods the workers serve
+POOL_METHODS = ("generate_response", "generate_responses")
+
+# Seconds between checks for workers that died
+WATCH_INTERVAL = 1.0
+
+# Model forked workers inherit; only set in the parent while it forks them
+_forked_brello = None
+
+def available_cores() -> List[int]:
+    """Cores this process may run on"""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+def core_sets(num_workers: int, cores: Optional[Sequence[int]] = None) -> List[List[int]]:
+    """
+    Split cores into one contiguous set per worker
+    
+    Args:
+        num_workers: Number of workers
+        cores: Cores to split (default: every core this process may run on)
+    
+    Returns:
+        Core set of each worker; workers share cores when there are fewer cores than workers
+    """
+    cores = sorted(cores or available_cores())
+    if num_workers >= len(cores):
+        return [[cores[index % len(cores)]] for index in range(num_workers)]
+    size, extra = divmod(len(cores), num_workers)
+    sets, start = [], 0
+    for index in range(num_workers):
+        end = start + size + (1 if index < extra else 0)
+        sets.append(cores[start:end])
+        start = end
+    return sets
+
+def _picklable_error(error: Exception) -> Exception:
+    """The error itself if it can be sent to the parent, else a RuntimeError describing it"""
+    try:
+        pickle.dumps(error)
+        return error
+    except Exception:
+        return RuntimeError(f"{type(error).__name__}: {error}")
+
+def _worker_main(
+    index: int,
+    cores: List[int],
+    tasks,
+    results,
+    model_path: str,
+    config: Dict[str, Any],
+    model_kwargs: Dict[str, Any]
+):
+    """Worker process: pin to the core set, get the model, then serve tasks until told to stop"""
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    torch.set_num_threads(len(cores))
+    
+    try:
+        if _forked_brello is not None:
+            brello = _forked_brello
+            cache = brello.response_cache
+            if cache is not None and cache.disk_path:
+                # SQLite connections must not cross a fork
+                from response_cache import ResponseCache
+                
+                brello.response_cache = ResponseCache(max_entries=cache.max_entries, disk_path=cache.disk_path)
+        else:
+            from brello_ei_0 import BrelloEI0
+            
+            brello = BrelloEI0(model_path=model_path, device="cpu", **model_kwargs)
+            brello.config.update(config)
+    except Exception as e:
+        results.put((None, index, False, _picklable_error(e)))
+        return
+    results.put((None, index, True, os.getpid()))
+    
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        task_id, method, args, kwargs = task
+        results.put((task_id, index, None, None))
+        try:
+            result = getattr(brello, method)(*args, **kwargs)
+            results.put((task_id, index, True, result))
+        except Exception as e:
+            results.put((task_id, index, False, _picklable_error(e)))
+
+class WorkerPool:
+    """
+    Pool of BrelloEI0 worker processes sharing one copy of the weights
+    
+    Use it like a model: ``generate_response()`` and ``generate_responses()``
+    block until the reply is ready, ``submit()`` returns a Future. Batches are
+    split across the workers.
+    """
+    
+    def __init__(
+        self,
+        model_path: str = "microsoft/DialoGPT-medium",
+        num_workers: Optional[int] = None,
+        cores: Optional[Sequence[int]] = None,
+        start_method: Optional[str] = None,
+        config: Optional[Dict[str, Any]] = None,
+        **model_kwargs
+    ):
+        """
+        Load the model and start the workers
+        
+        Args:
+            model_path: Model to load; a weight snapshot or exported package with 'spawn'
+            num_workers: Number of worker processes (default: one per core)
+            cores: Cores to spread the workers over (default: every core this process may run on)
+            start_method: 'fork' or 'spawn' (default 'fork' where the platform has it)
+            config: Generation config overrides applied in every worker (e.g. {'do_sample': False})
+            **model_kwargs: Additional BrelloEI0 parameters
+        """
+        cores = list(cores or available_cores())
+        num_workers = num_workers or len(cores)
+        if num_workers < 1:
+            raise ValueError("num_workers must be at least 1")
+        if start_method is None:
+            start_method = "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+        if start_method not in ("fork", "spawn"):
+            raise ValueError("start_method must be 'fork' or 'spawn'")
+        if start_method == "spawn" and not (is_snapshot(model_path) or is_exported(model_path)):
+            raise ValueError(
+                "Spawned workers share weights through a memory-mapped weight snapshot or exported "
+                "package; create one with export_snapshot() or export_package() first"
+            )
+        if model_kwargs.get("device", "cpu") != "cpu":
+            raise ValueError("WorkerPool runs on CPU only")
+        model_kwargs.pop("device", None)
+        
+        self.model_path = model_path
+        self.start_method = start_method
+        self.core_sets = core_sets(num_workers, cores)
+        if num_workers > len(cores):
+            logger.warning(f"⚠️  {num_workers} workers share {len(cores)} cores")
+        
+        self._context = multiprocessing.get_context(start_method)
+        self._tasks = self._context.Queue()
+        self._results = self._context.Queue()
+        self._futures: Dict[int, Future] = {}
+        self._task_ids = itertools.count()
+        self._lock = threading.Lock()
+        self._served = [0] * num_workers
+        self._closed = False
+        self._collector: Optional[threading.Thread] = None
+        
+        # Workers are separate processes: configuration has to be in place
+        # before they start, later changes in the parent never reach them
+        config = dict(config or {})
+        global _forked_brello
+        self._brello = None
+        if start_method == "fork":
+            from brello_ei_0 import BrelloEI0
+            
+            self._brello = BrelloEI0(model_path=model_path, device="cpu", **model_kwargs)
+            self._brello.config.update(config)
+            _forked_brello = self._brello
+        
+        logger.info(f"Starting {num_workers} Brello EI 0 workers ({start_method})")
+        self.workers = []
+        try:
+            for index, worker_cores in enumerate(self.core_sets):
+                worker = self._context.Process(
+                    target=_worker_main,
+                    args=(index, worker_cores, self._tasks, self._results, model_path, config, model_kwargs),
+                    name=f"brello-worker-{index}",
+                    daemon=True
+                )
+                worker.start()
+                self.workers.append(worker)
+        finally:
+            _forked_brello = None
+        
+        self.pids = [0] * num_workers
+        self._running: List[Optional[int]] = [None] * num_workers
+        self._dead = set()
+        while 0 in self.pids:
+            try:
+                _, index, ok, value = self._results.get(timeout=WATCH_INTERVAL)
+            except queue.Empty:
+                for index, worker in enumerate(self.workers):
+                    if not self.pids[index] and worker.exitcode is not None:
+                        self.close()
+                        raise RuntimeError(f"Worker {index} exited during startup (exit code {worker.exitcode})")
+                continue
+            if not ok:
+                self.close()
+                raise value
+            self.pids[index] = value
+        
+        self._collector = threading.Thread(target=self._collect, name="brello-pool", daemon=True)
+        self._collector.start()
+        logger.info(f"✅ {num_workers} workers ready on cores {self.core_sets}")
+    
+    def submit(self, method: str, *args, **kwargs) -> Future:
+        """
+        Queue a call for the next idle worker
+        
+        Args:
+            method: BrelloEI0 method to call ('generate_response' or 'generate_responses')
+            *args: Positional arguments of the method
+            **kwargs: Keyword arguments of the method
+        
+        Returns:
+            Future resolved with the method's return value
+        """
+        if method not in POOL_METHODS:
+            raise ValueError(f"method must be one of {POOL_METHODS}")
+        future: Future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Worker pool is closed")
+            if len(self._dead) == len(self.workers):
+                raise RuntimeError("Every worker has exited")
+            task_id = next(self._task_ids)
+            self._futures[task_id] = future
+        self._tasks.put((task_id, method, args, kwargs))
+        return future
+    
+    def generate_response(self, user_input: str, **kwargs) -> str:
+        """
+        Generate a response on the next idle worker
+        
+        Args:
+            user_input: User's message
+            **kwargs: BrelloEI0.generate_response parameters
+        
+        Returns:
+            Generated response
+        """
+        return self.submit("generate_response", user_input, **kwargs).result()
+    
+    def generate_responses(self, user_inputs: List[str], **kwargs) -> List[str]:
+        """
+        Generate responses for several messages, split evenly across the workers
+        
+        Args:
+            user_inputs: User messages
+            **kwargs: BrelloEI0.generate_responses parameters
+        
+        Returns:
+            Generated responses in input order
+        """
+        chunk_size = -(-len(user_inputs) // len(self.workers)) or 1
+        futures = [
+            self.submit("generate_responses", user_inputs[start:start + chunk_size], **kwargs)
+            for start in range(0, len(user_inputs), chunk_size)
+        ]
+        return [response for future in futures for response in future.result()]
+    
+    def stats(self) -> Dict[str, Any]:
+        """Workers, their cores and process ids, whether they are alive and the requests each has served"""
+        with self._lock:
+            pending = len(self._futures)
+            served = list(self._served)
+            dead = set(self._dead)
+        return {
+            "start_method": self.start_method,
+            "workers": [
+                {"pid": pid, "cores": cores, "served": count, "alive": index not in dead}
+                for index, (pid, cores, count) in enumerate(zip(self.pids, self.core_sets, served))
+            ],
+            "pending": pending
+        }
+    
+    def close(self):
+        """Stop the workers once they finish their current request"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        for _ in self.workers:
+            self._tasks.put(None)
+        for worker in self.workers:
+            worker.join()
+        self._results.put(None)
+        if self._collector is not None:
+            self._collector.join()
+        
+        # Requests no worker got to
+        with self._lock:
+            futures, self._futures = self._futures, {}
+        for future in futures.values():
+            future.set_exception(RuntimeError("Worker pool closed before the request ran"))
+        logger.info("Worker pool closed")
+    
+    def __enter__(self) -> "WorkerPool":
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+    
+    def _collect(self):
+        """Resolve futures as workers send back results, and fail the requests of workers that die"""
+        while True:
+            try:
+                message = self._results.get(timeout=WATCH_INTERVAL)
+            except queue.Empty:
+                self._check_workers()
+                continue
+            if message is None:
+                break
+            task_id, index, ok, value = message
+            if ok is None:
+                self._running[index] = task_id
+                continue
+            with self._lock:
+                self._running[index] = None
+                future = self._futures.pop(task_id, None)
+                self._served[index] += 1
+            if future is None:
+                continue
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+    
+    def _check_workers(self):
+        """Fail the request a dead worker was running, and every request once no worker is left"""
+        failed = []
+        with self._lock:
+            for index, worker in enumerate(self.workers):
+                if index in self._dead or worker.exitcode is None or self._closed:
+                    continue
+                self._dead.add(index)
+                logger.error(f"❌ Worker {index} (pid {self.pids[index]}) exited with code {worker.exitcode}")
+                task_id, self._running[index] = self._running[index], None
+                if task_id in self._futures:
+                    failed.append(self._futures.pop(task_id))
+            if len(self._dead) == len(self.workers):
+                failed.extend(self._futures.values())
+                self._futures = {}
+        for future in failed:
+            future.set_exception(RuntimeError("The worker running the request exited"))